@@ -1,35 +1,240 @@
 """
 Authentication Module - API Key Authentication
+
+API keys được nạp một lần vào ApiKeyRegistry, đánh chỉ mục theo SHA-256 của key
+nên mỗi request chỉ tốn một lần hash + một lần tra dict (không phụ thuộc số keys).
+Keys có thể kèm metadata (tier rate limit, endpoints được phép) trong API_KEYS_FILE;
+file này được nạp lại tự động khi thay đổi, không cần restart server.
 """
-from fastapi import Security, HTTPException, status
+from fastapi import Request, Security, HTTPException, status
 from fastapi.security import APIKeyHeader
-from typing import Optional
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import hmac
+import json
+import logging
+import os
 import secrets
+import threading
+import time
 
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 
 # API Key Header
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
+DEFAULT_TIER = "default"
+
 
 def generate_api_key() -> str:
     """Generate a random API key"""
     return secrets.token_urlsafe(32)
 
 
-async def verify_api_key(api_key: Optional[str] = Security(api_key_header)) -> str:
+def hash_api_key(api_key: str) -> str:
+    """SHA-256 (hex) của API key - dùng làm chỉ mục và để lưu key trong file mà không lộ key gốc"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class ApiKeyInfo:
+    """Metadata của một API key"""
+    
+    __slots__ = ("key_hash", "key_id", "name", "tier", "per_minute", "per_hour", "endpoints")
+    
+    def __init__(
+        self,
+        key_hash: str,
+        name: str = "",
+        tier: str = DEFAULT_TIER,
+        per_minute: Optional[int] = None,
+        per_hour: Optional[int] = None,
+        endpoints: Optional[Iterable[str]] = None
+    ):
+        """
+        Args:
+            key_hash: SHA-256 (hex) của key
+            name: Tên hiển thị (vd: tên đối tác)
+            tier: Tên tier rate limit
+            per_minute: Giới hạn mỗi phút của tier (None = theo RATE_LIMIT_PER_MINUTE)
+            per_hour: Giới hạn mỗi giờ của tier (None = theo RATE_LIMIT_PER_HOUR)
+            endpoints: Các path prefix được phép gọi (None = tất cả)
+        """
+        self.key_hash = key_hash
+        # Id ngắn, không lộ key: dùng cho rate limit bucket và logs
+        self.key_id = key_hash[:16]
+        self.name = name or self.key_id
+        self.tier = tier
+        self.per_minute = per_minute
+        self.per_hour = per_hour
+        self.endpoints: Optional[Tuple[str, ...]] = (
+            tuple(e.rstrip("/") or "/" for e in endpoints) if endpoints is not None else None
+        )
+    
+    def allows(self, path: str) -> bool:
+        """Key có được gọi endpoint này không (so khớp theo path prefix, vd: /chat gồm cả /chat/stream)"""
+        if self.endpoints is None:
+            return True
+        for prefix in self.endpoints:
+            if prefix == "/" or path == prefix or path.startswith(prefix + "/"):
+                return True
+        return False
+
+
+class ApiKeyRegistry:
+    """
+    Tập API keys hợp lệ, tra cứu O(1) theo hash với so sánh constant-time
+    
+    Nguồn keys: API_KEYS (tier mặc định, mọi endpoint) + API_KEYS_FILE (JSON):
+        
+        {
+          "tiers": {"partner": {"per_minute": 300, "per_hour": 10000}},
+          "keys": [
+            {"name": "partner-a", "key_sha256": "<hex>", "tier": "partner", "endpoints": ["/chat"]},
+            {"name": "admin", "key": "<plain key>"}
+          ]
+        }
+    """
+    
+    def __init__(self, api_keys: Iterable[str] = (), path: str = "", reload_interval: float = 5.0):
+        """
+        Args:
+            api_keys: Keys dạng plain text (từ API_KEYS)
+            path: File JSON chứa keys + metadata (trống = không dùng)
+            reload_interval: Chu kỳ (giây) kiểm tra file thay đổi (0 = không hot reload)
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self._static: Dict[str, ApiKeyInfo] = {}
+        for key in api_keys:
+            key_hash = hash_api_key(key)
+            self._static[key_hash] = ApiKeyInfo(key_hash)
+        self._keys: Dict[str, ApiKeyInfo] = dict(self._static)
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        if path:
+            self.reload()
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def _parse(self, data: Dict) -> Dict[str, ApiKeyInfo]:
+        tiers = data.get("tiers", {})
+        keys = dict(self._static)
+        for entry in data.get("keys", []):
+            if entry.get("disabled"):
+                continue
+            key_hash = (entry.get("key_sha256") or "").lower() or (
+                hash_api_key(entry["key"]) if entry.get("key") else ""
+            )
+            if len(key_hash) != 64:
+                raise ValueError(f"Key '{entry.get('name', '?')}' thiếu 'key' hoặc 'key_sha256' hợp lệ")
+            tier = entry.get("tier", DEFAULT_TIER)
+            if tier != DEFAULT_TIER and tier not in tiers:
+                raise ValueError(f"Key '{entry.get('name', '?')}' dùng tier không tồn tại: {tier}")
+            limits = tiers.get(tier, {})
+            keys[key_hash] = ApiKeyInfo(
+                key_hash,
+                name=entry.get("name", ""),
+                tier=tier,
+                per_minute=limits.get("per_minute"),
+                per_hour=limits.get("per_hour"),
+                endpoints=entry.get("endpoints")
+            )
+        return keys
+    
+    def reload(self) -> bool:
+        """
+        Nạp lại file keys nếu mtime thay đổi (file lỗi thì giữ nguyên keys đang dùng)
+        
+        Returns:
+            True nếu đã nạp lại
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError as e:
+                if self._mtime is None:
+                    logger.warning(f"⚠️ Không đọc được API_KEYS_FILE {self.path}: {str(e)}")
+                    self._mtime = -1.0
+                return False
+            if mtime == self._mtime:
+                return False
+            self._mtime = mtime
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    keys = self._parse(json.load(f))
+            except (OSError, ValueError, KeyError, AttributeError, TypeError) as e:
+                logger.error(f"❌ API_KEYS_FILE không hợp lệ, giữ nguyên {len(self._keys)} keys hiện tại: {str(e)}")
+                return False
+            # Thay cả dict một lần - các request đang chạy vẫn đọc dict cũ an toàn
+            self._keys = keys
+        logger.info(f"🔑 Đã nạp {len(keys)} API keys từ {self.path}")
+        return True
+    
+    def _maybe_reload(self):
+        if not self.path or self.reload_interval <= 0:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        self.reload()
+    
+    def lookup(self, api_key: Optional[str]) -> Optional[ApiKeyInfo]:
+        """
+        Tìm metadata của key
+        
+        Args:
+            api_key: Key từ header X-API-Key
+        
+        Returns:
+            ApiKeyInfo hoặc None nếu key không hợp lệ
+        """
+        if not api_key:
+            return None
+        self._maybe_reload()
+        key_hash = hash_api_key(api_key)
+        info = self._keys.get(key_hash)
+        # So sánh lại constant-time để thời gian phản hồi không phụ thuộc nội dung key
+        if info is None or not hmac.compare_digest(info.key_hash, key_hash):
+            return None
+        return info
+
+
+api_key_registry = ApiKeyRegistry(
+    settings.api_keys_list,
+    path=settings.API_KEYS_FILE,
+    reload_interval=settings.API_KEYS_RELOAD_INTERVAL
+)
+
+
+def _check_endpoint(info: ApiKeyInfo, request: Request):
+    if not info.allows(request.url.path):
+        logger.warning(f"⚠️ API key {info.name} không được phép gọi {request.url.path}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="API Key not allowed for this endpoint",
+        )
+    request.state.api_key_info = info
+
+
+async def verify_api_key(request: Request, api_key: Optional[str] = Security(api_key_header)) -> str:
     """
     Verify API key from request header
     
     Args:
+        request: Request hiện tại (để kiểm tra endpoint được phép)
         api_key: API key from X-API-Key header
-        
+    
     Returns:
         str: Validated API key
-        
+    
     Raises:
-        HTTPException: If API key is invalid or missing
+        HTTPException: If API key is invalid or missing (401), hoặc không được phép gọi endpoint (403)
     """
     # Nếu không bật xác thực API key, cho phép tất cả requests
     if not settings.ENABLE_API_KEY_AUTH:
@@ -44,30 +249,34 @@ async def verify_api_key(api_key: Optional[str] = Security(api_key_header)) -> s
         )
     
     # Kiểm tra API key có hợp lệ không
-    if api_key not in settings.api_keys_list:
+    info = api_key_registry.lookup(api_key)
+    if info is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API Key",
             headers={"WWW-Authenticate": "ApiKey"},
         )
     
+    _check_endpoint(info, request)
     return api_key
 
 
 # Optional dependency - không bắt buộc API key
 async def optional_verify_api_key(
+    request: Request,
     api_key: Optional[str] = Security(api_key_header)
 ) -> Optional[str]:
     """
     Optional API key verification - không throw error nếu missing
+    
+    Key hợp lệ nhưng không được phép gọi endpoint vẫn bị từ chối (403).
     """
     if not settings.ENABLE_API_KEY_AUTH:
         return "public"
     
-    if not api_key:
+    info = api_key_registry.lookup(api_key)
+    if info is None:
         return None
     
-    if api_key in settings.api_keys_list:
-        return api_key
-    
-    return None
+    _check_endpoint(info, request)
+    return api_key
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chi phí xác thực API key theo số keys
+
+So sánh cách cũ (settings.api_keys_list tách lại chuỗi API_KEYS rồi tìm tuyến tính
+bằng `in` mỗi request) với ApiKeyRegistry (nạp một lần, tra dict theo SHA-256,
+so sánh constant-time) ở 10 / 100 / 1000 keys. Đo cả key hợp lệ (key cuối danh
+sách - trường hợp xấu nhất của cách cũ) và key không hợp lệ.
+
+    python benchmarks/bench_auth.py --keys 10 100 1000 --lookups 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import ApiKeyRegistry, generate_api_key
+
+
+def legacy_lookup(api_keys: str, api_key: str) -> bool:
+    """Bản cũ: parse API_KEYS mỗi lần rồi tìm tuyến tính"""
+    keys = [key.strip() for key in api_keys.split(",") if key.strip()] if api_keys else []
+    return api_key in keys
+
+
+def per_lookup_us(func, lookups: int) -> float:
+    start = time.perf_counter()
+    for _ in range(lookups):
+        func()
+    return round((time.perf_counter() - start) / lookups * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, nargs="+", default=[10, 100, 1000], help="Số keys cần đo")
+    parser.add_argument("--lookups", type=int, default=20000, help="Số lần tra cứu mỗi trường hợp")
+    args = parser.parse_args()
+
+    for count in args.keys:
+        keys = [generate_api_key() for _ in range(count)]
+        api_keys = ",".join(keys)
+        registry = ApiKeyRegistry(keys)
+        valid, invalid = keys[-1], generate_api_key()
+        assert legacy_lookup(api_keys, valid) and registry.lookup(valid) is not None
+        assert not legacy_lookup(api_keys, invalid) and registry.lookup(invalid) is None
+
+        print(json.dumps({
+            "keys": count,
+            "legacy_valid_us": per_lookup_us(lambda: legacy_lookup(api_keys, valid), args.lookups),
+            "legacy_invalid_us": per_lookup_us(lambda: legacy_lookup(api_keys, invalid), args.lookups),
+            "registry_valid_us": per_lookup_us(lambda: registry.lookup(valid), args.lookups),
+            "registry_invalid_us": per_lookup_us(lambda: registry.lookup(invalid), args.lookups),
+        }))
+
+
+if __name__ == "__main__":
+    main()
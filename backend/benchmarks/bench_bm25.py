@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Benchmark: độ trễ BM25 search + RRF fusion theo số chunks của LexicalIndex
+
+Sinh chunks tiếng Việt tổng hợp (từ vựng phân bố Zipf + tên thuốc / mã ICD hiếm),
+build index qua LexicalIndex.add, rồi đo thời gian mỗi query gồm BM25 search
+top HYBRID_CANDIDATES và fuse với một danh sách dense giả lập.
+
+Với --chroma, các chunks còn được ghi vào một ChromaDB collection tạm (embedding
+ngẫu nhiên) và đo VectorStore._fuse_results thật - gồm collection.get các chunks
+chỉ có trong BM25 - khi retrieval cache trống và khi query lặp lại.
+
+    python benchmarks/bench_bm25.py --chunks 1000000
+    python benchmarks/bench_bm25.py --chunks 200000 --chroma
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from cache import LRUCache
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+
+ONSETS = ["b", "c", "ch", "d", "đ", "g", "h", "k", "kh", "l", "m", "n", "ng", "nh", "ph", "s", "t", "th", "tr", "v", "x"]
+RHYMES = ["a", "á", "à", "ạ", "an", "ăn", "âm", "em", "ên", "ết", "i", "inh", "o", "ó", "ông", "ơi", "u", "ung", "ương", "ười", "yết"]
+DRUGS = ["paracetamol", "ibuprofen", "amoxicillin", "metformin", "amlodipin", "omeprazol", "ceftriaxon", "oresol"]
+ICD_CODES = ["J45.9", "E11", "I10", "A90", "K29.7"]
+
+QUERIES = [
+    "liều paracetamol 500mg cho trẻ em",
+    "mã ICD J45.9 hen phế quản",
+    "triệu chứng sốt xuất huyết và cách theo dõi tiểu cầu",
+    "chống chỉ định amoxicillin",
+    "bệnh nhân tăng huyết áp dùng amlodipin 5mg",
+    "E11 đái tháo đường type 2 metformin",
+]
+
+
+def head_queries(index: LexicalIndex, vocab: list) -> list:
+    """Query gồm các term phổ biến nhất còn dưới ngưỡng BM25_MAX_DF_RATIO (postings dài nhất)"""
+    max_df = settings.BM25_MAX_DF_RATIO * len(index)
+    frequent = [
+        word for word in vocab
+        if word in index._terms and len(index._post_docs[index._terms[word]]) <= max_df
+    ]
+    frequent.sort(key=lambda word: -len(index._post_docs[index._terms[word]]))
+    return [
+        " ".join(frequent[:4]),
+        " ".join(frequent[:8]) + " paracetamol",
+        " ".join(frequent[4:10]) + " I10",
+    ]
+
+
+def make_vocab(size: int, rng) -> list:
+    syllables = sorted({o + r for o in ONSETS for r in RHYMES})
+    vocab = list(syllables)
+    while len(vocab) < size:
+        vocab.append("".join(rng.choice(syllables, 2)))
+    return vocab[:size]
+
+
+def generate_chunks(n: int, tokens: int, vocab: list, rng):
+    """Sinh n chunks, mỗi chunk ~tokens âm tiết theo phân bố Zipf"""
+    ranks = np.minimum(rng.zipf(1.3, size=(n, tokens)) - 1, len(vocab) - 1)
+    for i in range(n):
+        words = [vocab[j] for j in ranks[i]]
+        if i % 50 == 0:
+            words.append(DRUGS[i % len(DRUGS)])
+            words.append(f"{(i % 9 + 1) * 100}mg")
+        if i % 200 == 0:
+            words.append(ICD_CODES[(i // 200) % len(ICD_CODES)])
+        yield f"bench_{i}", " ".join(words)
+
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "p50_ms": round(statistics.median(values), 2),
+        "p95_ms": round(values[int(len(values) * 0.95) - 1], 2),
+        "p99_ms": round(values[int(len(values) * 0.99) - 1], 2)
+    }
+
+
+def bench_chroma_fusion(index: LexicalIndex, chunks: int, tokens: int, vocab: list, queries: list, repeats: int):
+    """Đo dense query + _fuse_results (kể cả collection.get) trên ChromaDB thật"""
+    import chromadb
+    from vector_store import VectorStore
+
+    rng = np.random.default_rng(1)
+    dim = 384
+    client = chromadb.PersistentClient(path=tempfile.mkdtemp(prefix="bench_chroma_"))
+    collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+
+    start = time.perf_counter()
+    batch = []
+    for doc_id, text in generate_chunks(chunks, tokens, vocab, np.random.default_rng(0)):
+        batch.append((doc_id, text))
+        if len(batch) == 5000:
+            embeddings = rng.standard_normal((len(batch), dim), dtype=np.float32)
+            collection.add(
+                ids=[b[0] for b in batch],
+                documents=[b[1] for b in batch],
+                metadatas=[{"source": "bench.pdf"}] * len(batch),
+                embeddings=embeddings
+            )
+            batch = []
+    if batch:
+        collection.add(
+            ids=[b[0] for b in batch],
+            documents=[b[1] for b in batch],
+            metadatas=[{"source": "bench.pdf"}] * len(batch),
+            embeddings=rng.standard_normal((len(batch), dim), dtype=np.float32)
+        )
+    print(json.dumps({"chroma_chunks": collection.count(), "chroma_build_seconds": round(time.perf_counter() - start, 1)}))
+
+    # Chỉ cần collection + retrieval cache cho _fuse_results, không load embedding model
+    store = VectorStore.__new__(VectorStore)
+    store.collection = collection
+    store.collection_version = 0
+    store.retrieval_cache = LRUCache(max_bytes=settings.RETRIEVAL_CACHE_MAX_MB * 1024 * 1024, sizeof=store._sizeof_results)
+
+    k = settings.HYBRID_CANDIDATES
+    query_embeddings = {query: rng.standard_normal(dim).astype(np.float32).tolist() for query in queries}
+    dense_ms, cold_ms, cached_ms, missing = [], [], [], []
+    for _ in range(repeats):
+        for query in queries:
+            embedding = query_embeddings[query]
+            lexical = index.search(query, k)
+            started = time.perf_counter()
+            results = collection.query(query_embeddings=[embedding], n_results=k)
+            dense_ms.append((time.perf_counter() - started) * 1000)
+            dense = list(zip(results["documents"][0], results["metadatas"][0], results["distances"][0], results["ids"][0]))
+            dense_ids = {d[3] for d in dense}
+            missing.append(sum(1 for doc_id, _ in lexical if doc_id not in dense_ids))
+
+            # Lần đầu: cache trống, phải collection.get các chunks chỉ có trong BM25
+            store.retrieval_cache.clear()
+            started = time.perf_counter()
+            store._fuse_results(collection, embedding, dense, lexical, settings.TOP_K_RESULTS, None)
+            cold_ms.append((time.perf_counter() - started) * 1000)
+
+            # Query lặp lại: lấy từ retrieval cache
+            started = time.perf_counter()
+            store._fuse_results(collection, embedding, dense, lexical, settings.TOP_K_RESULTS, None)
+            cached_ms.append((time.perf_counter() - started) * 1000)
+
+    print(json.dumps({"stage": "dense_query", **percentiles(dense_ms)}))
+    print(json.dumps({"stage": "fuse_uncached", "avg_missing_ids": round(statistics.mean(missing), 1), **percentiles(cold_ms)}))
+    print(json.dumps({"stage": "fuse_cached", **percentiles(cached_ms)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1_000_000, help="Số chunks trong index")
+    parser.add_argument("--tokens", type=int, default=120, help="Số âm tiết mỗi chunk")
+    parser.add_argument("--vocab", type=int, default=30000, help="Kích thước từ vựng")
+    parser.add_argument("--queries", type=int, default=300, help="Số lần query")
+    parser.add_argument("--chroma", action="store_true", help="Đo thêm fusion trên ChromaDB thật (gồm collection.get)")
+    parser.add_argument("--chroma-repeats", type=int, default=20, help="Số vòng query khi đo ChromaDB")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vocab = make_vocab(args.vocab, rng)
+    index = LexicalIndex(
+        Path(tempfile.mkdtemp(prefix="bench_bm25_")) / "bench_bm25",
+        k1=settings.BM25_K1,
+        b=settings.BM25_B,
+        max_df_ratio=settings.BM25_MAX_DF_RATIO,
+        max_term_postings=settings.BM25_MAX_TERM_POSTINGS,
+        log_max_docs=args.chunks + 1
+    )
+
+    start = time.perf_counter()
+    batch_ids, batch_texts = [], []
+    for doc_id, text in generate_chunks(args.chunks, args.tokens, vocab, rng):
+        batch_ids.append(doc_id)
+        batch_texts.append(text)
+        if len(batch_ids) == settings.INGEST_BATCH_SIZE:
+            index.add(batch_ids, batch_texts)
+            batch_ids, batch_texts = [], []
+    index.add(batch_ids, batch_texts)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.snapshot()
+    snapshot = time.perf_counter() - start
+    print(json.dumps({
+        "chunks": args.chunks,
+        "build_seconds": round(build, 1),
+        "snapshot_seconds": round(snapshot, 2),
+        "snapshot_mb": round(index.snapshot_path.stat().st_size / 1e6, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **index.stats()
+    }))
+
+    start = time.perf_counter()
+    reloaded = LexicalIndex(index.path)
+    reloaded.load()
+    print(json.dumps({"load_seconds": round(time.perf_counter() - start, 2), "chunks": len(reloaded)}))
+    del reloaded
+
+    # Dense ranking giả lập - đo riêng chi phí BM25 + fusion
+    dense = [f"bench_{i}" for i in rng.integers(0, args.chunks, settings.HYBRID_CANDIDATES)]
+    queries = QUERIES + head_queries(index, vocab)
+    for query in queries:
+        index.search(query, settings.HYBRID_CANDIDATES)
+
+    latencies = {query: [] for query in queries}
+    for i in range(args.queries):
+        query = queries[i % len(queries)]
+        started = time.perf_counter()
+        lexical = index.search(query, settings.HYBRID_CANDIDATES)
+        reciprocal_rank_fusion([dense, [doc_id for doc_id, _ in lexical]], settings.HYBRID_RRF_K)
+        latencies[query].append((time.perf_counter() - started) * 1000)
+
+    for query, values in latencies.items():
+        print(json.dumps({
+            "query": query,
+            "p50_ms": round(statistics.median(values), 2),
+            "max_ms": round(max(values), 2),
+            "hits": len(index.search(query, settings.HYBRID_CANDIDATES))
+        }, ensure_ascii=False))
+
+    print(json.dumps(percentiles([v for values in latencies.values() for v in values])))
+
+    if args.chroma:
+        bench_chroma_fusion(index, args.chunks, args.tokens, vocab, queries, args.chroma_repeats)
+
+
+if __name__ == "__main__":
+    main()
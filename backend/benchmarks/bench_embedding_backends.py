@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: so sánh embedding backends (PyTorch fp32, ONNX Runtime fp32, ONNX int8)
+
+Đo thời gian load, throughput ingestion (chunks/s, batch EMBEDDING_BATCH_SIZE),
+độ trễ embed một query (p50/p95) và cosine drift của từng backend so với PyTorch
+trên cùng texts. Với --check, script trả về exit code 1 nếu drift vượt ngưỡng
+(dùng làm equivalence test trước khi bật EMBEDDING_BACKEND=onnx).
+
+    python benchmarks/bench_embedding_backends.py --chunks 1000 --check
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from embedding_backend import OnnxEmbeddingBackend, SentenceTransformerBackend, cosine_drift
+
+
+SAMPLE_SENTENCES = [
+    "Sốt xuất huyết Dengue là bệnh truyền nhiễm cấp tính do virus Dengue gây ra.",
+    "Triệu chứng thường gặp gồm sốt cao đột ngột, đau đầu, đau hốc mắt và đau cơ.",
+    "Bệnh nhân cần được theo dõi tiểu cầu và hematocrit trong giai đoạn nguy hiểm.",
+    "Không tự ý dùng aspirin hoặc ibuprofen khi nghi ngờ sốt xuất huyết.",
+    "Tăng huyết áp được chẩn đoán khi huyết áp tâm thu từ 140 mmHg trở lên.",
+    "Paracetamol liều 10-15mg/kg mỗi 6 giờ, tối đa 4g mỗi ngày ở người lớn.",
+]
+
+QUERIES = [
+    "triệu chứng sốt xuất huyết",
+    "liều paracetamol cho trẻ em",
+    "khi nào cần nhập viện vì tăng huyết áp",
+    "có nên dùng ibuprofen khi sốt không",
+]
+
+
+def make_chunks(n: int) -> list:
+    return [
+        f"[Chunk {i}] " + " ".join(SAMPLE_SENTENCES[(i + j) % len(SAMPLE_SENTENCES)] for j in range(i % 8 + 2))
+        for i in range(n)
+    ]
+
+
+def load_backends(args) -> dict:
+    backends = {}
+    loaders = {
+        "sentence_transformers": lambda: SentenceTransformerBackend(args.model),
+        "onnx": lambda: OnnxEmbeddingBackend(args.model, model_dir=args.onnx_dir),
+        "onnx-int8": lambda: OnnxEmbeddingBackend(
+            args.model, model_dir=args.onnx_dir, quantize=True, cache_dir=settings.EMBEDDING_ONNX_CACHE_DIR
+        ),
+    }
+    for name in args.backends:
+        start = time.perf_counter()
+        backends[name] = loaders[name]()
+        print(json.dumps({"backend": name, "load_seconds": round(time.perf_counter() - start, 2)}))
+    return backends
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL, help="Embedding model")
+    parser.add_argument("--backends", nargs="+", default=["sentence_transformers", "onnx", "onnx-int8"])
+    parser.add_argument("--onnx-dir", default=settings.EMBEDDING_ONNX_DIR, help="Thư mục model ONNX (trống = HF Hub)")
+    parser.add_argument("--chunks", type=int, default=1000, help="Số chunks cho phần đo ingestion")
+    parser.add_argument("--queries", type=int, default=200, help="Số lần embed một query")
+    parser.add_argument("--check", action="store_true", help="Exit 1 nếu cosine drift vượt ngưỡng")
+    parser.add_argument("--max-drift", type=float, default=1e-4, help="Ngưỡng drift cho ONNX fp32")
+    parser.add_argument("--max-drift-int8", type=float, default=0.02, help="Ngưỡng drift cho ONNX int8")
+    args = parser.parse_args()
+
+    backends = load_backends(args)
+    chunks = make_chunks(args.chunks)
+    drift_texts = chunks[:200] + QUERIES
+
+    reference = None
+    if "sentence_transformers" in backends:
+        reference = backends["sentence_transformers"].encode(drift_texts, settings.EMBEDDING_BATCH_SIZE)
+
+    failed = False
+    for name, backend in backends.items():
+        # Warm-up (khởi tạo thread pool, allocator)
+        backend.encode(chunks[:settings.EMBEDDING_BATCH_SIZE], settings.EMBEDDING_BATCH_SIZE)
+
+        start = time.perf_counter()
+        backend.encode(chunks, settings.EMBEDDING_BATCH_SIZE)
+        ingest_seconds = time.perf_counter() - start
+
+        latencies = []
+        for i in range(args.queries):
+            started = time.perf_counter()
+            backend.encode([QUERIES[i % len(QUERIES)]])
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+
+        result = {
+            "backend": name,
+            "ingest_chunks_per_sec": round(len(chunks) / ingest_seconds, 1),
+            "query_p50_ms": round(statistics.median(latencies), 2),
+            "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        }
+        if reference is not None and name != "sentence_transformers":
+            drift = cosine_drift(reference, backend.encode(drift_texts, settings.EMBEDDING_BATCH_SIZE))
+            limit = args.max_drift_int8 if name == "onnx-int8" else args.max_drift
+            drift["passed"] = drift["max_drift"] <= limit
+            failed = failed or not drift["passed"]
+            result.update(drift)
+        print(json.dumps(result))
+
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
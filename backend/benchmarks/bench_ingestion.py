@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput ingestion (chunks/s) và bộ nhớ Python đỉnh
+
+So sánh cách cũ (một lần encode toàn bộ + .tolist() + một lần collection.add)
+với pipeline batch của VectorStore.add_documents_stream trên một ChromaDB tạm.
+
+    python benchmarks/bench_ingestion.py --chunks 2000 --batch-size 256
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+
+SAMPLE_SENTENCES = [
+    "Sốt xuất huyết Dengue là bệnh truyền nhiễm cấp tính do virus Dengue gây ra.",
+    "Triệu chứng thường gặp gồm sốt cao đột ngột, đau đầu, đau hốc mắt và đau cơ.",
+    "Bệnh nhân cần được theo dõi tiểu cầu và hematocrit trong giai đoạn nguy hiểm.",
+    "Không tự ý dùng aspirin hoặc ibuprofen khi nghi ngờ sốt xuất huyết.",
+    "Tăng huyết áp được chẩn đoán khi huyết áp tâm thu từ 140 mmHg trở lên.",
+]
+
+
+def make_chunks(n: int):
+    texts = []
+    for i in range(n):
+        body = " ".join(SAMPLE_SENTENCES[(i + j) % len(SAMPLE_SENTENCES)] for j in range(12))
+        texts.append(f"[Chunk {i}] {body}")
+    metadatas = [{"source": "benchmark.pdf", "chunk_id": i} for i in range(n)]
+    ids = [f"bench_{i}" for i in range(n)]
+    return texts, metadatas, ids
+
+
+def run_legacy(store, texts, metadatas, ids) -> None:
+    """Cách cũ: encode toàn bộ, .tolist(), một lần collection.add"""
+    embeddings = store.embedding_model.encode(texts).tolist()
+    store.collection.add(
+        embeddings=embeddings,
+        documents=texts,
+        metadatas=metadatas,
+        ids=ids
+    )
+
+
+def run_batched(store, texts, metadatas, ids) -> None:
+    store.add_documents_stream(zip(texts, metadatas, ids))
+
+
+def measure(name: str, fn, store, texts, metadatas, ids) -> dict:
+    store.delete_collection()
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(store, texts, metadatas, ids)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        "mode": name,
+        "chunks": len(texts),
+        "seconds": round(elapsed, 2),
+        "chunks_per_sec": round(len(texts) / elapsed, 1),
+        "python_peak_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000, help="Số chunks tổng hợp")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE, help="INGEST_BATCH_SIZE")
+    parser.add_argument("--embedding-batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+    
+    settings.CHROMA_PERSIST_DIRECTORY = tempfile.mkdtemp(prefix="bench_chroma_")
+    settings.CHROMA_COLLECTION_NAME = "bench_ingestion"
+    settings.INGEST_BATCH_SIZE = args.batch_size
+    settings.EMBEDDING_BATCH_SIZE = args.embedding_batch_size
+    
+    from vector_store import VectorStore
+    store = VectorStore()
+    texts, metadatas, ids = make_chunks(args.chunks)
+    
+    # Warm-up để không tính thời gian load lazy của model
+    store.embed_batch(texts[:8])
+    
+    for name, fn in (("legacy (encode all + tolist)", run_legacy), ("batched stream", run_batched)):
+        print(json.dumps(measure(name, fn, store, texts, metadatas, ids), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
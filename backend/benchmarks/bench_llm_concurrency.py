@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency đồng thời của /chat path trước và sau khi chuyển sang AsyncClient
+
+Chạy một stub Ollama server local (không cần Ollama thật), bắn N request đồng thời
+và đo p50/p99 latency cùng độ trễ event loop (đại diện cho /health).
+
+    python benchmarks/bench_llm_concurrency.py --requests 32 --tokens 40 --token-delay 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ollama
+
+from config import settings
+
+
+def make_stub_handler(tokens: int, token_delay: float):
+    """Tạo handler giả lập /api/chat và /api/tags của Ollama"""
+    
+    class StubOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def log_message(self, *args):
+            pass
+        
+        def _send_json(self, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_GET(self):
+            self._send_json({"models": []})
+        
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            
+            if not request.get("stream", True):
+                time.sleep(tokens * token_delay)
+                self._send_json({
+                    "model": request.get("model", "stub"),
+                    "message": {"role": "assistant", "content": "tok " * tokens},
+                    "done": True
+                })
+                return
+            
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i in range(tokens):
+                    time.sleep(token_delay)
+                    line = json.dumps({
+                        "model": request.get("model", "stub"),
+                        "message": {"role": "assistant", "content": "tok "},
+                        "done": i == tokens - 1
+                    }).encode() + b"\n"
+                    self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+    
+    return StubOllamaHandler
+
+
+def start_stub_server(tokens: int, token_delay: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_stub_handler(tokens, token_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.01):
+    """Đo độ trễ event loop - mô phỏng latency của /health trong lúc tải"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run_scenario(name: str, call, n_requests: int) -> dict:
+    latencies = []
+    lag_samples = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag_samples))
+    
+    # Tất cả request được gửi cùng lúc - latency tính từ thời điểm submit
+    wall_start = time.perf_counter()
+    
+    async def timed(kind):
+        await call(kind)
+        latencies.append(time.perf_counter() - wall_start)
+    
+    await asyncio.gather(*(timed(i % 2 == 0) for i in range(n_requests)))
+    wall = time.perf_counter() - wall_start
+    stop.set()
+    await lag_task
+    
+    return {
+        "scenario": name,
+        "requests": n_requests,
+        "wall_s": round(wall, 3),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "loop_lag_p99_ms": round(percentile(lag_samples or [0.0], 99) * 1000, 1),
+    }
+
+
+async def main_async(args):
+    server = start_stub_server(args.tokens, args.token_delay)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    settings.OLLAMA_BASE_URL = base_url
+    settings.LLM_MAX_CONCURRENT_REQUESTS = args.concurrency
+    messages = [{"role": "user", "content": "triệu chứng sốt xuất huyết"}]
+    
+    # Trước: ollama.Client đồng bộ gọi trực tiếp trong coroutine (code cũ)
+    sync_client = ollama.Client(host=base_url)
+    
+    async def legacy_call(stream: bool):
+        if stream:
+            for _ in sync_client.chat(model="stub", messages=messages, stream=True):
+                pass
+        else:
+            sync_client.chat(model="stub", messages=messages)
+    
+    # Sau: LLMService với AsyncClient + semaphore
+    from llm_service import LLMService
+    service = LLMService(vector_store=None)
+    
+    async def async_call(stream: bool):
+        if stream:
+            async for _ in service.stream_response("triệu chứng sốt xuất huyết", use_rag=False):
+                pass
+        else:
+            await service.generate_response("triệu chứng sốt xuất huyết", use_rag=False)
+    
+    results = [
+        await run_scenario("before (sync ollama.Client)", legacy_call, args.requests),
+        await run_scenario("after (ollama.AsyncClient)", async_call, args.requests),
+    ]
+    server.shutdown()
+    
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32, help="Số request đồng thời")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM_MAX_CONCURRENT_REQUESTS")
+    parser.add_argument("--tokens", type=int, default=40, help="Số token stub trả về mỗi request")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Thời gian (giây) mỗi token")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chi phí của instrumentation hooks (metrics.py) trên hot path
+
+Đo thời gian mỗi lần observe() / inc() (một thread và nhiều threads cùng lúc)
+và thời gian render toàn bộ /metrics. So sánh với độ trễ một request RAG
+(hàng chục ms) để chắc chắn overhead không đáng kể.
+
+    python benchmarks/bench_metrics.py --ops 200000 --threads 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import RAG_STAGE_SECONDS, RATE_LIMIT_REJECTIONS, REGISTRY
+
+
+def per_op_ns(func, ops: int, threads: int = 1) -> float:
+    def run():
+        for i in range(ops):
+            func(i)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (ops * threads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=200000, help="Số lần observe mỗi thread")
+    parser.add_argument("--threads", type=int, default=8, help="Số threads cho phần đo tranh chấp lock")
+    args = parser.parse_args()
+
+    histogram = RAG_STAGE_SECONDS.labels("bench")
+    counter = RATE_LIMIT_REJECTIONS.labels("bench")
+    baseline = per_op_ns(lambda i: None, args.ops)
+
+    results = {
+        "baseline_loop_ns": round(baseline, 1),
+        "histogram_observe_ns": round(per_op_ns(lambda i: histogram.observe(i % 1000 / 1e4), args.ops) - baseline, 1),
+        "histogram_labels_observe_ns": round(
+            per_op_ns(lambda i: RAG_STAGE_SECONDS.labels("bench").observe(i % 1000 / 1e4), args.ops) - baseline, 1
+        ),
+        "counter_inc_ns": round(per_op_ns(lambda i: counter.inc(), args.ops) - baseline, 1),
+        f"histogram_observe_{args.threads}_threads_ns": round(
+            per_op_ns(lambda i: histogram.observe(i % 1000 / 1e4), args.ops, args.threads) - baseline, 1
+        ),
+    }
+
+    start = time.perf_counter()
+    text = REGISTRY.render()
+    results["render_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    results["render_bytes"] = len(text.encode("utf-8"))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
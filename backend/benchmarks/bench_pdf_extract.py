@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scaling của extract PDF song song theo số process
+
+Tạo một PDF tổng hợp nhiều trang, chạy PDFProcessor.extract_text_from_pdf với
+PDF_EXTRACT_WORKERS = 1, 2, 4, ... và kiểm tra output giống hệt đường tuần tự.
+
+    python benchmarks/bench_pdf_extract.py --pages 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+
+def make_synthetic_pdf(pages: int, lines_per_page: int = 45) -> bytes:
+    """Tạo PDF text-only tối giản (không cần thư viện ngoài)"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages - điền sau khi biết các page objects
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = " ".join(
+            f"(Trang {page + 1} dong {line}: sot xuat huyet Dengue, theo doi tieu cau va hematocrit.) '"
+            for line in range(lines_per_page)
+        )
+        stream = f"BT /F1 9 Tf 40 800 Td 11 TL {lines} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Contents {content_id} 0 R /Resources << /Font << /F1 3 0 R >> >> >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+    
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    return bytes(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500, help="Số trang của PDF tổng hợp")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    
+    from pdf_processor import PDFProcessor
+    
+    pdf = make_synthetic_pdf(args.pages)
+    settings.PDF_PARALLEL_MIN_PAGES = 1
+    
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= args.max_workers:
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != args.max_workers:
+        worker_counts.append(args.max_workers)
+    
+    baseline_text = None
+    baseline_seconds = None
+    for workers in worker_counts:
+        settings.PDF_EXTRACT_WORKERS = workers
+        processor = PDFProcessor(vector_store=None)
+        
+        if workers > 1:
+            # Khởi động process pool trước để không tính thời gian spawn
+            processor._extract_pages_parallel(make_synthetic_pdf(workers), workers)
+        
+        start = time.perf_counter()
+        text = processor.extract_text_from_pdf(pdf)
+        elapsed = time.perf_counter() - start
+        processor.shutdown()
+        
+        if baseline_text is None:
+            baseline_text, baseline_seconds = text, elapsed
+        
+        print(json.dumps({
+            "workers": workers,
+            "pages": args.pages,
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": round(args.pages / elapsed, 1),
+            "speedup": round(baseline_seconds / elapsed, 2),
+            "identical_output": text == baseline_text,
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark: độ trễ mỗi lần kiểm tra rate limit với nhiều clients
+
+So sánh RateLimiter (sliding window counter, sharded locks) với cách cũ (list
+lịch sử mỗi client + một asyncio.Lock chung) ở 10k clients khác nhau, sau khi
+mỗi client đã có sẵn --history request trong giờ vừa qua. Đo thêm throughput
+khi nhiều threads gọi hit() cùng lúc và số clients còn lại sau khi dọn.
+Với --stores, đo thêm độ trễ của các stores dùng chung giữa workers (sqlite, redis)
+sau khi kiểm tra store cho cùng quyết định với store in-memory. fakeredis chạy
+RedisRateLimitStore trên Redis giả lập trong process (không cần server).
+
+    python benchmarks/bench_rate_limiter.py --clients 10000 --requests 100000
+    python benchmarks/bench_rate_limiter.py --stores sqlite fakeredis
+    python benchmarks/bench_rate_limiter.py --stores redis --redis-url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit_store import MemoryRateLimitStore, RedisRateLimitStore, create_rate_limit_store
+from rate_limiter import RateLimiter
+
+
+class LegacyRateLimiter:
+    """Bản cũ: quét lại toàn bộ lịch sử của client mỗi request"""
+
+    def __init__(self, requests_per_minute: int, requests_per_hour: int):
+        self.requests_per_minute = requests_per_minute
+        self.requests_per_hour = requests_per_hour
+        self.request_history = defaultdict(list)
+        self.lock = asyncio.Lock()
+
+    async def check_rate_limit(self, client_id: str) -> bool:
+        async with self.lock:
+            now = datetime.now()
+            cutoff = now - timedelta(hours=1)
+            self.request_history[client_id] = [
+                (ts, count) for ts, count in self.request_history[client_id] if ts > cutoff
+            ]
+            one_minute_ago = now - timedelta(minutes=1)
+            minute_count = sum(count for ts, count in self.request_history[client_id] if ts > one_minute_ago)
+            hour_count = sum(count for ts, count in self.request_history[client_id] if ts > cutoff)
+            if minute_count >= self.requests_per_minute or hour_count >= self.requests_per_hour:
+                return False
+            self.request_history[client_id].append((now, 1))
+            return True
+
+
+def summarize(name: str, latencies_ns: list) -> dict:
+    latencies_ns.sort()
+    return {
+        "limiter": name,
+        "p50_us": round(statistics.median(latencies_ns) / 1000, 2),
+        "p99_us": round(latencies_ns[int(len(latencies_ns) * 0.99) - 1] / 1000, 2),
+        "max_us": round(latencies_ns[-1] / 1000, 2),
+    }
+
+
+async def run_async(limiter, clients: list, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        client_id = random.choice(clients)
+        start = time.perf_counter_ns()
+        try:
+            await limiter.check_rate_limit(client_id)
+        except Exception:
+            pass
+        latencies.append(time.perf_counter_ns() - start)
+    return latencies
+
+
+def run_threads(limiter: RateLimiter, clients: list, requests: int, threads: int) -> float:
+    def worker():
+        rng = random.Random()
+        for _ in range(requests // threads):
+            limiter.hit(rng.choice(clients))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return requests / (time.perf_counter() - start)
+
+
+def check_store(store, per_minute: int = 5, threads: int = 8) -> dict:
+    """
+    So quyết định của store với MemoryRateLimitStore trên cùng chuỗi requests
+    (vượt limit, request bị từ chối không được tính, clients độc lập, cửa sổ trượt),
+    rồi kiểm tra nhiều threads cùng client không lọt quá limit
+    """
+    windows = [("minute", 60, per_minute), ("hour", 3600, 1000)]
+    reference = MemoryRateLimitStore()
+    start = (int(time.time()) // 60) * 60 + 0.5
+    schedule = [("a", start + i * 0.01) for i in range(per_minute + 3)]
+    schedule += [("b", start + 1)]
+    schedule += [("a", start + 60 + t) for t in (1, 15, 30, 31, 45, 59)]
+    schedule += [("a", start + 180 + i * 0.01) for i in range(per_minute + 1)]
+    for client_id, now in schedule:
+        expected = reference.hit(f"check-{client_id}", windows, now)
+        actual = store.hit(f"check-{client_id}", windows, now)
+        got = (actual.allowed, actual.window, actual.remaining, actual.retry_after)
+        want = (expected.allowed, expected.window, expected.remaining, expected.retry_after)
+        assert got == want, f"{client_id}@{now - start:.2f}s: {got} != {want}"
+
+    now = start + 600
+    allowed = []
+
+    def worker():
+        for _ in range(per_minute):
+            allowed.append(store.hit("check-concurrent", windows, now).allowed)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    assert sum(allowed) <= per_minute, f"{sum(allowed)} requests lọt qua, limit {per_minute}"
+    return {"checked_requests": len(schedule) + len(allowed), "concurrent_allowed": sum(allowed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10000, help="Số clients khác nhau")
+    parser.add_argument("--requests", type=int, default=100000, help="Số lần kiểm tra mỗi limiter")
+    parser.add_argument("--history", type=int, default=500, help="Số request có sẵn của mỗi client trong giờ qua")
+    parser.add_argument("--per-minute", type=int, default=60)
+    parser.add_argument("--per-hour", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8, help="Số threads cho phần đo throughput")
+    parser.add_argument("--stores", nargs="*", default=[], choices=["sqlite", "redis", "fakeredis"], help="Stores dùng chung cần đo")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    args = parser.parse_args()
+
+    clients = [f"10.0.{i // 256}.{i % 256}" for i in range(args.clients)]
+
+    # Bản cũ: lịch sử trải đều trong giờ qua (ngoài phút hiện tại để không bị chặn)
+    legacy = LegacyRateLimiter(args.per_minute, args.per_hour)
+    now = datetime.now()
+    for client_id in clients:
+        legacy.request_history[client_id] = [
+            (now - timedelta(seconds=61 + i * 3500 / args.history), 1) for i in range(args.history)
+        ]
+
+    limiter = RateLimiter(args.per_minute, args.per_hour)
+    for client_id in clients:
+        limiter.hit(client_id)
+
+    print(json.dumps(summarize("legacy", asyncio.run(run_async(legacy, clients, args.requests)))))
+    print(json.dumps(summarize("sliding_window", asyncio.run(run_async(limiter, clients, args.requests)))))
+    print(json.dumps({
+        "limiter": "sliding_window",
+        "threads": args.threads,
+        "checks_per_sec": round(run_threads(limiter, clients, args.requests, args.threads))
+    }))
+
+    # Sau 2 giờ không hoạt động, clients cũ bị dọn khi các shards được truy cập lại
+    later = time.time() + 2 * 3600 + 1
+    for i in range(len(clients)):
+        limiter.hit(f"new-{i}", now=later)
+    print(json.dumps({"limiter": "sliding_window", "after_idle_eviction": limiter.stats()}))
+
+    for backend in args.stores:
+        if backend == "fakeredis":
+            import fakeredis
+
+            store = RedisRateLimitStore(args.redis_url, client=fakeredis.FakeRedis())
+        else:
+            store = create_rate_limit_store(
+                backend,
+                db_path=os.path.join(tempfile.mkdtemp(), "rate_limits.sqlite"),
+                redis_url=args.redis_url
+            )
+        print(json.dumps({"store": backend, **check_store(store)}))
+        shared = RateLimiter(args.per_minute, args.per_hour, store=store)
+        result = summarize(f"sliding_window_{backend}", asyncio.run(run_async(shared, clients, args.requests)))
+        result["store_errors"] = shared.store_errors
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
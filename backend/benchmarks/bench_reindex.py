@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reindex tuần tự từng file vs pipeline reindex (extract / embed / ghi chồng lên nhau)
+
+Tạo thư mục data tạm với nhiều PDF tổng hợp, chạy:
+  - sequential: đọc -> extract -> chunk -> embed -> ghi lần lượt từng file (cách cũ)
+  - pipeline:   PDFProcessor.reindex_all_pdfs_sync(full=True)
+
+    python benchmarks/bench_reindex.py --files 16 --pages 40
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from bench_pdf_extract import make_synthetic_pdf
+
+
+def run_sequential(processor, pdf_files) -> float:
+    processor.vector_store.delete_collection()
+    start = time.perf_counter()
+    for pdf_path in pdf_files:
+        processor.process_pdf_sync(pdf_path.read_bytes(), pdf_path.name)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=16, help="Số PDF files")
+    parser.add_argument("--pages", type=int, default=40, help="Số trang mỗi file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="PDF_EXTRACT_WORKERS")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_reindex_")
+    settings.CHROMA_PERSIST_DIRECTORY = os.path.join(workdir, "chroma")
+    settings.CHROMA_COLLECTION_NAME = "bench_reindex"
+    settings.PDF_DATA_PATH = os.path.join(workdir, "data")
+    settings.PDF_EXTRACT_WORKERS = args.workers
+    # Sequential baseline extract từng file trong process chính
+    settings.PDF_PARALLEL_MIN_PAGES = args.pages + 1
+
+    os.makedirs(settings.PDF_DATA_PATH)
+    for i in range(args.files):
+        with open(os.path.join(settings.PDF_DATA_PATH, f"doc_{i:03d}.pdf"), "wb") as f:
+            f.write(make_synthetic_pdf(args.pages))
+
+    from pathlib import Path
+    from vector_store import VectorStore
+    from pdf_processor import PDFProcessor
+
+    processor = PDFProcessor(VectorStore())
+    pdf_files = sorted(Path(settings.PDF_DATA_PATH).glob("*.pdf"))
+
+    # Warm-up model và process pool
+    processor.vector_store.embed_batch(["warm up"])
+    if processor.extract_workers > 1:
+        processor.submit_extract(make_synthetic_pdf(1)).result()
+
+    sequential = run_sequential(processor, pdf_files)
+    chunks = processor.vector_store.collection.count()
+    print(json.dumps({
+        "mode": "sequential",
+        "files": args.files,
+        "chunks": chunks,
+        "seconds": round(sequential, 2),
+        "chunks_per_sec": round(chunks / sequential, 1)
+    }))
+
+    result = processor.reindex_all_pdfs_sync(full=True)
+    pipeline = result["pipeline"]
+    print(json.dumps({
+        "mode": "pipeline",
+        "files": args.files,
+        "chunks": result["total_chunks"],
+        "seconds": pipeline["wall_seconds"],
+        "chunks_per_sec": round(result["total_chunks"] / pipeline["wall_seconds"], 1),
+        "speedup_vs_sequential": round(sequential / pipeline["wall_seconds"], 2),
+        "stages": pipeline["stages"],
+        "extract_workers": pipeline["extract_workers"]
+    }))
+    processor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
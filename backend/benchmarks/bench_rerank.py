@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: độ trễ cross-encoder rerank trên CPU theo số ứng viên
+
+Chấm các cặp (query, chunk) tiếng Việt tổng hợp dài ~1000 ký tự (chunk_size mặc
+định của PDFProcessor) bằng Reranker - một lần forward cho toàn bộ ứng viên, báo
+p50/p95 và tỉ lệ request vượt RERANK_TIMEOUT_MS - tức là các request sẽ fallback về thứ tự dense / hybrid.
+
+    python benchmarks/bench_rerank.py --candidates 10 20 40
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from reranker import Reranker
+
+
+QUERIES = [
+    "liều paracetamol cho trẻ em bị sốt cao",
+    "triệu chứng sốt xuất huyết và khi nào cần nhập viện",
+    "chống chỉ định amoxicillin ở phụ nữ có thai",
+    "bệnh nhân tăng huyết áp nên ăn uống như thế nào",
+]
+
+SENTENCES = [
+    "Bệnh nhân sốt cao trên 39 độ cần được theo dõi nhiệt độ mỗi 4 giờ.",
+    "Paracetamol dùng liều 10-15mg/kg mỗi 6 giờ, không quá 4 lần mỗi ngày.",
+    "Sốt xuất huyết Dengue có thể gây giảm tiểu cầu và xuất huyết dưới da.",
+    "Amoxicillin là kháng sinh nhóm beta-lactam, thận trọng với người dị ứng penicillin.",
+    "Người tăng huyết áp nên giảm muối, hạn chế rượu bia và tập thể dục đều đặn.",
+    "Cần đưa trẻ đến cơ sở y tế nếu có dấu hiệu li bì, co giật hoặc nôn nhiều.",
+    "Uống đủ nước và bù điện giải bằng oresol khi bị tiêu chảy hoặc sốt kéo dài.",
+    "Thuốc hạ áp nhóm chẹn kênh canxi như amlodipin thường dùng một lần mỗi ngày.",
+]
+
+
+def make_chunks(n: int, rng, chunk_chars: int) -> list:
+    """Sinh n chunks dài ~chunk_chars ký tự ghép từ các câu mẫu"""
+    chunks = []
+    for _ in range(n):
+        parts = []
+        while sum(len(part) + 1 for part in parts) < chunk_chars:
+            parts.append(SENTENCES[rng.integers(len(SENTENCES))])
+        chunks.append(" ".join(parts))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[settings.RERANK_CANDIDATES], help="Số ứng viên mỗi lần rerank")
+    parser.add_argument("--requests", type=int, default=50, help="Số lần rerank cho mỗi cấu hình")
+    parser.add_argument("--chunk-chars", type=int, default=1000, help="Độ dài mỗi chunk (ký tự)")
+    parser.add_argument("--model", default=settings.RERANK_MODEL, help="Cross-encoder model")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    # Không giới hạn thời gian để đo được độ trễ thật của model
+    reranker = Reranker(args.model, max_length=settings.RERANK_MAX_LENGTH, timeout_ms=0)
+    print(json.dumps({"model": args.model, "load_seconds": round(time.perf_counter() - start, 2)}))
+
+    # Warm-up (khởi tạo thread pool, allocator của torch)
+    reranker.rerank(QUERIES[0], make_chunks(max(args.candidates), rng, args.chunk_chars))
+
+    for candidates in args.candidates:
+        chunks = make_chunks(candidates, rng, args.chunk_chars)
+        latencies = []
+        for i in range(args.requests):
+            started = time.perf_counter()
+            reranker.rerank(QUERIES[i % len(QUERIES)], chunks)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        latencies.sort()
+        over_budget = sum(1 for value in latencies if value > settings.RERANK_TIMEOUT_MS)
+        print(json.dumps({
+            "candidates": candidates,
+            "p50_ms": round(statistics.median(latencies), 1),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+            "max_ms": round(latencies[-1], 1),
+            "timeout_ms": settings.RERANK_TIMEOUT_MS,
+            "fallback_ratio": round(over_budget / len(latencies), 3)
+        }))
+
+    reranker.shutdown()
+
+
+if __name__ == "__main__":
+    main()
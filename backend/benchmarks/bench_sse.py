@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark: số frames SSE và CPU server mỗi stream khi gộp tokens (sse.coalesce)
+
+Chạy một uvicorn server (subprocess) stream --tokens tokens với tốc độ --rate
+tokens/s (như Ollama) cho --streams clients đồng thời, theo hai cách:
+- per_token: mỗi token một frame, json.dumps + is_disconnected() mỗi token (cách cũ)
+- coalesced: coalesce() theo --coalesce-ms + sse.format_event (orjson nếu có)
+
+CPU được đo trong process server (gồm encode, ASGI send, write socket), client
+chỉ đếm frames.
+
+    python benchmarks/bench_sse.py --streams 100 --tokens 200 --rate 80
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sse import coalesce, format_event, orjson
+
+
+async def token_stream(tokens: int, rate: float):
+    for i in range(tokens):
+        await asyncio.sleep(1 / rate)
+        yield f"token{i % 50} "
+
+
+def create_app(mode: str, tokens: int, rate: float, interval: float):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+
+    @app.get("/stream")
+    async def stream(req: Request):
+        async def per_token():
+            async for chunk in token_stream(tokens, rate):
+                if await req.is_disconnected():
+                    break
+                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+
+        async def coalesced():
+            async for text in coalesce(token_stream(tokens, rate), interval=interval):
+                if await req.is_disconnected():
+                    break
+                yield format_event({"chunk": text}, "delta")
+
+        return StreamingResponse(per_token() if mode == "per_token" else coalesced(), media_type="text/event-stream")
+
+    @app.get("/cpu")
+    async def cpu():
+        return {"cpu": time.process_time()}
+
+    return app
+
+
+def serve(args):
+    import uvicorn
+    app = create_app(args.serve, args.tokens, args.rate, args.coalesce_ms / 1000)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+async def run_clients(args) -> dict:
+    import httpx
+
+    base = f"http://127.0.0.1:{args.port}"
+    frames = 0
+    received = 0
+
+    async def client(http):
+        nonlocal frames, received
+        async with http.stream("GET", f"{base}/stream") as response:
+            async for text in response.aiter_text():
+                frames += text.count("\n\n")
+                received += len(text)
+
+    limits = httpx.Limits(max_connections=args.streams + 1)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as http:
+        cpu_before = (await http.get(f"{base}/cpu")).json()["cpu"]
+        start = time.perf_counter()
+        await asyncio.gather(*[client(http) for _ in range(args.streams)])
+        wall = time.perf_counter() - start
+        cpu = (await http.get(f"{base}/cpu")).json()["cpu"] - cpu_before
+    return {
+        "frames": frames,
+        "frames_per_sec": round(frames / wall),
+        "bytes": received,
+        "server_cpu_ms_per_stream": round(cpu / args.streams * 1000, 2),
+        "wall_s": round(wall, 2),
+    }
+
+
+def bench(mode: str, args) -> dict:
+    server = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(args.port),
+        "--tokens", str(args.tokens), "--rate", str(args.rate), "--coalesce-ms", str(args.coalesce_ms)
+    ])
+    try:
+        import httpx
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{args.port}/cpu")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        return {"mode": mode, **asyncio.run(run_clients(args))}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=100, help="Số streams đồng thời")
+    parser.add_argument("--tokens", type=int, default=200, help="Số tokens mỗi stream")
+    parser.add_argument("--rate", type=float, default=80, help="Tokens/s mỗi stream")
+    parser.add_argument("--coalesce-ms", type=float, default=30, help="STREAM_COALESCE_MS")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", choices=["per_token", "coalesced"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    print(json.dumps({"orjson": orjson is not None}))
+    for mode in ("per_token", "coalesced"):
+        print(json.dumps(bench(mode, args)))
+
+
+if __name__ == "__main__":
+    main()
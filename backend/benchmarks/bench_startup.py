@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: thời gian import main.py và time-to-first-successful-chat
+
+Mỗi lần chạy khởi động uvicorn trong process mới (FAST_STARTUP bật / tắt), đo:
+  - import_seconds: thời gian `import main` (đo trong process riêng)
+  - accept_seconds: từ lúc spawn tới khi server trả lời /health
+  - ready_seconds: tới khi /health hết "warming"
+  - first_chat_seconds: tới khi POST /chat đầu tiên trả về 200
+
+Cần Ollama đang chạy (như khi chạy server bình thường).
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import() -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def request(url: str, payload: dict = None, timeout: float = 120):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def measure_server(port: int, fast_startup: bool, message: str, deadline_seconds: float) -> dict:
+    env = {**os.environ, "FAST_STARTUP": str(fast_startup), "API_PORT": str(port)}
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    result = {"fast_startup": fast_startup}
+    try:
+        deadline = started + deadline_seconds
+        while time.perf_counter() < deadline:
+            try:
+                status, body = request(f"{base}/health", timeout=5)
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.05)
+                continue
+            result.setdefault("accept_seconds", round(time.perf_counter() - started, 2))
+            if status == 200 and body["status"] != "warming":
+                result["ready_seconds"] = round(time.perf_counter() - started, 2)
+                break
+            time.sleep(0.05)
+
+        # /chat tự chờ warm-up (STARTUP_READY_TIMEOUT) nên gửi ngay sau khi server nhận kết nối
+        while time.perf_counter() < deadline:
+            status, _ = request(f"{base}/chat", {"message": message, "use_rag": True})
+            if status == 200:
+                result["first_chat_seconds"] = round(time.perf_counter() - started, 2)
+                break
+            time.sleep(0.2)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Số lần đo mỗi chế độ")
+    parser.add_argument("--port", type=int, default=8765, help="Port cho server benchmark")
+    parser.add_argument("--message", default="Triệu chứng sốt xuất huyết là gì?", help="Câu hỏi chat đầu tiên")
+    parser.add_argument("--timeout", type=float, default=300, help="Thời gian tối đa mỗi lần chạy (giây)")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    print(json.dumps({
+        "import_seconds_median": round(statistics.median(imports), 3),
+        "import_seconds_max": round(max(imports), 3)
+    }))
+
+    for fast_startup in (True, False):
+        for _ in range(args.runs):
+            print(json.dumps(measure_server(args.port, fast_startup, args.message, args.timeout)))
+
+
+if __name__ == "__main__":
+    main()
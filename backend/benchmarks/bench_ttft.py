@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: time-to-first-token qua các lượt liên tiếp của một hội thoại
+
+Chạy cùng một hội thoại nhiều lượt với từng PROMPT_LAYOUT (sliding / stable_prefix)
+trên Ollama thật, ghi lại TTFT và số token Ollama thực sự phải prefill
+(prompt_eval_count - phần prefix tái sử dụng từ KV cache không được tính).
+
+    python benchmarks/bench_ttft.py --turns 12 --history-tokens 600
+    python benchmarks/bench_ttft.py --stub   # chạy thử với stub Ollama, không cần model
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from models import ChatMessage
+
+
+QUESTIONS = [
+    "Triệu chứng sốt xuất huyết là gì?",
+    "Khi nào cần đưa bệnh nhân đi viện?",
+    "Có nên dùng aspirin để hạ sốt không?",
+    "Theo dõi tiểu cầu như thế nào?",
+    "Tăng huyết áp được chẩn đoán ra sao?",
+    "Chế độ ăn cho người tăng huyết áp?",
+]
+
+
+async def run_conversation(service, turns: int) -> list:
+    """Chạy hội thoại, trả về TTFT và prompt_eval_count của từng lượt"""
+    history = []
+    results = []
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        messages, usage = service.build_conversation_messages(question, history)
+
+        start = time.perf_counter()
+        ttft = None
+        answer = []
+        final = {}
+        stream = await service.async_client.chat(
+            model=service.model,
+            messages=messages,
+            stream=True,
+            options=service._build_options(),
+            keep_alive=service._keep_alive()
+        )
+        async for chunk in stream:
+            content = chunk["message"]["content"]
+            if ttft is None and content:
+                ttft = time.perf_counter() - start
+            answer.append(content)
+            if chunk.get("done"):
+                final = chunk
+
+        results.append({
+            "turn": turn + 1,
+            "ttft_ms": round((ttft or 0) * 1000, 1),
+            "prompt_tokens": usage["total"],
+            "history_dropped": usage["history_messages_dropped"],
+            "prompt_eval_count": final.get("prompt_eval_count"),
+        })
+        history.append(ChatMessage(role="user", content=question))
+        history.append(ChatMessage(role="assistant", content="".join(answer)))
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=12, help="Số lượt hỏi đáp")
+    parser.add_argument("--history-tokens", type=int, default=600, help="PROMPT_HISTORY_MAX_TOKENS")
+    parser.add_argument("--max-tokens", type=int, default=128, help="MAX_TOKENS mỗi câu trả lời")
+    parser.add_argument("--stub", action="store_true", help="Dùng stub Ollama thay vì server thật")
+    args = parser.parse_args()
+
+    if args.stub:
+        from bench_llm_concurrency import start_stub_server
+        server = start_stub_server(tokens=40, token_delay=0.002)
+        settings.OLLAMA_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+
+    settings.PROMPT_HISTORY_MAX_TOKENS = args.history_tokens
+    settings.MAX_TOKENS = args.max_tokens
+
+    from llm_service import LLMService
+    service = LLMService(vector_store=None)
+
+    # Lượt đầu khi model chưa load vs. sau preload
+    await service.async_client.generate(model=service.model, prompt="", keep_alive=0)
+    start = time.perf_counter()
+    await service.preload_model()
+    print(json.dumps({"preload_seconds": round(time.perf_counter() - start, 2)}))
+
+    for layout in ("sliding", "stable_prefix"):
+        settings.PROMPT_LAYOUT = layout
+        results = await run_conversation(service, args.turns)
+        for row in results:
+            print(json.dumps({"layout": layout, **row}, ensure_ascii=False))
+
+        # Bỏ lượt đầu (chưa có lịch sử) khi tính trung bình
+        later = results[1:] or results
+        evals = [r["prompt_eval_count"] for r in later if r["prompt_eval_count"] is not None]
+        print(json.dumps({
+            "layout": layout,
+            "ttft_p50_ms": round(statistics.median(r["ttft_ms"] for r in later), 1),
+            "prompt_eval_mean": round(statistics.mean(evals), 1) if evals else None,
+        }))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
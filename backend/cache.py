@@ -0,0 +1,399 @@
+"""
+Cache Module - LRU caches cho query embeddings, kết quả retrieval và câu trả lời RAG
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import hashlib
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache giới hạn theo tổng số bytes, hỗ trợ TTL
+    """
+    
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float = 0,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        Args:
+            max_bytes: Tổng dung lượng tối đa của các entries
+            ttl_seconds: Thời gian sống của entry (0 = không hết hạn)
+            sizeof: Hàm ước lượng kích thước (bytes) của một value
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof or sys.getsizeof
+        
+        # Store: {key: (value, size, expires_at)}
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Lấy value theo key, đánh dấu là mới dùng gần nhất
+        
+        Returns:
+            Value hoặc None nếu không có / đã hết hạn
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, size, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Thêm hoặc cập nhật entry, evict các entries cũ nhất nếu vượt max_bytes"""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0
+        
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+    
+    def delete(self, key: Hashable):
+        """Xóa entry theo key (nếu có)"""
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self):
+        """Xóa toàn bộ entries (giữ nguyên counters)"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> Dict:
+        """Thống kê hit/miss và dung lượng"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+def normalize_query(text: str) -> str:
+    """
+    Chuẩn hóa câu query để các câu gần giống nhau dùng chung cache key
+    
+    NFC unicode (tiếng Việt có dấu), lowercase, gộp khoảng trắng, bỏ dấu câu cuối câu
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(" ?!.")
+
+
+class QueryEmbeddingCache:
+    """
+    Cache embedding của query theo text đã chuẩn hóa
+    
+    Gồm một LRU trong bộ nhớ và một lớp SQLite (optional) để giữ cache qua restart.
+    Mọi entry gắn với tên embedding model - đổi model thì cache bị invalidate.
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        max_bytes: int,
+        ttl_seconds: float = 0,
+        disk_path: str = ""
+    ):
+        """
+        Args:
+            model_name: Tên embedding model tạo ra các vectors
+            max_bytes: Dung lượng tối đa của cache trong bộ nhớ
+            ttl_seconds: Thời gian sống của entry (0 = không hết hạn)
+            disk_path: File SQLite cho lớp cache trên đĩa (trống = tắt)
+        """
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds
+        self._memory = LRUCache(
+            max_bytes=max_bytes,
+            ttl_seconds=ttl_seconds,
+            sizeof=lambda v: v.nbytes + 96
+        )
+        
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self.disk_hits = 0
+        if disk_path:
+            self._open_disk(disk_path)
+    
+    def _open_disk(self, path: str):
+        """Mở SQLite cache, xóa entries của model khác hoặc đã hết hạn"""
+        try:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                """CREATE TABLE IF NOT EXISTS query_embeddings (
+                    model TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (model, key)
+                )"""
+            )
+            self._prune_disk()
+            logger.info(f"Query embedding cache trên đĩa: {path}")
+        except sqlite3.Error as e:
+            logger.error(f"Không mở được embedding cache trên đĩa: {str(e)}")
+            self._disk = None
+    
+    def _prune_disk(self):
+        if self._disk is None:
+            return
+        with self._disk_lock:
+            self._disk.execute("DELETE FROM query_embeddings WHERE model != ?", (self.model_name,))
+            if self.ttl_seconds:
+                self._disk.execute(
+                    "DELETE FROM query_embeddings WHERE created_at < ?",
+                    (time.time() - self.ttl_seconds,)
+                )
+            self._disk.commit()
+    
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(normalize_query(text).encode("utf-8")).hexdigest()
+    
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        Lấy embedding đã cache cho query
+        
+        Returns:
+            Vector float32 hoặc None nếu chưa có
+        """
+        key = self._key(text)
+        embedding = self._memory.get(key)
+        if embedding is not None or self._disk is None:
+            return embedding
+        
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT vector, created_at FROM query_embeddings WHERE model = ? AND key = ?",
+                (self.model_name, key)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        if self.ttl_seconds and row[1] < time.time() - self.ttl_seconds:
+            return None
+        
+        embedding = np.frombuffer(row[0], dtype=np.float32)
+        self._memory.set(key, embedding)
+        self.disk_hits += 1
+        return embedding
+    
+    def set(self, text: str, embedding: np.ndarray):
+        """Lưu embedding của query vào cache (bộ nhớ và đĩa)"""
+        key = self._key(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self._memory.set(key, embedding)
+        
+        if self._disk is None:
+            return
+        try:
+            with self._disk_lock:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)",
+                    (self.model_name, key, embedding.tobytes(), time.time())
+                )
+                self._disk.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Không ghi được embedding cache xuống đĩa: {str(e)}")
+    
+    def reset_model(self, model_name: str):
+        """Invalidate cache khi embedding model thay đổi"""
+        if model_name == self.model_name:
+            return
+        logger.info(f"Embedding model đổi {self.model_name} -> {model_name}, xóa query embedding cache")
+        self.model_name = model_name
+        self._memory.clear()
+        self._prune_disk()
+    
+    def stats(self) -> Dict:
+        """Thống kê cache cho /documents/stats"""
+        return {
+            **self._memory.stats(),
+            "disk_enabled": self._disk is not None,
+            "disk_hits": self.disk_hits,
+            "model": self.model_name
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời RAG theo độ tương đồng embedding của câu hỏi
+    
+    Chỉ so khớp giữa các câu hỏi có cùng context key (chunk ids đã retrieve,
+    model, sampling params), nên câu trả lời replay luôn dựa trên cùng ngữ cảnh.
+    """
+    
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float = 0):
+        """
+        Args:
+            threshold: Cosine similarity tối thiểu để coi là cùng câu hỏi
+            max_entries: Số câu trả lời tối đa được giữ (LRU)
+            ttl_seconds: Thời gian sống của entry (0 = không hết hạn)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        
+        # Store: {entry_id: (context_key, embedding, answer, sources, expires_at)}
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._by_context: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _remove(self, entry_id: int):
+        context_key = self._entries.pop(entry_id)[0]
+        ids = self._by_context[context_key]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_context[context_key]
+    
+    def get(self, embedding, context_key: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Tìm câu trả lời đã cache cho câu hỏi tương tự
+        
+        Args:
+            embedding: Embedding của câu hỏi
+            context_key: Key của ngữ cảnh retrieve + cấu hình generate
+            
+        Returns:
+            Tuple of (answer, sources) hoặc None
+        """
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        
+        with self._lock:
+            for entry_id in [
+                i for i in self._by_context.get(context_key, [])
+                if self._entries[i][4] and self._entries[i][4] < now
+            ]:
+                self._remove(entry_id)
+            
+            ids = self._by_context.get(context_key)
+            if not ids:
+                self.misses += 1
+                return None
+            
+            matrix = np.stack([self._entries[i][1] for i in ids])
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            _, _, answer, sources, _ = self._entries[entry_id]
+            return answer, list(sources)
+    
+    def set(self, embedding, context_key: str, answer: str, sources: List[str]):
+        """
+        Lưu câu trả lời, evict entry ít dùng nhất nếu vượt max_entries
+        
+        Nếu đã có câu hỏi tương tự (similarity >= threshold) cùng context key thì thay
+        entry đó thay vì thêm bản trùng.
+        """
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0
+        vector = self._normalize(embedding)
+        
+        with self._lock:
+            ids = self._by_context.get(context_key)
+            if ids:
+                similarities = np.stack([self._entries[i][1] for i in ids]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id = ids[best]
+                    self._entries[entry_id] = (context_key, vector, answer, tuple(sources), expires_at)
+                    self._entries.move_to_end(entry_id)
+                    return
+            
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (context_key, vector, answer, tuple(sources), expires_at)
+            self._by_context.setdefault(context_key, []).append(entry_id)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def clear(self):
+        """Xóa toàn bộ câu trả lời đã cache"""
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+    
+    def stats(self) -> Dict:
+        """Thống kê hit/miss"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
@@ -16,6 +16,15 @@ class Settings(BaseSettings):
     # Ollama Configuration
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "llama3.2:3B"
+    LLM_MAX_CONCURRENT_REQUESTS: int = 4  # Số request đồng thời tối đa gửi tới Ollama
+    LLM_QUEUE_TIMEOUT: float = 30.0  # Thời gian tối đa (giây) chờ slot trống
+    LLM_REQUEST_TIMEOUT: float = 120.0  # Thời gian tối đa (giây) cho một lần generate
+    
+    # Streaming (SSE) - gộp tokens thành frames để giảm số lần encode / write
+    STREAM_COALESCE_MS: float = 30.0  # Thời gian gom tokens tối đa mỗi frame (0 = mỗi token một frame)
+    STREAM_COALESCE_MAX_CHARS: int = 512  # Gửi frame ngay khi đã gom đủ số ký tự này
+    STREAM_HEARTBEAT_SECONDS: float = 15.0  # Gửi comment ": ping" khi kết nối im lặng quá lâu (0 = tắt)
+    STREAM_DISCONNECT_POLL_SECONDS: float = 0.5  # Chu kỳ kiểm tra client ngắt kết nối để hủy generate trên Ollama (0 = tắt)
     
     # ChromaDB Configuration
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
@@ -23,19 +32,102 @@ class Settings(BaseSettings):
     
     # Embedding Model
     EMBEDDING_MODEL: str = "paraphrase-multilingual-MiniLM-L12-v2"
+    EMBEDDING_BATCH_SIZE: int = 32  # Batch size mỗi lần forward của embedding model
+    INGEST_BATCH_SIZE: int = 256  # Số chunks embed + ghi ChromaDB mỗi bước khi ingest
+    EMBEDDING_BACKEND: str = "sentence_transformers"  # sentence_transformers (PyTorch) | onnx (ONNX Runtime)
+    EMBEDDING_ONNX_QUANTIZE: bool = False  # Quantize int8 khi dùng backend onnx
+    EMBEDDING_ONNX_DIR: str = ""  # Thư mục model ONNX đã export (trống = tải onnx/model.onnx từ HF Hub)
+    EMBEDDING_ONNX_CACHE_DIR: str = "./models"  # Nơi lưu model int8 đã quantize
+    EMBEDDING_ONNX_THREADS: int = 0  # Số threads của ONNX Runtime (0 = theo số CPU)
+    
+    # Query Embedding Cache
+    ENABLE_EMBEDDING_CACHE: bool = True
+    EMBEDDING_CACHE_MAX_MB: int = 64  # Dung lượng tối đa trong bộ nhớ
+    EMBEDDING_CACHE_TTL_SECONDS: int = 86400  # 0 = không hết hạn
+    EMBEDDING_CACHE_DISK_PATH: str = ""  # File SQLite để giữ cache qua restart (trống = tắt)
+    
+    # Query Embedding Micro-batching - gộp các query đồng thời thành một lần encode
+    ENABLE_QUERY_BATCHING: bool = True
+    QUERY_BATCH_MAX_SIZE: int = 32  # Số queries tối đa mỗi batch
+    QUERY_BATCH_MAX_WAIT_MS: float = 2.0  # Thời gian tối đa chờ gom thêm queries
+    
+    # Retrieval Result Cache
+    ENABLE_RETRIEVAL_CACHE: bool = True
+    RETRIEVAL_CACHE_MAX_MB: int = 32  # Dung lượng tối đa trong bộ nhớ
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 300  # Giới hạn độ cũ của kết quả cache (0 = không hết hạn)
+    
+    # Semantic Answer Cache (opt-in) - replay câu trả lời cho câu hỏi tương tự
+    ENABLE_SEMANTIC_CACHE: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Cosine similarity tối thiểu giữa 2 câu hỏi
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000
+    SEMANTIC_CACHE_TTL_SECONDS: int = 3600  # 0 = không hết hạn
     
     # PDF Data Path
     PDF_DATA_PATH: str = "./data"
     
+    # PDF Extraction
+    PDF_EXTRACT_WORKERS: int = 0  # Số process extract song song (0 = theo số CPU, 1 = tuần tự)
+    PDF_PARALLEL_MIN_PAGES: int = 32  # PDF ít trang hơn thì extract tuần tự
+    REINDEX_QUEUE_SIZE: int = 4  # Số files / batches tối đa chờ giữa các stage của pipeline reindex
+    
+    # Ingestion Job Queue
+    INGEST_WORKERS: int = 1  # Số jobs xử lý PDF chạy song song
+    INGEST_QUEUE_MAX_SIZE: int = 16  # Hàng đợi đầy thì upload trả về 503
+    INGEST_JOB_DB_PATH: str = "./ingestion_jobs.sqlite"
+    INGEST_STAGING_DIR: str = "./uploads"  # Nơi lưu file upload chờ xử lý
+    INGEST_PROGRESS_INTERVAL: float = 0.5  # Giây giữa các lần ghi tiến độ
+    
+    # Ollama Model Lifecycle
+    OLLAMA_KEEP_ALIVE: str = "30m"  # Thời gian giữ model trong RAM sau request (-1m = mãi mãi)
+    OLLAMA_PRELOAD: bool = True  # Load model + prefill system prompt khi khởi động
+    
+    # Startup
+    FAST_STARTUP: bool = True  # Nhận request ngay, load ChromaDB / models ở background
+    STARTUP_READY_TIMEOUT: float = 30.0  # Giây request chờ warm-up xong, quá thì trả 503
+    
     # LLM Parameters
     TEMPERATURE: float = 0.3
     MAX_TOKENS: int = 2048
     TOP_P: float = 0.9
     
+    # Prompt Token Budget
+    CONTEXT_WINDOW_TOKENS: int = 8192  # num_ctx của Ollama = prompt + MAX_TOKENS output
+    PROMPT_CONTEXT_MAX_TOKENS: int = 1500  # Tối đa cho tài liệu retrieve trong prompt
+    PROMPT_HISTORY_MAX_TOKENS: int = 1000  # Tối đa cho lịch sử hội thoại, bỏ lượt cũ nhất trước
+    TOKENIZER_ENCODING: str = "cl100k_base"  # tiktoken encoding dùng để đếm token
+    PROMPT_LAYOUT: str = "stable_prefix"  # stable_prefix (tái sử dụng KV cache) | sliding
+    PROMPT_HISTORY_TRIM_BLOCK: int = 8  # stable_prefix: số messages bị bỏ mỗi lần lịch sử vượt budget
+    
+    # Chat Sessions - lịch sử hội thoại lưu phía server theo session_id
+    SESSION_TTL_SECONDS: int = 86400  # Session hết hạn sau khoảng thời gian không chat (0 = không hết hạn)
+    SESSION_MAX_MESSAGES: int = 50  # Số messages gần nhất giữ lại cho mỗi session
+    SESSION_MAX_KB: int = 256  # Dung lượng tối đa của một session
+    SESSION_CACHE_MAX_MB: int = 64  # Tổng dung lượng sessions trong bộ nhớ (LRU)
+    SESSION_DB_PATH: str = ""  # File SQLite để giữ sessions qua restart, dùng chung giữa workers (trống = chỉ trong bộ nhớ)
+    
     # Retrieval Configuration
     TOP_K_RESULTS: int = 3
     SIMILARITY_THRESHOLD: float = 0.7
     
+    # Hybrid Retrieval - BM25 (từ khóa) + vector, gộp bằng Reciprocal Rank Fusion
+    ENABLE_HYBRID_SEARCH: bool = False
+    HYBRID_CANDIDATES: int = 20  # Số ứng viên lấy từ mỗi nhánh (dense, BM25) trước khi fuse
+    HYBRID_RRF_K: int = 60  # Hằng số k của RRF
+    HYBRID_LEXICAL_MIN_SIMILARITY: float = 0.5  # Chunk từ top BM25 dưới SIMILARITY_THRESHOLD vẫn phải đạt similarity này
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    BM25_MAX_DF_RATIO: float = 0.3  # Bỏ qua term có mặt trong hơn tỉ lệ này số chunks khi search
+    BM25_MAX_TERM_POSTINGS: int = 10000  # Term dài hơn chỉ chấm điểm trên tier các chunks có weight cao nhất
+    BM25_LOG_MAX_CHUNKS: int = 50000  # Ghi snapshot BM25 index mới khi log vượt số chunks thay đổi này
+    
+    # Cross-encoder Rerank (opt-in) - chấm lại các ứng viên trước khi đưa vào prompt
+    ENABLE_RERANK: bool = False
+    RERANK_MODEL: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # Multilingual, hỗ trợ tiếng Việt
+    RERANK_CANDIDATES: int = 20  # Số ứng viên over-fetch để rerank
+    RERANK_MAX_LENGTH: int = 256  # Số token tối đa của một cặp (query, chunk)
+    RERANK_TIMEOUT_MS: int = 300  # Quá thời gian thì giữ thứ tự retrieval ban đầu (0 = không giới hạn)
+    RERANK_MAX_CONCURRENT: int = 1  # Số lần rerank chạy cùng lúc, thêm request khi tất cả đang bận thì bỏ qua rerank
+    
     # CORS Configuration
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173,http://localhost:5174"
     ALLOW_ALL_ORIGINS: bool = False  # Set True để cho phép tất cả origins
@@ -43,11 +135,25 @@ class Settings(BaseSettings):
     # API Key Authentication
     ENABLE_API_KEY_AUTH: bool = False  # Set True để bật xác thực API key
     API_KEYS: str = ""  # Danh sách API keys, cách nhau bởi dấu phẩy
+    API_KEYS_FILE: str = ""  # File JSON chứa keys + tier rate limit + endpoints được phép (trống = chỉ dùng API_KEYS)
+    API_KEYS_RELOAD_INTERVAL: float = 5.0  # Chu kỳ (giây) kiểm tra API_KEYS_FILE thay đổi để nạp lại (0 = tắt)
     
     # Rate Limiting
     ENABLE_RATE_LIMITING: bool = True
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_PER_HOUR: int = 1000
+    RATE_LIMIT_SHARDS: int = 64  # Số shards (mỗi shard một lock) của rate limiter in-memory
+    RATE_LIMIT_BACKEND: str = "memory"  # memory | sqlite (nhiều workers cùng máy) | redis (nhiều máy)
+    RATE_LIMIT_DB_PATH: str = "./rate_limits.sqlite"  # File SQLite dùng chung khi RATE_LIMIT_BACKEND=sqlite
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"  # Khi RATE_LIMIT_BACKEND=redis (cần pip install redis)
+    
+    # Metrics (Prometheus)
+    ENABLE_METRICS: bool = True  # Expose GET /metrics theo Prometheus text format
+    
+    # Tracing theo request (debug request chậm)
+    ENABLE_TRACING: bool = False  # Ghi spans chat -> build_context_prompt -> similarity_search -> ollama.chat
+    TRACE_EXPORT_PATH: str = "./traces.jsonl"  # Mỗi trace một dòng JSON
+    TRACE_MIN_DURATION_MS: float = 0  # Chỉ ghi traces chậm hơn ngưỡng (0 = ghi tất cả)
     
     @property
     def cors_origins_list(self) -> List[str]:
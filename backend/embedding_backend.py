@@ -0,0 +1,289 @@
+"""
+Embedding Backend Module - Các backend tạo embedding (PyTorch / ONNX Runtime) dùng chung một interface
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Các file cần để chạy model bằng ONNX Runtime (theo layout của sentence-transformers trên HF Hub)
+ONNX_MODEL_FILE = "onnx/model.onnx"
+ONNX_SUPPORT_FILES = [
+    "tokenizer.json",
+    "modules.json",
+    "sentence_bert_config.json",
+    "1_Pooling/config.json",
+]
+
+
+class EmbeddingBackend(ABC):
+    """
+    Interface chung của các embedding backends
+    
+    encode() nhận list texts và trả về ma trận float32 (len(texts) x dim). cache_key
+    phân biệt cả model lẫn backend - đổi backend thì query embedding cache bị invalidate;
+    backend_name được ghi vào metadata của collection để không trộn vectors của hai backends.
+    """
+    
+    backend_name = "base"
+    
+    def __init__(self, model_name: str):
+        """
+        Args:
+            model_name: Tên model (sentence-transformers)
+        """
+        self.model_name = model_name
+    
+    @property
+    def cache_key(self) -> str:
+        """Key phân biệt embeddings của model + backend trong cache"""
+        return f"{self.model_name}@{self.backend_name}"
+    
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Tạo embeddings cho list of texts
+        
+        Args:
+            texts: Danh sách các đoạn text cần embed
+            batch_size: Số texts mỗi lần forward
+        
+        Returns:
+            Ma trận embeddings float32 (len(texts) x dim)
+        """
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Backend mặc định: sentence-transformers trên PyTorch (fp32)"""
+    
+    backend_name = "sentence_transformers"
+    
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+    
+    @property
+    def cache_key(self) -> str:
+        # Giữ nguyên key cũ để không mất cache đã có trên đĩa
+        return self.model_name
+    
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    Backend ONNX Runtime trên CPU, optional quantize int8 (dynamic quantization)
+    
+    Dùng file onnx/model.onnx + tokenizer.json của model trên HF Hub (hoặc thư mục
+    local có cùng layout), pooling theo 1_Pooling/config.json giống sentence-transformers.
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        model_dir: str = "",
+        quantize: bool = False,
+        cache_dir: str = "./models",
+        threads: int = 0
+    ):
+        """
+        Args:
+            model_name: Tên model (sentence-transformers)
+            model_dir: Thư mục local chứa model đã export (trống = tải từ HF Hub)
+            quantize: Quantize weights sang int8 trước khi chạy
+            cache_dir: Nơi lưu model int8 đã quantize
+            threads: Số threads của ONNX Runtime (0 = mặc định theo số CPU)
+        """
+        super().__init__(model_name)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        
+        self.quantize = quantize
+        self.backend_name = "onnx-int8" if quantize else "onnx"
+        
+        source = Path(model_dir) if model_dir else self._download(model_name)
+        model_path = source / ONNX_MODEL_FILE
+        if not model_path.exists():
+            model_path = source / "model.onnx"
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"Không có model ONNX trong {source} - export bằng: "
+                f"optimum-cli export onnx --model {self._repo_id(model_name)} {source}"
+            )
+        if quantize:
+            model_path = self._quantize(model_path, Path(cache_dir) / self._repo_id(model_name).replace("/", "__"))
+        
+        config = self._read_json(source / "sentence_bert_config.json")
+        pooling = self._read_json(source / "1_Pooling" / "config.json")
+        modules = self._read_json(source / "modules.json") or []
+        self.max_seq_length = config.get("max_seq_length", 128)
+        self.pooling = "cls" if pooling.get("pooling_mode_cls_token") else "mean"
+        self.normalize = any("Normalize" in module.get("type", "") for module in modules)
+        
+        self.tokenizer = Tokenizer.from_file(str(source / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        pad_token = next(
+            (token for token in ("<pad>", "[PAD]") if self.tokenizer.token_to_id(token) is not None),
+            None
+        )
+        if pad_token is not None:
+            self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token), pad_token=pad_token)
+        else:
+            self.tokenizer.enable_padding()
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+        logger.info(f"ONNX embedding model: {model_path} (pooling={self.pooling}, max_seq_length={self.max_seq_length})")
+    
+    @staticmethod
+    def _repo_id(model_name: str) -> str:
+        # sentence-transformers tự thêm prefix cho các model ngắn tên
+        return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    
+    @staticmethod
+    def _read_json(path: Path) -> Dict:
+        if not path.exists():
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    def _download(self, model_name: str) -> Path:
+        """Tải model ONNX + tokenizer từ HF Hub (dùng cache của huggingface_hub)"""
+        from huggingface_hub import snapshot_download
+        
+        logger.info(f"Đang tải model ONNX: {self._repo_id(model_name)}")
+        return Path(snapshot_download(
+            self._repo_id(model_name),
+            allow_patterns=[ONNX_MODEL_FILE, *ONNX_SUPPORT_FILES]
+        ))
+    
+    @staticmethod
+    def _quantize(model_path: Path, output_dir: Path) -> Path:
+        """Dynamic quantization weights sang int8, lưu lại để các lần sau dùng luôn"""
+        output = output_dir / "model_int8.onnx"
+        if output.exists() and output.stat().st_mtime >= model_path.stat().st_mtime:
+            return output
+        
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        
+        logger.info(f"Đang quantize int8: {model_path} -> {output}")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        tmp = output.with_suffix(".tmp.onnx")
+        quantize_dynamic(str(model_path), str(tmp), weight_type=QuantType.QInt8)
+        os.replace(tmp, output)
+        return output
+    
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        
+        # Output đầu tiên là token embeddings (batch x seq x dim)
+        token_embeddings = self.session.run(None, feeds)[0]
+        if self.pooling == "cls":
+            embeddings = token_embeddings[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype(np.float32, copy=False)
+    
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        # Xếp theo độ dài để mỗi batch ít padding (giống sentence-transformers)
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        outputs = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            for i, embedding in zip(indices, self._forward([texts[i] for i in indices])):
+                outputs[i] = embedding
+        return np.stack(outputs)
+
+
+def configured_backend_name() -> str:
+    """
+    Tên backend theo cấu hình hiện tại (giống backend_name của instance sẽ được load)
+    
+    Returns:
+        sentence_transformers | onnx | onnx-int8
+    """
+    if settings.EMBEDDING_BACKEND == "onnx" and settings.EMBEDDING_ONNX_QUANTIZE:
+        return "onnx-int8"
+    return settings.EMBEDDING_BACKEND
+
+
+def load_embedding_backend(model_name: str, backend: Optional[str] = None) -> EmbeddingBackend:
+    """
+    Tạo embedding backend theo cấu hình
+    
+    Args:
+        model_name: Tên model (sentence-transformers)
+        backend: sentence_transformers | onnx | onnx-int8 (mặc định theo EMBEDDING_BACKEND
+            và EMBEDDING_ONNX_QUANTIZE)
+    
+    Returns:
+        EmbeddingBackend đã load model
+    """
+    backend = backend or configured_backend_name()
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddingBackend(
+            model_name,
+            model_dir=settings.EMBEDDING_ONNX_DIR,
+            quantize=backend == "onnx-int8",
+            cache_dir=settings.EMBEDDING_ONNX_CACHE_DIR,
+            threads=settings.EMBEDDING_ONNX_THREADS
+        )
+    if backend != "sentence_transformers":
+        raise ValueError(f"EMBEDDING_BACKEND không hợp lệ: {backend}")
+    return SentenceTransformerBackend(model_name)
+
+
+def cosine_drift(reference: np.ndarray, candidate: np.ndarray) -> Dict:
+    """
+    So sánh embeddings của hai backends trên cùng texts
+    
+    Args:
+        reference: Embeddings chuẩn (vd: PyTorch fp32)
+        candidate: Embeddings cần kiểm tra (vd: ONNX int8)
+    
+    Returns:
+        Dict với min / mean cosine similarity theo từng dòng và max drift (1 - cosine)
+    """
+    if reference.shape != candidate.shape:
+        raise ValueError(f"Embeddings khác shape: {reference.shape} vs {candidate.shape}")
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = np.sum(reference * candidate, axis=1)
+    return {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "max_drift": float(1 - cosines.min())
+    }
@@ -0,0 +1,139 @@
+"""
+Embedding Batcher Module - Gộp các query embedding đồng thời thành một lần encode
+"""
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from metrics import QUERY_BATCH_SIZE, QUERY_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batcher cho query embeddings
+    
+    Các threads gọi embed() xếp query vào hàng đợi rồi chờ Future. Worker thread
+    lấy query đầu tiên, gom thêm các query đến trong tối đa max_wait_ms (hoặc đủ
+    max_batch_size) và chạy một lần encode cho cả batch - thay vì mỗi request
+    encode một batch 1 phần tử và tranh nhau model.
+    """
+    
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2
+    ):
+        """
+        Args:
+            encode: Hàm embed một list texts, trả về ma trận (len(texts) x dim)
+            max_batch_size: Số queries tối đa mỗi lần encode
+            max_wait_ms: Thời gian tối đa chờ gom thêm queries sau query đầu tiên
+        """
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self.batch_sizes = QUERY_BATCH_SIZE.labels()
+        self.queue_depths = QUERY_QUEUE_DEPTH.labels()
+        self.batches = 0
+        self.errors = 0
+        
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+    
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """
+        Embed một query qua batch chung
+        
+        Args:
+            text: Câu query
+            timeout: Thời gian chờ tối đa (giây), None = chờ tới khi xong
+        
+        Returns:
+            Vector float32
+        """
+        return self.submit(text).result(timeout=timeout)
+    
+    def submit(self, text: str) -> Future:
+        """Xếp query vào hàng đợi, trả về Future nhận vector"""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+    
+    def _collect(self, first: Tuple[str, Future]) -> List[Tuple[str, Future]]:
+        """Gom các queries đến trong cửa sổ max_wait_ms sau query đầu tiên"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            try:
+                # Lấy ngay các queries đã chờ sẵn, hết thì chờ tới deadline
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                # Giữ tín hiệu dừng cho vòng lặp chính
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+    
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            
+            # Số queries đang chờ khi worker bắt đầu một batch mới
+            self.queue_depths.observe(self._queue.qsize() + 1)
+            batch = self._collect(first)
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            
+            # Các request trùng query trong cùng batch chỉ encode một lần
+            unique = list(dict.fromkeys(text for text, _ in batch))
+            self.batch_sizes.observe(len(unique))
+            self.batches += 1
+            try:
+                embeddings = self._encode(unique)
+                # Copy từng dòng để cache không giữ cả ma trận của batch
+                rows = {text: np.array(embeddings[i]) for i, text in enumerate(unique)}
+                for text, future in batch:
+                    future.set_result(rows[text])
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Lỗi khi embed batch {len(unique)} queries: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+    
+    def stats(self) -> Dict:
+        """Thống kê batch size / queue depth"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "errors": self.errors,
+            "pending": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_depth": self.queue_depths.snapshot()
+        }
+    
+    def shutdown(self):
+        """Dừng worker thread sau khi xử lý xong các queries đã xếp hàng"""
+        self._queue.put(None)
+        self._worker.join(timeout=5)
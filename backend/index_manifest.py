@@ -0,0 +1,115 @@
+"""
+Index Manifest - Theo dõi nội dung (hash) của các PDF đã index để reindex incremental
+"""
+from pathlib import Path
+from typing import Dict, Optional
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def hash_content(content: bytes) -> str:
+    """SHA-256 của nội dung file"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class IndexManifest:
+    """
+    Manifest JSON lưu cạnh ChromaDB: {filename: {content_hash, document_id, chunks, size, mtime}}
+    
+    Ghi nhận cả embedding model + backend đã dùng - đổi model hoặc backend thì cần rebuild toàn bộ.
+    """
+    
+    def __init__(
+        self,
+        path: Path,
+        embedding_model: str = "",
+        files: Optional[Dict] = None,
+        embedding_backend: str = ""
+    ):
+        """
+        Args:
+            path: Đường dẫn file manifest
+            embedding_model: Embedding model đã dùng để index
+            files: Thông tin các files đã index
+            embedding_backend: Embedding backend đã dùng (sentence_transformers | onnx | onnx-int8)
+        """
+        self.path = path
+        self.embedding_model = embedding_model
+        self.embedding_backend = embedding_backend
+        self.files: Dict[str, Dict] = files or {}
+    
+    @classmethod
+    def load(cls, path: Path) -> "IndexManifest":
+        """Đọc manifest, trả về manifest rỗng nếu chưa có hoặc bị hỏng"""
+        if not path.exists():
+            return cls(path)
+        
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return cls(
+                path,
+                data.get("embedding_model", ""),
+                data.get("files", {}),
+                # Manifest cũ chưa ghi backend: lúc đó chỉ có sentence_transformers
+                data.get("embedding_backend", "sentence_transformers")
+            )
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifest {path} không đọc được, coi như chưa index: {str(e)}")
+            return cls(path)
+    
+    def save(self):
+        """Ghi manifest (atomic - ghi file tạm rồi rename)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {
+                    "embedding_model": self.embedding_model,
+                    "embedding_backend": self.embedding_backend,
+                    "files": self.files
+                },
+                ensure_ascii=False,
+                indent=2
+            ),
+            encoding="utf-8"
+        )
+        os.replace(tmp_path, self.path)
+    
+    def reset(self, embedding_model: str, embedding_backend: str = ""):
+        """Xóa toàn bộ entries (dùng khi rebuild)"""
+        self.embedding_model = embedding_model
+        self.embedding_backend = embedding_backend
+        self.files = {}
+    
+    def is_unchanged(self, filename: str, size: int, mtime: float) -> bool:
+        """Kiểm tra nhanh theo size + mtime, không cần đọc file"""
+        entry = self.files.get(filename)
+        return bool(entry) and entry.get("size") == size and entry.get("mtime") == mtime
+    
+    def record(
+        self,
+        filename: str,
+        content_hash: str,
+        document_id: str,
+        chunks: int,
+        size: int,
+        mtime: float
+    ):
+        """Ghi nhận file đã được index"""
+        self.files[filename] = {
+            "content_hash": content_hash,
+            "document_id": document_id,
+            "chunks": chunks,
+            "size": size,
+            "mtime": mtime,
+            "indexed_at": time.time()
+        }
+    
+    def remove(self, filename: str) -> Optional[Dict]:
+        """Xóa entry của file"""
+        return self.files.pop(filename, None)
@@ -0,0 +1,332 @@
+"""
+Ingestion Job Queue - Xử lý upload PDF trong background worker pool
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import settings
+from pdf_processor import PDFProcessor
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("extract", "chunk", "embed", "store")
+
+
+class QueueFullError(Exception):
+    """Raised khi hàng đợi ingestion đã đầy"""
+
+
+def _empty_stages() -> Dict:
+    return {stage: {"status": "pending", "done": 0, "total": None} for stage in STAGES}
+
+
+def _worker_alive(worker: Optional[str]) -> bool:
+    """Process "host:pid" đã nhận job còn chạy không (chỉ kiểm tra được trên cùng máy)"""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class JobStore:
+    """
+    Lưu trạng thái ingestion jobs trong SQLite để jobs không mất khi restart
+    
+    File được dùng chung bởi mọi uvicorn worker: job chỉ được chạy bởi worker
+    nhận (claim) được nó, qua một lệnh UPDATE có điều kiện status = 'queued'.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Đường dẫn file SQLite
+        """
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                job_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stages TEXT NOT NULL,
+                chunks_created INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                worker TEXT
+            )"""
+        )
+        # Bảng tạo từ bản cũ chưa có cột worker
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(ingestion_jobs)")}
+        if "worker" not in columns:
+            self._conn.execute("ALTER TABLE ingestion_jobs ADD COLUMN worker TEXT")
+        self._conn.commit()
+    
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["stages"] = json.loads(job["stages"])
+        return job
+    
+    def create(self, filename: str, file_path: str) -> Dict:
+        """Tạo job mới ở trạng thái queued"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO ingestion_jobs VALUES (?, ?, ?, 'queued', ?, 0, NULL, ?, ?, NULL)",
+                (job_id, filename, file_path, json.dumps(_empty_stages()), now, now)
+            )
+            self._conn.commit()
+        return self.get(job_id)
+    
+    def update(self, job_id: str, **fields):
+        """Cập nhật các cột của job"""
+        if "stages" in fields:
+            fields["stages"] = json.dumps(fields["stages"])
+        fields["updated_at"] = time.time()
+        
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE ingestion_jobs SET {columns} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+            self._conn.commit()
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Lấy job theo ID"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM ingestion_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+    
+    def claim(self, job_id: str, worker: str) -> bool:
+        """
+        Nhận job để chạy (atomic giữa các process)
+        
+        Returns:
+            False nếu job không còn queued (worker khác đã nhận)
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE ingestion_jobs SET status = 'running', worker = ?, updated_at = ? "
+                "WHERE job_id = ? AND status = 'queued'",
+                (worker, time.time(), job_id)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+    
+    def recover_unfinished(self, worker: str) -> List[str]:
+        """
+        Đưa các jobs running của process đã chết về queued
+        
+        Args:
+            worker: Id của process hiện tại (job mang id này là của lần chạy trước trùng pid)
+        
+        Returns:
+            IDs các jobs đang queued, theo thứ tự tạo
+        """
+        with self._lock:
+            running = self._conn.execute(
+                "SELECT job_id, worker FROM ingestion_jobs WHERE status = 'running'"
+            ).fetchall()
+            for row in running:
+                if row["worker"] == worker or not _worker_alive(row["worker"]):
+                    self._conn.execute(
+                        "UPDATE ingestion_jobs SET status = 'queued', worker = NULL, stages = ?, updated_at = ? "
+                        "WHERE job_id = ? AND status = 'running' AND worker IS ?",
+                        (json.dumps(_empty_stages()), time.time(), row["job_id"], row["worker"])
+                    )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT job_id FROM ingestion_jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        return [row["job_id"] for row in rows]
+
+
+class IngestionJobQueue:
+    """
+    Hàng đợi ingestion có giới hạn - upload trả về job ID ngay, xử lý PDF trong worker pool
+    
+    Với nhiều uvicorn workers, mỗi worker có hàng đợi riêng nhưng cùng JobStore;
+    jobs khôi phục sau restart có thể nằm trong hàng đợi của mọi worker, và chỉ
+    worker claim được job mới chạy nó.
+    """
+    
+    def __init__(self, pdf_processor: PDFProcessor, store: JobStore):
+        """
+        Args:
+            pdf_processor: Instance của PDFProcessor để xử lý file
+            store: JobStore lưu trạng thái jobs
+        """
+        self.pdf_processor = pdf_processor
+        self.store = store
+        self.staging_dir = Path(settings.INGEST_STAGING_DIR)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_MAX_SIZE)
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.INGEST_WORKERS,
+            thread_name_prefix="ingest"
+        )
+        self._workers: List[asyncio.Task] = []
+        self._recovery: Optional[asyncio.Task] = None
+        # Id của process này trong JobStore (cột worker)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    
+    async def start(self):
+        """Khởi động workers và đưa lại các jobs chưa xong từ lần chạy trước vào hàng đợi"""
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(settings.INGEST_WORKERS)
+        ]
+        
+        unfinished = await asyncio.to_thread(self.store.recover_unfinished, self.worker_id)
+        if unfinished:
+            logger.info(f"Khôi phục {len(unfinished)} ingestion jobs chưa hoàn thành")
+            self._recovery = asyncio.create_task(self._requeue(unfinished))
+    
+    async def stop(self):
+        """Dừng workers - jobs đang chạy sẽ được chạy lại ở lần khởi động sau"""
+        tasks = self._workers + ([self._recovery] if self._recovery else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+    
+    async def _requeue(self, job_ids: List[str]):
+        for job_id in job_ids:
+            await self._queue.put(job_id)
+    
+    @property
+    def depth(self) -> int:
+        """Số jobs đang chờ trong hàng đợi"""
+        return self._queue.qsize()
+    
+    async def submit(self, content: bytes, filename: str) -> Dict:
+        """
+        Đưa file PDF vào hàng đợi xử lý
+        
+        Args:
+            content: Binary content của PDF
+            filename: Tên file
+        
+        Returns:
+            Job vừa tạo
+        
+        Raises:
+            QueueFullError: Nếu hàng đợi đã đầy
+        """
+        if self._queue.full():
+            raise QueueFullError(
+                f"Hàng đợi ingestion đã đầy ({settings.INGEST_QUEUE_MAX_SIZE} jobs)"
+            )
+        
+        # Ghi file + SQLite trong thread, không chặn event loop
+        job = await asyncio.to_thread(self._stage, content, filename)
+        try:
+            self._queue.put_nowait(job["job_id"])
+        except asyncio.QueueFull:
+            # Hàng đợi đầy trong lúc đang ghi file
+            await asyncio.to_thread(self._discard, job, "Hàng đợi ingestion đã đầy")
+            raise QueueFullError(
+                f"Hàng đợi ingestion đã đầy ({settings.INGEST_QUEUE_MAX_SIZE} jobs)"
+            )
+        logger.info(f"Đã nhận ingestion job {job['job_id']} cho {filename}")
+        return job
+    
+    def _stage(self, content: bytes, filename: str) -> Dict:
+        """Lưu file ra đĩa (để job có thể chạy lại sau restart) và tạo job"""
+        file_path = self.staging_dir / f"{uuid.uuid4().hex}.pdf"
+        file_path.write_bytes(content)
+        return self.store.create(filename, str(file_path))
+    
+    def _discard(self, job: Dict, error: str):
+        self.store.update(job["job_id"], status="failed", error=error)
+        Path(job["file_path"]).unlink(missing_ok=True)
+    
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Lấy trạng thái job"""
+        return await asyncio.to_thread(self.store.get, job_id)
+    
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+    
+    def _claim(self, job_id: str) -> Optional[Dict]:
+        """Job nếu process này nhận được, None nếu worker khác đã nhận"""
+        if not self.store.claim(job_id, self.worker_id):
+            return None
+        return self.store.get(job_id)
+    
+    async def _run(self, job_id: str):
+        loop = asyncio.get_running_loop()
+        job = await loop.run_in_executor(self._executor, self._claim, job_id)
+        if job is None:
+            return
+        
+        cancelled = False
+        try:
+            chunks_created = await loop.run_in_executor(self._executor, self._process, job)
+            await asyncio.to_thread(self.store.update, job_id, status="completed", chunks_created=chunks_created)
+            logger.info(f"✅ Ingestion job {job_id} hoàn thành: {chunks_created} chunks")
+        
+        except asyncio.CancelledError:
+            # Shutdown: job vẫn ở trạng thái running và được chạy lại sau restart
+            cancelled = True
+            raise
+        
+        except Exception as e:
+            logger.error(f"❌ Ingestion job {job_id} thất bại: {str(e)}")
+            await asyncio.to_thread(self.store.update, job_id, status="failed", error=str(e))
+        
+        finally:
+            # Job đã kết thúc (thành công hay lỗi) thì file upload tạm không còn cần
+            if not cancelled:
+                Path(job["file_path"]).unlink(missing_ok=True)
+    
+    def _process(self, job: Dict) -> int:
+        """Chạy trong worker thread - extract, chunk, embed, store"""
+        content = Path(job["file_path"]).read_bytes()
+        stages = _empty_stages()
+        last_flush = 0.0
+        
+        def report(stage: str, done: int, total: Optional[int]):
+            nonlocal last_flush
+            finished = total is not None and done >= total
+            stages[stage] = {
+                "status": "done" if finished else "running",
+                "done": done,
+                "total": total
+            }
+            
+            # Giới hạn số lần ghi SQLite, luôn ghi khi một stage kết thúc
+            now = time.monotonic()
+            if finished or now - last_flush >= settings.INGEST_PROGRESS_INTERVAL:
+                last_flush = now
+                self.store.update(job["job_id"], stages=stages)
+        
+        return self.pdf_processor.process_pdf_sync(content, job["filename"], report)
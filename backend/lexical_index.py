@@ -0,0 +1,610 @@
+"""
+Lexical Index Module - BM25 inverted index trong process, chạy song song với ChromaDB
+
+Bổ sung cho dense retrieval các truy vấn cần khớp chính xác từ khóa (tên thuốc,
+mã ICD, liều lượng) mà embedding model hay bỏ sót.
+
+Lưu trên đĩa cạnh ChromaDB gồm:
+  - {name}_bm25.npz: snapshot đã compact (CSR postings)
+  - {name}_bm25.log: JSONL các thay đổi sau snapshot, replay khi khởi động
+  - {name}_bm25.lock: lock giữa các process (uvicorn workers dùng chung các file trên)
+
+Mỗi worker giữ index riêng trong bộ nhớ và đọc thêm phần log / snapshot do worker
+khác ghi trước mỗi lần search (xem LexicalIndex.refresh).
+"""
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Mã ICD (j45.9), số kèm đơn vị (500mg, 0,5ml), còn lại theo từng âm tiết / từ
+_TOKEN_RE = re.compile(
+    r"[a-z]\d{2}(?:\.\d+)?\b"
+    r"|\d+(?:[.,]\d+)*(?:mg|mcg|µg|g|kg|ml|l|ui|iu)?\b"
+    r"|\w+"
+)
+
+# Chuẩn hóa vị trí dấu thanh kiểu mới (hoà, thuý) về kiểu cũ (hòa, thúy)
+_TONE_MAP = {
+    "oà": "òa", "oá": "óa", "oả": "ỏa", "oã": "õa", "oạ": "ọa",
+    "oè": "òe", "oé": "óe", "oẻ": "ỏe", "oẽ": "õe", "oẹ": "ọe",
+    "uỳ": "ùy", "uý": "úy", "uỷ": "ủy", "uỹ": "ũy", "uỵ": "ụy",
+}
+
+# Hư từ tiếng Việt xuất hiện trong hầu hết các chunks, không mang thông tin
+STOPWORDS = frozenset(
+    "và của là các có được cho trong với những một này không khi để thì đã từ "
+    "hoặc như theo về tại do bị nên cũng đến sau trên ra vào lại nếu mà thể "
+    "rằng vì đó nào các nhưng hay còn rất đang sẽ phải ở".split()
+)
+
+# Term frequency lưu dạng uint16
+_MAX_TF = 65535
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách text tiếng Việt thành tokens cho BM25
+    
+    NFC unicode, lowercase, chuẩn hóa vị trí dấu thanh, giữ nguyên mã ICD và
+    số kèm đơn vị liều lượng, bỏ stopwords.
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in STOPWORDS:
+            continue
+        tail = token[-2:]
+        if tail in _TONE_MAP and not token.endswith("q" + tail):
+            token = token[:-2] + _TONE_MAP[tail]
+        tokens.append(token)
+    return tokens
+
+
+class _FileLock:
+    """Lock độc quyền giữa các process trên một file (không reentrant)"""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+    
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+    
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def _file_key(path: Path) -> Optional[Tuple[int, int, int]]:
+    """(inode, mtime ns, size) của file, None nếu chưa có"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Gộp nhiều danh sách xếp hạng bằng Reciprocal Rank Fusion: score = sum 1 / (k + rank)
+    
+    Args:
+        rankings: Các danh sách IDs, mỗi danh sách xếp theo độ liên quan giảm dần
+        k: Hằng số làm mượt - k càng lớn thì chênh lệch giữa các hạng đầu càng nhỏ
+    
+    Returns:
+        List of (ID, RRF score) giảm dần theo score
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index cập nhật incremental
+    
+    Mỗi chunk được gán một số nguyên nội bộ theo thứ tự thêm vào; postings của mỗi term
+    là hai array (doc, tf) tăng dần theo doc. Xóa / ghi đè chỉ đánh dấu doc cũ là
+    dead, snapshot sẽ compact lại. df dùng độ dài postings (gồm cả doc dead) cho tới
+    lần compact tiếp theo.
+    
+    Term có postings dài hơn max_term_postings chỉ được chấm điểm trên tier gồm các docs
+    có BM25 weight cao nhất (chọn lúc snapshot) cộng các docs thêm sau snapshot - thời gian
+    query bị chặn theo max_term_postings thay vì tăng theo số chunks.
+    
+    Ghi log / snapshot giữ file lock; trước khi ghi, index đọc thêm các thay đổi mà
+    process khác đã ghi, nên snapshot không làm mất chunks của worker khác.
+    """
+    
+    def __init__(
+        self,
+        path: Path,
+        k1: float = 1.2,
+        b: float = 0.75,
+        max_df_ratio: float = 0.3,
+        max_term_postings: int = 10000,
+        log_max_docs: int = 50000
+    ):
+        """
+        Args:
+            path: Đường dẫn gốc (không có đuôi) của file snapshot / log
+            k1: Tham số bão hòa term frequency của BM25
+            b: Mức chuẩn hóa theo độ dài chunk của BM25
+            max_df_ratio: Bỏ qua term có mặt trong nhiều hơn tỉ lệ này số chunks khi search
+            max_term_postings: Số postings tối đa được chấm điểm cho mỗi term
+            log_max_docs: Ghi snapshot mới khi log vượt số chunks thay đổi này
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.max_term_postings = max_term_postings
+        self.log_max_docs = log_max_docs
+        self.ready = True
+        
+        self._lock = threading.RLock()
+        self._file_lock = _FileLock(self.path.with_name(self.path.name + ".lock"))
+        # Phần dữ liệu trên đĩa đã nạp: snapshot (inode, mtime) và log (inode, số bytes đã đọc)
+        self._snapshot_key: Optional[Tuple[int, int]] = None
+        self._log_ino: Optional[int] = None
+        self._log_offset = 0
+        self._log_partial = False
+        self._log_docs = 0
+        self._scores = np.zeros(0, dtype=np.float32)
+        self._reset()
+    
+    def _reset(self):
+        self._terms: Dict[str, int] = {}
+        self._post_docs: List[array] = []
+        self._post_tfs: List[array] = []
+        self._doc_ids: List[str] = []
+        self._doc_index: Dict[str, int] = {}
+        self._doc_len = array("I")
+        self._alive = bytearray()
+        self._live_docs = 0
+        self._live_len = 0
+        # Tier của các term dài: {term_id: (docs, tfs)} trên các docs < _tier_limit
+        self._tiers: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._tier_limit = 0
+    
+    @property
+    def snapshot_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".npz")
+    
+    @property
+    def log_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".log")
+    
+    def __len__(self) -> int:
+        return self._live_docs
+    
+    def _add_tokens(self, doc_id: str, tokens: List[str]):
+        """Thêm một chunk đã tokenize (caller giữ lock)"""
+        old = self._doc_index.get(doc_id)
+        if old is not None:
+            self._kill(old)
+        
+        doc = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        self._doc_index[doc_id] = doc
+        self._doc_len.append(len(tokens))
+        self._alive.append(1)
+        self._live_docs += 1
+        self._live_len += len(tokens)
+        
+        for term, tf in Counter(tokens).items():
+            term_id = self._terms.get(term)
+            if term_id is None:
+                term_id = len(self._post_docs)
+                self._terms[term] = term_id
+                self._post_docs.append(array("I"))
+                self._post_tfs.append(array("H"))
+            self._post_docs[term_id].append(doc)
+            self._post_tfs[term_id].append(min(tf, _MAX_TF))
+    
+    def _kill(self, doc: int):
+        if self._alive[doc]:
+            self._alive[doc] = 0
+            self._live_docs -= 1
+            self._live_len -= self._doc_len[doc]
+    
+    def add(self, ids: List[str], texts: List[str], persist: bool = True):
+        """
+        Thêm hoặc ghi đè các chunks (upsert theo ID)
+        
+        Args:
+            ids: IDs của chunks (trùng với IDs trong ChromaDB)
+            texts: Nội dung chunks
+            persist: Ghi vào log - False khi build lại toàn bộ (gọi snapshot() sau cùng)
+        """
+        if not ids:
+            return
+        tokenized = [tokenize(text) for text in texts]
+        with self._lock:
+            if not persist:
+                for doc_id, tokens in zip(ids, tokenized):
+                    self._add_tokens(doc_id, tokens)
+                return
+            with self._file_lock:
+                self._sync()
+                for doc_id, tokens in zip(ids, tokenized):
+                    self._add_tokens(doc_id, tokens)
+                self._append_log({"add": [[doc_id, text] for doc_id, text in zip(ids, texts)]}, len(ids))
+    
+    def remove(self, ids: Iterable[str]):
+        """Xóa các chunks theo ID (bỏ qua ID không có trong index)"""
+        ids = list(ids)
+        with self._lock, self._file_lock:
+            self._sync()
+            removed = []
+            for doc_id in ids:
+                doc = self._doc_index.pop(doc_id, None)
+                if doc is not None:
+                    self._kill(doc)
+                    removed.append(doc_id)
+            if removed:
+                self._append_log({"remove": removed}, len(removed))
+    
+    def clear(self):
+        """Xóa toàn bộ index (cả trên đĩa)"""
+        with self._lock, self._file_lock:
+            self._reset()
+            self._snapshot()
+    
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        Tìm các chunks có BM25 score cao nhất
+        
+        Args:
+            query: Câu query
+            top_k: Số kết quả tối đa
+        
+        Returns:
+            List of (chunk ID, BM25 score) giảm dần theo score
+        """
+        tokens = set(tokenize(query))
+        if not tokens or top_k <= 0:
+            return []
+        
+        self.refresh()
+        with self._lock:
+            if not self._live_docs:
+                return []
+            total_docs = len(self._doc_ids)
+            live_docs = self._live_docs
+            avg_len = self._live_len / live_docs
+            
+            postings = []
+            for token in tokens:
+                term_id = self._terms.get(token)
+                if term_id is not None:
+                    postings.append((len(self._post_docs[term_id]), term_id))
+            if not postings:
+                return []
+            
+            # Term phổ biến gần như stopword: tốn nhiều thời gian nhất mà đóng góp ít,
+            # luôn giữ lại term hiếm nhất
+            postings.sort()
+            max_df = max(1, int(self.max_df_ratio * live_docs))
+            postings = [p for i, p in enumerate(postings) if i == 0 or p[0] <= max_df]
+            
+            if len(self._scores) < total_docs:
+                self._scores = np.zeros(max(total_docs, 2 * len(self._scores)), dtype=np.float32)
+            scores = self._scores
+            doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+            
+            candidates = []
+            for df, term_id in postings:
+                docs, tfs = self._term_postings(term_id)
+                tfs = tfs.astype(np.float32)
+                idf = math.log(1 + (live_docs - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * doc_len[docs] / avg_len)
+                # Mỗi doc xuất hiện tối đa một lần trong postings của một term;
+                # weight luôn > 0 nên score 0 nghĩa là doc chưa có trong candidates
+                current = scores[docs]
+                candidates.append(docs[current == 0])
+                scores[docs] = current + (idf * (self.k1 + 1)) * tfs / (tfs + norm)
+            
+            candidates = np.concatenate(candidates)
+            alive = np.frombuffer(self._alive, dtype=np.uint8)
+            candidate_scores = scores[candidates] * alive[candidates]
+            scores[candidates] = 0
+            
+            if len(candidates) > top_k:
+                top = np.argpartition(-candidate_scores, top_k)[:top_k]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-candidate_scores[top])]
+            
+            return [
+                (self._doc_ids[candidates[i]], float(candidate_scores[i]))
+                for i in top if candidate_scores[i] > 0
+            ]
+    
+    def _term_postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Postings (docs, tfs) được chấm điểm của term: toàn bộ, hoặc tier + docs thêm sau snapshot"""
+        docs = np.frombuffer(self._post_docs[term_id], dtype=np.uint32)
+        tfs = np.frombuffer(self._post_tfs[term_id], dtype=np.uint16)
+        tier = self._tiers.get(term_id)
+        if tier is None:
+            return docs, tfs
+        start = np.searchsorted(docs, self._tier_limit)
+        return np.concatenate((tier[0], docs[start:])), np.concatenate((tier[1], tfs[start:]))
+    
+    def _build_tiers(self):
+        """Chọn tier (docs có BM25 weight cao nhất) cho các term có postings dài (caller giữ lock)"""
+        self._tiers = {}
+        self._tier_limit = len(self._doc_ids)
+        if not self._live_docs:
+            return
+        doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+        avg_len = self._live_len / self._live_docs
+        for term_id, post_docs in enumerate(self._post_docs):
+            if len(post_docs) <= self.max_term_postings:
+                continue
+            docs = np.frombuffer(post_docs, dtype=np.uint32)
+            tfs = np.frombuffer(self._post_tfs[term_id], dtype=np.uint16)
+            tf = tfs.astype(np.float32)
+            weight = tf / (tf + self.k1 * (1 - self.b + self.b * doc_len[docs] / avg_len))
+            top = np.sort(np.argpartition(-weight, self.max_term_postings)[:self.max_term_postings])
+            self._tiers[term_id] = (docs[top], tfs[top])
+    
+    def _append_log(self, record: Dict, docs: int):
+        """Ghi thay đổi vào log, ghi snapshot mới nếu log quá lớn (caller giữ cả hai lock, đã _sync)"""
+        self._log_docs += docs
+        if self._log_docs >= self.log_max_docs:
+            self._snapshot()
+            return
+        # Mở file mỗi lần ghi: log có thể vừa được worker khác thay bằng snapshot
+        line = ("\n" if self._log_partial else "") + json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, "ab") as f:
+                f.write(line.encode("utf-8"))
+            log = _file_key(self.log_path)
+            self._log_ino, self._log_offset, self._log_partial = log[0], log[2], False
+        except OSError as e:
+            logger.warning(f"Không ghi được BM25 log {self.log_path}: {str(e)}")
+    
+    def _compact(self):
+        """Bỏ các docs dead, đánh số lại docs liên tục (caller giữ lock)"""
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        if alive.all():
+            return
+        remap = np.cumsum(alive, dtype=np.int64) - 1
+        
+        terms: Dict[str, int] = {}
+        post_docs: List[array] = []
+        post_tfs: List[array] = []
+        for term, term_id in self._terms.items():
+            docs = np.frombuffer(self._post_docs[term_id], dtype=np.uint32)
+            keep = alive[docs]
+            if not keep.any():
+                continue
+            terms[term] = len(post_docs)
+            post_docs.append(array("I", remap[docs[keep]].astype(np.uint32).tobytes()))
+            post_tfs.append(array("H", np.frombuffer(self._post_tfs[term_id], dtype=np.uint16)[keep].tobytes()))
+        
+        doc_ids = [doc_id for doc_id, keep in zip(self._doc_ids, alive) if keep]
+        self._terms = terms
+        self._post_docs = post_docs
+        self._post_tfs = post_tfs
+        self._doc_ids = doc_ids
+        self._doc_index = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        self._doc_len = array("I", np.frombuffer(self._doc_len, dtype=np.uint32)[alive].tobytes())
+        self._alive = bytearray(b"\x01" * len(doc_ids))
+    
+    def snapshot(self):
+        """Compact và ghi snapshot (atomic) gồm cả thay đổi của các process khác, xóa log"""
+        with self._lock, self._file_lock:
+            self._sync()
+            self._snapshot()
+    
+    def _snapshot(self):
+        """Ghi snapshot từ dữ liệu trong bộ nhớ (caller giữ cả hai lock)"""
+        self._compact()
+        self._build_tiers()
+        
+        # Sau compact, term_id đúng bằng thứ tự của term trong self._terms
+        terms = list(self._terms)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(docs) for docs in self._post_docs], out=offsets[1:])
+        post_docs = np.concatenate(
+            [np.frombuffer(docs, dtype=np.uint32) for docs in self._post_docs]
+            or [np.zeros(0, dtype=np.uint32)]
+        )
+        post_tfs = np.concatenate(
+            [np.frombuffer(tfs, dtype=np.uint16) for tfs in self._post_tfs]
+            or [np.zeros(0, dtype=np.uint16)]
+        )
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            doc_ids=np.frombuffer("\n".join(self._doc_ids).encode("utf-8"), dtype=np.uint8),
+            offsets=offsets,
+            post_docs=post_docs,
+            post_tfs=post_tfs,
+            doc_len=np.frombuffer(self._doc_len, dtype=np.uint32)
+        )
+        os.replace(tmp_path, self.snapshot_path)
+        self._snapshot_key = _file_key(self.snapshot_path)[:2]
+        
+        self.log_path.unlink(missing_ok=True)
+        self._log_ino, self._log_offset, self._log_partial = None, 0, False
+        self._log_docs = 0
+    
+    def load(self) -> bool:
+        """
+        Đọc snapshot và replay log
+        
+        Returns:
+            False nếu chưa có dữ liệu trên đĩa hoặc không đọc được (cần rebuild)
+        """
+        with self._lock, self._file_lock:
+            try:
+                return self._load_files()
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"BM25 index {self.path} không đọc được, cần rebuild: {str(e)}")
+                self._reset()
+                return False
+    
+    def refresh(self) -> bool:
+        """
+        Nạp các thay đổi do process khác ghi (uvicorn workers dùng chung file index)
+        
+        Khi không có gì thay đổi chỉ tốn hai lần stat; ngược lại đọc phần log mới,
+        hoặc load lại toàn bộ nếu worker khác vừa ghi snapshot.
+        
+        Returns:
+            True nếu index đã thay đổi
+        """
+        snapshot = _file_key(self.snapshot_path)
+        log = _file_key(self.log_path)
+        if (snapshot[:2] if snapshot else None) == self._snapshot_key and (
+            (log[0], log[2]) == (self._log_ino, self._log_offset) if log else self._log_ino is None
+        ):
+            return False
+        with self._lock, self._file_lock:
+            try:
+                return self._sync()
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Không đọc được thay đổi của BM25 index {self.path}: {str(e)}")
+                return False
+    
+    def _sync(self) -> bool:
+        """Đọc thay đổi trên đĩa mà index chưa có (caller giữ cả hai lock)"""
+        snapshot = _file_key(self.snapshot_path)
+        if (snapshot[:2] if snapshot else None) != self._snapshot_key:
+            self._load_files()
+            return True
+        log = _file_key(self.log_path)
+        if log is None:
+            return False
+        if log[0] != self._log_ino:
+            self._log_ino, self._log_offset, self._log_partial = log[0], 0, False
+        if log[2] == self._log_offset:
+            return False
+        self._replay_log()
+        return True
+    
+    def _load_files(self) -> bool:
+        """Load lại từ snapshot + log (caller giữ cả hai lock)"""
+        self._reset()
+        self._snapshot_key = None
+        self._log_ino, self._log_offset, self._log_partial = None, 0, False
+        self._log_docs = 0
+        
+        snapshot = _file_key(self.snapshot_path)
+        log = _file_key(self.log_path)
+        if snapshot is None and log is None:
+            return False
+        if snapshot is not None:
+            self._load_snapshot()
+            self._build_tiers()
+            self._snapshot_key = snapshot[:2]
+        if log is not None:
+            self._log_ino = log[0]
+            self._replay_log()
+        return True
+    
+    def _load_snapshot(self):
+        with np.load(self.snapshot_path) as data:
+            terms = data["terms"].tobytes().decode("utf-8")
+            doc_ids = data["doc_ids"].tobytes().decode("utf-8")
+            offsets = data["offsets"]
+            post_docs = data["post_docs"]
+            post_tfs = data["post_tfs"]
+            doc_len = data["doc_len"]
+        
+        self._doc_ids = doc_ids.split("\n") if doc_ids else []
+        self._doc_index = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+        self._doc_len = array("I", doc_len.tobytes())
+        self._alive = bytearray(b"\x01" * len(self._doc_ids))
+        self._live_docs = len(self._doc_ids)
+        self._live_len = int(doc_len.sum())
+        for i, term in enumerate(terms.split("\n") if terms else []):
+            self._terms[term] = i
+            self._post_docs.append(array("I", post_docs[offsets[i]:offsets[i + 1]].tobytes()))
+            self._post_tfs.append(array("H", post_tfs[offsets[i]:offsets[i + 1]].tobytes()))
+    
+    def _replay_log(self):
+        """Replay phần log từ _log_offset tới cuối file"""
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        if not data:
+            return
+        self._log_offset += len(data)
+        # Dòng cuối ghi dở khi process bị kill - lần ghi sau bắt đầu bằng dòng mới
+        self._log_partial = not data.endswith(b"\n")
+        for line in data.split(b"\n"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            for doc_id, text in record.get("add", []):
+                self._add_tokens(doc_id, tokenize(text))
+            for doc_id in record.get("remove", []):
+                doc = self._doc_index.pop(doc_id, None)
+                if doc is not None:
+                    self._kill(doc)
+            self._log_docs += len(record.get("add", [])) + len(record.get("remove", []))
+    
+    def destroy(self):
+        """Xóa index khỏi đĩa (collection tương ứng đã bị xóa)"""
+        with self._lock, self._file_lock:
+            self.snapshot_path.unlink(missing_ok=True)
+            self.log_path.unlink(missing_ok=True)
+            self._reset()
+            self._snapshot_key = None
+            self._log_ino, self._log_offset, self._log_partial = None, 0, False
+            self._log_docs = 0
+    
+    def stats(self) -> Dict:
+        """Thống kê index"""
+        return {
+            "ready": self.ready,
+            "chunks": self._live_docs,
+            "terms": len(self._terms),
+            "postings": sum(len(docs) for docs in self._post_docs),
+            "dead_chunks": len(self._doc_ids) - self._live_docs,
+            "log_chunks": self._log_docs
+        }
@@ -2,21 +2,47 @@
 LLM Service Module - Tích hợp Ollama với LangChain và RAG pipeline
 """
 import ollama
-from typing import List, Optional, Tuple, AsyncGenerator
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple, AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import json
 import logging
+import time
 from config import settings
 from models import ChatMessage
-from vector_store import VectorStore
+from cache import SemanticAnswerCache
+from metrics import (
+    LLM_ABORTED_GENERATIONS,
+    LLM_GENERATION_SECONDS,
+    LLM_TOKENS_PER_SECOND,
+    LLM_TOKENS_SAVED_UPPER_BOUND,
+    LLM_TTFT_SECONDS,
+    RAG_STAGE_SECONDS
+)
+from prompt_builder import PromptBudget, TokenCounter
+from sse import SourcesText, StreamError
+from tracing import span
+
+if TYPE_CHECKING:
+    from vector_store import VectorStore
 
 logger = logging.getLogger(__name__)
 
+# Kết quả retrieve_context: (prompt, sources, chunk_refs, context_tokens)
+Retrieved = Tuple[str, List[str], List[str], int]
+
+
+class LLMBusyError(Exception):
+    """Raised khi không có slot trống để gửi request tới Ollama trong thời gian chờ"""
+
 
 class LLMService:
     """
     Service xử lý LLM requests với Ollama và RAG
     """
     
-    def __init__(self, vector_store: VectorStore):
+    def __init__(self, vector_store: "VectorStore"):
         """
         Args:
             vector_store: Instance của VectorStore để retrieve context
@@ -24,6 +50,19 @@ class LLMService:
         self.vector_store = vector_store
         self.model = settings.OLLAMA_MODEL
         self.client = ollama.Client(host=settings.OLLAMA_BASE_URL)
+        self.async_client = ollama.AsyncClient(host=settings.OLLAMA_BASE_URL)
+        
+        # Giới hạn số generation chạy đồng thời trên Ollama
+        self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENT_REQUESTS)
+        
+        # Semantic answer cache (opt-in)
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        if settings.ENABLE_SEMANTIC_CACHE:
+            self.answer_cache = SemanticAnswerCache(
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS
+            )
         
         # System prompt cho medical chatbot
         self.system_prompt = """Bạn là trợ lý tư vấn y tế thông minh của MediTrust - Hệ thống y tế hàng đầu Việt Nam.
@@ -64,8 +103,44 @@ class LLMService:
 - KHÔNG thay thế ý kiến bác sĩ
 - LUÔN khuyến khích đến MediTrust khám
 - CHỈ dùng thông tin từ context được cung cấp"""
+        
+        # Phân bổ token budget cho system prompt, context và lịch sử
+        self.prompt_budget = PromptBudget(
+            TokenCounter(settings.TOKENIZER_ENCODING),
+            self.system_prompt
+        )
     
-    def check_ollama_connection(self) -> bool:
+    async def preload_model(self) -> bool:
+        """
+        Load model vào RAM và prefill system prompt trước request đầu tiên
+        
+        Dùng cùng options (num_ctx) với các request thật để Ollama không phải load lại
+        model, và system prompt đã nằm sẵn trong prompt cache.
+        
+        Returns:
+            True nếu preload thành công
+        """
+        try:
+            start = time.perf_counter()
+            await asyncio.wait_for(
+                self.async_client.chat(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": "Xin chào"}
+                    ],
+                    options={**self._build_options(), "num_predict": 1},
+                    keep_alive=self._keep_alive()
+                ),
+                timeout=settings.LLM_REQUEST_TIMEOUT
+            )
+            logger.info(f"✅ Đã preload model {self.model} ({time.perf_counter() - start:.1f}s)")
+            return True
+        except Exception as e:
+            logger.warning(f"Không preload được model {self.model}: {str(e)}")
+            return False
+    
+    async def check_ollama_connection(self) -> bool:
         """
         Kiểm tra connection với Ollama server
         
@@ -74,7 +149,7 @@ class LLMService:
         """
         try:
             # List models để test connection
-            self.client.list()
+            await asyncio.wait_for(self.async_client.list(), timeout=5.0)
             logger.info("✅ Ollama connection OK")
             return True
         except Exception as e:
@@ -92,91 +167,345 @@ class LLMService:
         Returns:
             Tuple of (prompt, sources)
         """
+        prompt, sources, _, _ = self.retrieve_context(query, use_rag)
+        return prompt, sources
+    
+    @staticmethod
+    def _rag_prompt(context: str, query: str) -> str:
+        """User message của RAG: context tài liệu + câu hỏi + hướng dẫn trả lời"""
+        return f"""Dựa trên ngữ cảnh sau đây từ tài liệu y tế:
+
+{context}
+
+---
+
+Người dùng hỏi: {query}
+
+Nếu câu hỏi KHÔNG liên quan đến y tế/sức khỏe: hãy từ chối lịch sự (1-2 câu) và dừng lại.
+
+Nếu câu hỏi liên quan đến y tế/sức khỏe: hãy trả lời ngắn gọn (3-5 câu), bám sát nội dung tài liệu. Kết thúc bằng disclaimer về MediTrust như đã hướng dẫn."""
+    
+    def retrieve_context(
+        self,
+        query: str,
+        use_rag: bool = True,
+        timings: Optional[Dict] = None
+    ) -> Tuple[str, List[str], List[str], int]:
+        """
+        Retrieve documents và build prompt trong giới hạn token budget
+        
+        Args:
+            query: Câu hỏi từ user
+            use_rag: Có sử dụng RAG không
+            timings: Dict nhận thời gian (ms) từng stage retrieval và build context
+            
+        Returns:
+            Tuple of (prompt, sources, chunk_refs, context_tokens) - chunk_refs là
+            references của các chunks thực sự nằm trong prompt
+        """
         sources = []
+        chunk_refs = []
         
         if not use_rag:
-            return query, sources
+            return query, sources, chunk_refs, 0
+        if timings is None:
+            timings = {}
         
         try:
             # Retrieve relevant documents
-            docs, metadatas, scores = self.vector_store.similarity_search(
+            docs, metadatas, scores, ids = self.vector_store.similarity_search(
                 query=query,
-                top_k=settings.TOP_K_RESULTS
+                top_k=settings.TOP_K_RESULTS,
+                include_ids=True,
+                timings=timings
             )
+            started = time.perf_counter()
             
             if not docs:
                 logger.info("Không tìm thấy context từ documents")
-                return query, sources
+                return query, sources, chunk_refs, 0
+            
+            # Giữ các tài liệu liên quan nhất vừa với token budget
+            budget = self.prompt_budget.context_budget(self._rag_prompt("", query))
+            formatted = [
+                f"[Tài liệu {i}] (Độ liên quan: {score:.2f})\n{doc}"
+                for i, (doc, score) in enumerate(zip(docs, scores), 1)
+            ]
+            fitted, context_tokens = self.prompt_budget.fit_documents(formatted, budget)
             
             # Build context
             context_parts = []
-            for i, (doc, meta, score) in enumerate(zip(docs, metadatas, scores), 1):
-                context_parts.append(f"[Tài liệu {i}] (Độ liên quan: {score:.2f})\n{doc}")
+            for part, full, doc, meta, doc_id in zip(fitted, formatted, docs, metadatas, ids):
+                if part is None:
+                    continue
+                context_parts.append(part)
                 sources.append(meta.get('source', 'Unknown'))
+                # Hash nội dung gốc (không gồm điểm liên quan - khác nhau giữa các câu hỏi diễn đạt
+                # lại) để chunk cùng ID nhưng đã đổi nội dung không khớp cache
+                ref = f"{doc_id}:{hashlib.sha1(doc.encode('utf-8')).hexdigest()[:12]}"
+                if part != full:
+                    # Bị cắt bớt: thêm số ký tự của tài liệu còn giữ lại
+                    ref += f":{len(part) - (len(full) - len(doc))}"
+                chunk_refs.append(ref)
             
-            context = "\n\n".join(context_parts)
+            if not context_parts:
+                logger.warning(f"Không còn token budget cho context ({budget} tokens)")
+                return query, [], [], 0
             
             # Build full prompt
-            prompt = f"""Dựa trên ngữ cảnh sau đây từ tài liệu y tế:
-
-{context}
-
----
-
-Người dùng hỏi: {query}
-
-Nếu câu hỏi KHÔNG liên quan đến y tế/sức khỏe: hãy từ chối lịch sự (1-2 câu) và dừng lại.
-
-Nếu câu hỏi liên quan đến y tế/sức khỏe: hãy trả lời ngắn gọn (3-5 câu), bám sát nội dung tài liệu. Kết thúc bằng disclaimer về MediTrust như đã hướng dẫn."""
+            prompt = self._rag_prompt("\n\n".join(context_parts), query)
+            elapsed = time.perf_counter() - started
+            timings["context"] = round(elapsed * 1000, 2)
+            RAG_STAGE_SECONDS.labels("prompt_build").observe(elapsed)
             
-            logger.info(f"Built RAG prompt with {len(docs)} documents")
-            return prompt, sources
+            logger.info(
+                f"Built RAG prompt with {len(context_parts)}/{len(docs)} documents "
+                f"({context_tokens}/{budget} tokens), retrieval timings: {timings}"
+            )
+            return prompt, sources, chunk_refs, context_tokens
             
         except Exception as e:
             logger.error(f"Lỗi khi build context: {str(e)}")
-            return query, sources
+            return query, [], [], 0
     
     def build_conversation_messages(
         self,
         query: str,
-        conversation_history: Optional[List[ChatMessage]] = None
-    ) -> List[dict]:
+        conversation_history: Optional[List[ChatMessage]] = None,
+        context_tokens: int = 0
+    ) -> Tuple[List[dict], Dict]:
         """
         Build messages list cho Ollama từ conversation history
         
+        Lịch sử được giữ theo token budget (bỏ các lượt cũ nhất trước) thay vì số messages cố định.
+        
         Args:
-            query: Current query
+            query: Current query (đã kèm context nếu dùng RAG)
             conversation_history: Previous messages
+            context_tokens: Số token của context tài liệu trong query
             
         Returns:
-            List of message dicts
+            Tuple of (message dicts, token usage)
         """
-        messages = [
-            {"role": "system", "content": self.system_prompt}
-        ]
+        messages, usage = self.prompt_budget.build_messages(
+            query,
+            conversation_history,
+            context_tokens
+        )
+        logger.info(
+            f"Prompt tokens: {usage['total']}/{usage['budget']} "
+            f"(system={usage['system']}, context={usage['context']}, history={usage['history']}, "
+            f"query={usage['query']}, dropped_messages={usage['history_messages_dropped']})"
+        )
+        return messages, usage
+    
+    def _answer_cache_key(self, chunk_refs: List[str], use_rag: bool) -> str:
+        """Key ngữ cảnh cho semantic cache: chunks đã retrieve, model và sampling params"""
+        payload = {
+            "chunks": chunk_refs,
+            "use_rag": use_rag,
+            "model": self.model,
+            "options": self._build_options()
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    
+    async def _retrieve(
+        self,
+        query: str,
+        use_rag: bool,
+        timings: Optional[Dict],
+        retrieved: Optional[Retrieved] = None
+    ) -> Retrieved:
+        """Retrieve context trong thread riêng, hoặc dùng lại kết quả đã retrieve lúc tra semantic cache"""
+        with span("build_context_prompt", use_rag=use_rag, reused=retrieved is not None) as context_span:
+            if retrieved is None:
+                # Embedding + ChromaDB chạy trong thread riêng
+                retrieved = await asyncio.to_thread(self.retrieve_context, query, use_rag, timings)
+            context_span.set(documents=len(retrieved[1]), context_tokens=retrieved[3])
+        return retrieved
+    
+    async def lookup_cached_answer(
+        self,
+        query: str,
+        conversation_history: Optional[List[ChatMessage]] = None,
+        use_rag: bool = True,
+        timings: Optional[Dict] = None
+    ) -> Tuple[Optional[Tuple[str, List[str]]], Optional[Retrieved]]:
+        """
+        Tìm câu trả lời đã cache cho câu hỏi tương tự (chỉ khi không có lịch sử hội thoại)
         
-        # Add conversation history
-        if conversation_history:
-            for msg in conversation_history[-10:]:  # Lấy 10 messages gần nhất
-                messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
+        Args:
+            query: User query
+            conversation_history: Previous messages
+            use_rag: Có sử dụng RAG không
+            timings: Dict nhận thời gian (ms) từng stage retrieval
+            
+        Returns:
+            Tuple of (cached, retrieved): cached là (response, sources) nếu cache hit;
+            retrieved là kết quả retrieve_context để truyền vào generate_response /
+            stream_response khi miss (không phải retrieve + rerank lần nữa)
+        """
+        if self.answer_cache is None or conversation_history:
+            return None, None
         
-        # Add current query
-        messages.append({
-            "role": "user",
-            "content": query
-        })
+        retrieved = None
+        try:
+            retrieved = await self._retrieve(query, use_rag, timings)
+            query_embedding = await asyncio.to_thread(self.vector_store.embed_query, query)
+            
+            cached = self.answer_cache.get(
+                query_embedding,
+                self._answer_cache_key(retrieved[2], use_rag)
+            )
+            if cached is not None:
+                logger.info("Semantic cache hit")
+            return cached, retrieved
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi tra semantic cache: {str(e)}")
+            return None, retrieved
+    
+    async def _store_answer(
+        self,
+        query: str,
+        conversation_history: Optional[List[ChatMessage]],
+        use_rag: bool,
+        chunk_refs: List[str],
+        answer: str,
+        sources: List[str]
+    ):
+        """Lưu câu trả lời vào semantic cache nếu request đủ điều kiện"""
+        if self.answer_cache is None or conversation_history or not answer:
+            return
         
-        return messages
+        try:
+            query_embedding = await asyncio.to_thread(self.vector_store.embed_query, query)
+            self.answer_cache.set(
+                query_embedding,
+                self._answer_cache_key(chunk_refs, use_rag),
+                answer,
+                sources
+            )
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu semantic cache: {str(e)}")
+    
+    @staticmethod
+    def _format_sources(sources: List[str]) -> SourcesText:
+        """Format danh sách nguồn hiển thị đầu câu trả lời streaming (kèm list nguồn cho typed events)"""
+        unique = list(dict.fromkeys(sources))
+        sources_text = "\n\n**📚 Nguồn tham khảo:**\n" + "\n".join(
+            f"- {src}" for src in unique
+        )
+        return SourcesText(sources_text + "\n\n---\n\n", unique)
+    
+    def _build_options(self) -> dict:
+        """Sampling options gửi kèm mỗi request Ollama"""
+        return {
+            "temperature": settings.TEMPERATURE,
+            "num_predict": settings.MAX_TOKENS,
+            "num_ctx": settings.CONTEXT_WINDOW_TOKENS,
+            "top_p": settings.TOP_P
+        }
+    
+    @staticmethod
+    def _keep_alive():
+        """OLLAMA_KEEP_ALIVE dạng duration ("30m") hoặc số giây"""
+        try:
+            return float(settings.OLLAMA_KEEP_ALIVE)
+        except ValueError:
+            return settings.OLLAMA_KEEP_ALIVE
+    
+    @asynccontextmanager
+    async def _acquire_slot(self):
+        """
+        Chờ slot trống trong giới hạn LLM_MAX_CONCURRENT_REQUESTS
+        
+        Raises:
+            LLMBusyError: Nếu chờ quá LLM_QUEUE_TIMEOUT
+        """
+        try:
+            await asyncio.wait_for(
+                self._semaphore.acquire(),
+                timeout=settings.LLM_QUEUE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise LLMBusyError(
+                f"Ollama đang bận: đã có {settings.LLM_MAX_CONCURRENT_REQUESTS} request đang xử lý"
+            )
+        
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+    
+    @staticmethod
+    def _token_counts(response) -> Dict:
+        """Số token prompt / completion Ollama báo ở response (hoặc chunk cuối của stream)"""
+        if response is None:
+            return {}
+        return {
+            "prompt_eval_count": response.get('prompt_eval_count'),
+            "eval_count": response.get('eval_count')
+        }
+    
+    @staticmethod
+    def _observe_generation(mode: str, started: float, response):
+        """Ghi thời gian generate và tokens/giây (theo số liệu Ollama trả về ở chunk cuối)"""
+        LLM_GENERATION_SECONDS.labels(mode).observe(time.perf_counter() - started)
+        if response is None:
+            return
+        eval_count = response.get('eval_count')
+        eval_duration = response.get('eval_duration')
+        if eval_count and eval_duration:
+            LLM_TOKENS_PER_SECOND.labels(mode).observe(eval_count / (eval_duration / 1e9))
+    
+    @staticmethod
+    def _record_abort(stage: str, generated: int):
+        """Ghi metrics khi stream bị hủy giữa chừng (client ngắt kết nối)"""
+        LLM_ABORTED_GENERATIONS.labels(stage).inc()
+        LLM_TOKENS_SAVED_UPPER_BOUND.inc(max(0, settings.MAX_TOKENS - generated))
+        logger.info(f"🛑 Hủy generate ở giai đoạn {stage} sau {generated} tokens")
+    
+    async def _iter_stream(
+        self,
+        stream: AsyncIterator,
+        deadline: float,
+        final: Optional[Dict] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Đọc từng chunk từ Ollama stream, dừng khi quá deadline
+        
+        Args:
+            stream: Async iterator trả về từ AsyncClient.chat(stream=True)
+            deadline: Thời điểm (time.monotonic) phải kết thúc
+            final: Dict nhận chunk cuối (done=True, chứa eval_count / eval_duration)
+            
+        Yields:
+            Nội dung text của từng chunk
+        """
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+            except StopAsyncIteration:
+                return
+            
+            if final is not None and chunk.get('done'):
+                final["response"] = chunk
+            if 'message' in chunk and 'content' in chunk['message']:
+                yield chunk['message']['content']
     
     async def generate_response(
         self,
         query: str,
         conversation_history: Optional[List[ChatMessage]] = None,
-        use_rag: bool = True
-    ) -> Tuple[str, List[str]]:
+        use_rag: bool = True,
+        timings: Optional[Dict] = None,
+        retrieved: Optional[Retrieved] = None
+    ) -> Tuple[str, List[str], Dict]:
         """
         Generate response từ LLM (non-streaming)
         
@@ -184,37 +513,56 @@ Nếu câu hỏi liên quan đến y tế/sức khỏe: hãy trả lời ngắn
             query: User query
             conversation_history: Previous messages
             use_rag: Có sử dụng RAG không
+            timings: Dict nhận thời gian (ms) từng stage retrieval và llm (gọi Ollama)
+            retrieved: Kết quả retrieve_context đã có (từ lookup_cached_answer)
             
         Returns:
-            Tuple of (response, sources)
+            Tuple of (response, sources, prompt token usage)
         """
         try:
             # Build prompt với RAG context
-            enhanced_query, sources = self.build_context_prompt(query, use_rag)
+            enhanced_query, sources, chunk_refs, context_tokens = await self._retrieve(
+                query, use_rag, timings, retrieved
+            )
             
             # Build messages
-            messages = self.build_conversation_messages(
+            messages, usage = self.build_conversation_messages(
                 enhanced_query,
-                conversation_history
+                conversation_history,
+                context_tokens
             )
             
             logger.info(f"Generating response với model: {self.model}")
             
             # Call Ollama
-            response = self.client.chat(
-                model=self.model,
-                messages=messages,
-                options={
-                    "temperature": settings.TEMPERATURE,
-                    "num_predict": settings.MAX_TOKENS,
-                    "top_p": settings.TOP_P
-                }
-            )
+            async with self._acquire_slot():
+                started = time.perf_counter()
+                with span("ollama.chat", model=self.model, stream=False) as llm_span:
+                    response = await asyncio.wait_for(
+                        self.async_client.chat(
+                            model=self.model,
+                            messages=messages,
+                            options=self._build_options(),
+                            keep_alive=self._keep_alive()
+                        ),
+                        timeout=settings.LLM_REQUEST_TIMEOUT
+                    )
+                    llm_span.set(**self._token_counts(response))
             
+            self._observe_generation("chat", started, response)
+            if timings is not None:
+                timings["llm"] = round((time.perf_counter() - started) * 1000, 2)
             answer = response['message']['content']
             logger.info(f"Generated response: {len(answer)} characters")
             
-            return answer, sources
+            # Số token prompt Ollama thực sự prefill (theo tokenizer của model)
+            usage["ollama_prompt_eval_count"] = response.get('prompt_eval_count')
+            
+            await self._store_answer(
+                query, conversation_history, use_rag, chunk_refs, answer, sources
+            )
+            
+            return answer, sources, usage
             
         except Exception as e:
             logger.error(f"Lỗi khi generate response: {str(e)}")
@@ -224,7 +572,11 @@ Nếu câu hỏi liên quan đến y tế/sức khỏe: hãy trả lời ngắn
         self,
         query: str,
         conversation_history: Optional[List[ChatMessage]] = None,
-        use_rag: bool = True
+        use_rag: bool = True,
+        on_complete: Optional[Callable[[str], Awaitable[None]]] = None,
+        stats: Optional[Dict] = None,
+        retrieved: Optional[Retrieved] = None,
+        started: Optional[float] = None
     ) -> AsyncGenerator[str, None]:
         """
         Stream response từ LLM real-time
@@ -233,52 +585,129 @@ Nếu câu hỏi liên quan đến y tế/sức khỏe: hãy trả lời ngắn
             query: User query
             conversation_history: Previous messages
             use_rag: Có sử dụng RAG không
+            on_complete: Coroutine function, được await với câu trả lời đầy đủ (không kèm nguồn) khi stream kết thúc thành công
+            stats: Dict nhận timings (ms: các stage retrieval, ttft, llm) và số tokens
+            retrieved: Kết quả retrieve_context đã có (từ lookup_cached_answer)
+            started: time.perf_counter() lúc nhận request - để TTFT tính cả phần retrieve đã làm trước
             
         Yields:
-            Chunks of response text
+            Chunks of response text; lỗi giữa chừng được yield thành StreamError
+        
+        Khi generator bị hủy (task bị cancel hoặc aclose() giữa chừng), HTTP stream tới
+        Ollama được đóng ngay để Ollama dừng generate và slot được trả lại.
         """
+        request_started = started if started is not None else time.perf_counter()
+        if stats is None:
+            stats = {}
+        timings = stats.setdefault("timings", {})
+        answer_parts = []
+        # Giai đoạn hiện tại - để biết stream bị hủy ở đâu
+        stage = "retrieval"
         try:
             # Build prompt với RAG context
-            enhanced_query, sources = self.build_context_prompt(query, use_rag)
+            enhanced_query, sources, chunk_refs, context_tokens = await self._retrieve(
+                query, use_rag, timings, retrieved
+            )
             
             # Build messages
-            messages = self.build_conversation_messages(
+            messages, usage = self.build_conversation_messages(
                 enhanced_query,
-                conversation_history
+                conversation_history,
+                context_tokens
             )
+            stats["prompt_tokens"] = usage
             
             logger.info(f"Streaming response với model: {self.model}")
             
-            # Stream từ Ollama
-            stream = self.client.chat(
-                model=self.model,
-                messages=messages,
-                stream=True,
-                options={
-                    "temperature": settings.TEMPERATURE,
-                    "num_predict": settings.MAX_TOKENS,
-                    "top_p": settings.TOP_P
-                }
-            )
-            
-            # Yield sources trước (nếu có)
-            if sources and use_rag:
-                sources_text = "\n\n**📚 Nguồn tham khảo:**\n" + "\n".join(
-                    f"- {src}" for src in set(sources)
+            stage = "queued"
+            async with self._acquire_slot():
+                stage = "prefill"
+                deadline = time.monotonic() + settings.LLM_REQUEST_TIMEOUT
+                started = time.perf_counter()
+                
+                # Stream từ Ollama
+                stream = await self.async_client.chat(
+                    model=self.model,
+                    messages=messages,
+                    stream=True,
+                    options=self._build_options(),
+                    keep_alive=self._keep_alive()
                 )
-                yield sources_text + "\n\n---\n\n"
-            
-            # Yield từng chunk
-            for chunk in stream:
-                if 'message' in chunk and 'content' in chunk['message']:
-                    content = chunk['message']['content']
-                    yield content
+                
+                final = {}
+                with span("ollama.chat", model=self.model, stream=True) as llm_span:
+                    try:
+                        # Yield sources trước (nếu có)
+                        if sources and use_rag:
+                            yield self._format_sources(sources)
+                        
+                        # Yield từng chunk
+                        async for content in self._iter_stream(stream, deadline, final):
+                            if not answer_parts:
+                                stage = "generating"
+                                ttft = time.perf_counter() - request_started
+                                LLM_TTFT_SECONDS.observe(ttft)
+                                timings["ttft"] = round(ttft * 1000, 2)
+                                llm_span.set(ttft_ms=timings["ttft"])
+                            answer_parts.append(content)
+                            yield content
+                    finally:
+                        # Đóng HTTP stream để Ollama dừng generate khi client ngắt kết nối
+                        try:
+                            await stream.aclose()
+                        except RuntimeError:
+                            # Lần đọc dở bị cancel vẫn đang tự dọn dẹp - nó sẽ tự đóng stream
+                            pass
+                    token_counts = self._token_counts(final.get("response"))
+                    llm_span.set(**token_counts)
+                self._observe_generation("stream", started, final.get("response"))
+                timings["llm"] = round((time.perf_counter() - started) * 1000, 2)
+                stats["completion_tokens"] = token_counts.get("eval_count")
+                usage["ollama_prompt_eval_count"] = token_counts.get("prompt_eval_count")
             
             logger.info("Streaming completed")
             
+            answer = "".join(answer_parts)
+            if on_complete is not None:
+                await on_complete(answer)
+            
+            await self._store_answer(
+                query, conversation_history, use_rag, chunk_refs, answer, sources
+            )
+            
+        except asyncio.TimeoutError:
+            logger.error(f"Streaming timeout sau {settings.LLM_REQUEST_TIMEOUT}s")
+            yield StreamError(f"Quá thời gian generate ({settings.LLM_REQUEST_TIMEOUT}s)")
         except Exception as e:
             logger.error(f"Lỗi khi stream response: {str(e)}")
-            yield f"\n\n❌ Lỗi: {str(e)}"
+            yield StreamError(str(e))
+        except (asyncio.CancelledError, GeneratorExit):
+            self._record_abort(stage, len(answer_parts))
+            raise
+    
+    async def stream_cached_answer(
+        self,
+        answer: str,
+        sources: List[str],
+        use_rag: bool = True
+    ) -> AsyncGenerator[str, None]:
+        """
+        Replay câu trả lời từ semantic cache dưới dạng stream
+        
+        Args:
+            answer: Câu trả lời đã cache
+            sources: Nguồn tham khảo đã cache
+            use_rag: Có sử dụng RAG không
+            
+        Yields:
+            Chunks of response text
+        """
+        if sources and use_rag:
+            yield self._format_sources(sources)
+        
+        words = answer.split(" ")
+        for i in range(0, len(words), 8):
+            yield " ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "")
     
     def pull_model(self, model_name: Optional[str] = None):
         """
@@ -1,27 +1,39 @@
 """
 Main FastAPI Application - Entry point của backend
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+from datetime import datetime
 import logging
-from typing import AsyncGenerator, Optional
-import json
+from typing import TYPE_CHECKING, AsyncGenerator, Dict, List, Optional
+import asyncio
+import time
 
 from config import settings
 from models import (
+    ChatMessage,
     ChatRequest, 
     ChatResponse, 
     HealthResponse,
-    DocumentUploadResponse,
-    EmbeddingStats
+    IngestionJobResponse,
+    EmbeddingStats,
+    SessionResponse
 )
-from vector_store import VectorStore
-from llm_service import LLMService
-from pdf_processor import PDFProcessor
+from llm_service import LLMService, LLMBusyError
+from pdf_processor import PDFProcessor, ReindexInProgressError
+from job_queue import IngestionJobQueue, JobStore, QueueFullError
+from session_store import SessionStore, SessionNotFoundError
 from auth import verify_api_key, optional_verify_api_key
 from rate_limiter import check_rate_limit, rate_limiter
+from metrics import CACHE_HITS, CACHE_HIT_RATIO, CACHE_MISSES, REGISTRY, RERANK_IN_FLIGHT
+from tracing import server_timing, start_trace
+from sse import HEARTBEAT_FRAME, SourcesText, StreamAborted, StreamError, coalesce, format_event
+
+if TYPE_CHECKING:
+    # chromadb / embedding model chỉ được import khi warm-up
+    from vector_store import VectorStore
 
 # Configure logging
 logging.basicConfig(
@@ -31,41 +43,140 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Global instances
-vector_store: VectorStore = None
+vector_store: "VectorStore" = None
 llm_service: LLMService = None
 pdf_processor: PDFProcessor = None
+job_queue: IngestionJobQueue = None
+session_store: SessionStore = None
 
+# Trạng thái warm-up: set khi các services đã sẵn sàng (hoặc khởi tạo lỗi)
+services_ready: Optional[asyncio.Event] = None
+startup_error: Optional[str] = None
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifecycle management - khởi tạo và cleanup resources"""
-    global vector_store, llm_service, pdf_processor
-    
-    logger.info("🚀 Khởi động ứng dụng Medical Chatbot...")
+
+async def init_services():
+    """Khởi tạo các services nặng (ChromaDB, embedding model, Ollama, ingestion queue)"""
+    global vector_store, llm_service, pdf_processor, job_queue, startup_error
     
+    started = time.perf_counter()
     try:
-        # Khởi tạo Vector Store
+        # Khởi tạo Vector Store (load model + mở ChromaDB trong thread riêng)
         logger.info("Đang khởi tạo ChromaDB Vector Store...")
-        vector_store = VectorStore()
+        from vector_store import VectorStore
+        vector_store = await asyncio.to_thread(VectorStore)
         
         # Khởi tạo LLM Service
         logger.info(f"Đang kết nối Ollama với model: {settings.OLLAMA_MODEL}...")
         llm_service = LLMService(vector_store)
+        if settings.OLLAMA_PRELOAD:
+            await llm_service.preload_model()
         
         # Khởi tạo PDF Processor
         logger.info("Đang khởi tạo PDF Processor...")
         pdf_processor = PDFProcessor(vector_store)
         
-        logger.info("✅ Khởi động thành công!")
+        # Khởi động ingestion job queue
+        logger.info("Đang khởi động ingestion job queue...")
+        job_queue = IngestionJobQueue(pdf_processor, JobStore(settings.INGEST_JOB_DB_PATH))
+        await job_queue.start()
+        
+        logger.info(f"✅ Khởi động thành công! ({time.perf_counter() - started:.1f}s)")
         
     except Exception as e:
+        startup_error = str(e)
         logger.error(f"❌ Lỗi khi khởi động: {str(e)}")
         raise
+    finally:
+        services_ready.set()
+
+
+def _cache_stats() -> Dict[str, Dict]:
+    """Stats của các caches hiện có (tính lúc scrape /metrics)"""
+    caches = {"session": session_store}
+    if vector_store is not None:
+        caches["query_embedding"] = vector_store.embedding_cache
+        caches["retrieval"] = vector_store.retrieval_cache
+    if llm_service is not None:
+        caches["semantic_answer"] = llm_service.answer_cache
+    return {name: cache.stats() for name, cache in caches.items() if cache is not None}
+
+
+def _cache_metric(field: str):
+    return lambda: {(name, ): stats[field] for name, stats in _cache_stats().items()}
+
+
+CACHE_HITS.set_callback(_cache_metric("hits"))
+CACHE_MISSES.set_callback(_cache_metric("misses"))
+CACHE_HIT_RATIO.set_callback(_cache_metric("hit_ratio"))
+RERANK_IN_FLIGHT.set_callback(
+    lambda: {(): vector_store.reranker.in_flight} if vector_store is not None and vector_store.reranker else {}
+)
+
+
+async def wait_until_ready():
+    """
+    Dependency cho các endpoints cần services - chờ warm-up xong tối đa STARTUP_READY_TIMEOUT giây
+    
+    Raises:
+        HTTPException 503: Warm-up chưa xong trong thời gian chờ hoặc khởi tạo lỗi
+    """
+    if not services_ready.is_set():
+        try:
+            await asyncio.wait_for(services_ready.wait(), timeout=settings.STARTUP_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Hệ thống đang khởi động, vui lòng thử lại sau",
+                headers={"Retry-After": "5"}
+            )
+    if startup_error is not None:
+        raise HTTPException(status_code=503, detail=f"Khởi động thất bại: {startup_error}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Lifecycle management - khởi tạo và cleanup resources"""
+    global session_store, services_ready, startup_error
+    
+    logger.info("🚀 Khởi động ứng dụng Medical Chatbot...")
+    services_ready = asyncio.Event()
+    startup_error = None
+    
+    # Lịch sử hội thoại phía server
+    session_store = SessionStore(
+        max_bytes=settings.SESSION_CACHE_MAX_MB * 1024 * 1024,
+        ttl_seconds=settings.SESSION_TTL_SECONDS,
+        max_messages=settings.SESSION_MAX_MESSAGES,
+        max_session_bytes=settings.SESSION_MAX_KB * 1024,
+        db_path=settings.SESSION_DB_PATH,
+        # Cắt lịch sử cùng khối với prompt để giữ prefix ổn định khi session đầy
+        trim_block=settings.PROMPT_HISTORY_TRIM_BLOCK if settings.PROMPT_LAYOUT == "stable_prefix" else 1
+    )
+    
+    warmup_task = None
+    if settings.FAST_STARTUP:
+        # Nhận request ngay, các services nặng được warm-up trong background
+        warmup_task = asyncio.create_task(init_services())
+        warmup_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    else:
+        await init_services()
     
     yield
     
     # Cleanup
     logger.info("🛑 Đang dừng ứng dụng...")
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    if job_queue is not None:
+        await job_queue.stop()
+    if pdf_processor is not None:
+        pdf_processor.shutdown()
+    if vector_store is not None:
+        if vector_store.reranker is not None:
+            vector_store.reranker.shutdown()
+        if vector_store.query_batcher is not None:
+            vector_store.query_batcher.shutdown()
 
 
 # Khởi tạo FastAPI app
@@ -86,7 +197,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset"]
+    expose_headers=[
+        "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset",
+        "X-Semantic-Cache", "X-Session-Id", "Server-Timing"
+    ]
 )
 
 
@@ -101,8 +215,11 @@ async def root():
         "endpoints": {
             "chat": "/chat",
             "chat_stream": "/chat/stream",
+            "sessions": "/sessions",
             "upload": "/documents/upload",
-            "stats": "/documents/stats"
+            "jobs": "/documents/jobs/{job_id}",
+            "stats": "/documents/stats",
+            "metrics": "/metrics"
         },
         "authentication": settings.ENABLE_API_KEY_AUTH,
         "rate_limiting": settings.ENABLE_RATE_LIMITING
@@ -144,9 +261,16 @@ async def api_info():
 async def health_check():
     """
     Health check endpoint - kiểm tra trạng thái hệ thống
+    
+    Trả về status "warming" khi services còn đang khởi tạo ở background.
     """
+    if startup_error is not None:
+        raise HTTPException(status_code=503, detail=f"Khởi động thất bại: {startup_error}")
+    if not services_ready.is_set():
+        return HealthResponse(status="warming", ollama_connected=False, chroma_initialized=False)
+    
     try:
-        ollama_status = llm_service.check_ollama_connection()
+        ollama_status = await llm_service.check_ollama_connection()
         chroma_status = vector_store is not None
         
         return HealthResponse(
@@ -159,10 +283,97 @@ async def health_check():
         raise HTTPException(status_code=503, detail=str(e))
 
 
-@app.post("/chat", response_model=ChatResponse, tags=["Chat"])
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+async def metrics():
+    """
+    Prometheus metrics - độ trễ từng stage RAG, TTFT, tokens/s, ingestion, cache, rate limit
+    
+    Không cần API key và không chờ warm-up để Prometheus scrape được cả lúc khởi động.
+    """
+    if not settings.ENABLE_METRICS:
+        raise HTTPException(status_code=404, detail="Metrics đã bị tắt (ENABLE_METRICS=false)")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+async def _session_call(func, *args):
+    """Gọi session store - chạy trong thread riêng khi store đọc / ghi SQLite"""
+    if session_store.blocking:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+async def _resolve_history(request: ChatRequest) -> List[ChatMessage]:
+    """Lịch sử hội thoại của request - lấy từ session store nếu có session_id"""
+    if request.session_id is None:
+        return request.conversation_history
+    try:
+        return await _session_call(session_store.get_history, request.session_id)
+    except SessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+async def _save_turn(session_id: Optional[str], question: str, answer: str):
+    """Ghi lượt hỏi đáp vừa xong vào session"""
+    if session_id is None or not answer:
+        return
+    try:
+        await _session_call(
+            session_store.append,
+            session_id,
+            ChatMessage(role="user", content=question),
+            ChatMessage(role="assistant", content=answer)
+        )
+    except SessionNotFoundError as e:
+        logger.warning(f"Không lưu được lượt hội thoại: {str(e)}")
+
+
+@app.post("/sessions", response_model=SessionResponse, status_code=201, tags=["Chat"])
+async def create_session(api_key: str = Depends(optional_verify_api_key)):
+    """
+    Tạo chat session mới - gửi session_id trong các request /chat, /chat/stream
+    thay vì conversation_history
+    """
+    return SessionResponse(session_id=await _session_call(session_store.create))
+
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse, tags=["Chat"])
+async def get_session(session_id: str, api_key: str = Depends(optional_verify_api_key)):
+    """Lấy lịch sử hội thoại của session"""
+    try:
+        messages = await _session_call(session_store.get_history, session_id)
+        return SessionResponse(session_id=session_id, messages=messages)
+    except SessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.delete("/sessions/{session_id}", tags=["Chat"])
+async def delete_session(session_id: str, api_key: str = Depends(optional_verify_api_key)):
+    """Xóa session và lịch sử hội thoại của nó"""
+    if not await _session_call(session_store.delete, session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} không tồn tại hoặc đã hết hạn")
+    return {"status": "success", "message": f"Đã xóa session {session_id}"}
+
+
+def _chat_http_error(e: Exception) -> HTTPException:
+    """Map lỗi khi xử lý chat sang HTTP: Ollama quá tải 503, timeout 504, còn lại 500"""
+    if isinstance(e, LLMBusyError):
+        logger.warning(f"Ollama quá tải: {str(e)}")
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    if isinstance(e, asyncio.TimeoutError):
+        logger.error(f"Chat timeout sau {settings.LLM_REQUEST_TIMEOUT}s")
+        return HTTPException(
+            status_code=504,
+            detail=f"Quá thời gian generate ({settings.LLM_REQUEST_TIMEOUT}s)"
+        )
+    logger.error(f"Lỗi khi xử lý chat: {str(e)}")
+    return HTTPException(status_code=500, detail=f"Lỗi xử lý: {str(e)}")
+
+
+@app.post("/chat", response_model=ChatResponse, tags=["Chat"], dependencies=[Depends(wait_until_ready)])
 async def chat(
     request: ChatRequest,
     req: Request,
+    http_response: Response,
     api_key: str = Depends(optional_verify_api_key)
 ):
     """
@@ -176,32 +387,72 @@ async def chat(
         
     Headers:
         X-API-Key: API key for authentication (if enabled)
+        Server-Timing (response): thời gian (ms) từng stage retrieval, llm và total
     """
     # Check rate limit
     if settings.ENABLE_RATE_LIMITING:
-        await check_rate_limit(req)
+        rate_limit = await check_rate_limit(req)
+        http_response.headers.update(rate_limit.headers())
+    
+    history = await _resolve_history(request)
+    started = time.perf_counter()
     
     try:
-        logger.info(f"Nhận câu hỏi: {request.message[:100]}...")
+        with start_trace("chat", use_rag=request.use_rag, session=request.session_id is not None) as root_span:
+            logger.info(f"Nhận câu hỏi: {request.message[:100]}...")
+            
+            # Replay câu trả lời từ semantic cache nếu có câu hỏi tương tự
+            retrieval_timings = {}
+            cached, retrieved = await llm_service.lookup_cached_answer(
+                query=request.message,
+                conversation_history=history,
+                use_rag=request.use_rag,
+                timings=retrieval_timings
+            )
+            root_span.set(semantic_cache=cached is not None)
+            if llm_service.answer_cache is not None:
+                http_response.headers["X-Semantic-Cache"] = "HIT" if cached else "MISS"
+            
+            if cached is not None:
+                response, sources = cached
+                prompt_tokens = None
+                retrieval_timings = None
+            else:
+                # Gọi LLM service để xử lý (dùng lại context đã retrieve lúc tra cache)
+                response, sources, prompt_tokens = await llm_service.generate_response(
+                    query=request.message,
+                    conversation_history=history,
+                    use_rag=request.use_rag,
+                    timings=retrieval_timings,
+                    retrieved=retrieved
+                )
         
-        # Gọi LLM service để xử lý
-        response, sources = await llm_service.generate_response(
-            query=request.message,
-            conversation_history=request.conversation_history,
-            use_rag=request.use_rag
-        )
+        await _save_turn(request.session_id, request.message, response)
+        http_response.headers["Server-Timing"] = server_timing({
+            **(retrieval_timings or {}),
+            "total": round((time.perf_counter() - started) * 1000, 2)
+        })
         
         return ChatResponse(
             response=response,
-            sources=sources if request.use_rag else []
+            sources=sources if request.use_rag else [],
+            prompt_tokens=prompt_tokens,
+            session_id=request.session_id,
+            retrieval_timings=retrieval_timings or None
         )
         
     except Exception as e:
-        logger.error(f"Lỗi khi xử lý chat: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Lỗi xử lý: {str(e)}")
+        raise _chat_http_error(e)
+
 
+async def _watch_disconnect(req: Request) -> bool:
+    """Chờ tới khi client ngắt kết nối (kiểm tra mỗi STREAM_DISCONNECT_POLL_SECONDS)"""
+    while not await req.is_disconnected():
+        await asyncio.sleep(settings.STREAM_DISCONNECT_POLL_SECONDS)
+    return True
 
-@app.post("/chat/stream", tags=["Chat"])
+
+@app.post("/chat/stream", tags=["Chat"], dependencies=[Depends(wait_until_ready)])
 async def chat_stream(
     request: ChatRequest,
     req: Request,
@@ -211,89 +462,208 @@ async def chat_stream(
     Streaming chat endpoint - trả về response theo real-time
     
     Returns:
-        StreamingResponse với Server-Sent Events (SSE)
+        StreamingResponse với Server-Sent Events (SSE). Tokens được gộp thành frames
+        {"chunk": "..."} (STREAM_COALESCE_MS); event cuối {"done": {...}} chứa timings (ms)
+        và số tokens của request. Với typed_events=true mỗi frame có tên event
+        (sources, delta, done, error)
         
     Headers:
         X-API-Key: API key for authentication (if enabled)
     """
     # Check rate limit
-    if settings.ENABLE_RATE_LIMITING:
-        await check_rate_limit(req)
+    rate_limit = await check_rate_limit(req) if settings.ENABLE_RATE_LIMITING else None
+    
+    history = await _resolve_history(request)
+    
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+    }
+    if rate_limit is not None:
+        headers.update(rate_limit.headers())
+    if request.session_id is not None:
+        headers["X-Session-Id"] = request.session_id
+    
+    # Semantic cache phải được tra trước khi gửi headers
+    started = time.perf_counter()
+    retrieval_timings = {}
+    try:
+        cached, retrieved = await llm_service.lookup_cached_answer(
+            query=request.message,
+            conversation_history=history,
+            use_rag=request.use_rag,
+            timings=retrieval_timings
+        )
+    except Exception as e:
+        # Chưa gửi gì cho client: trả lỗi HTTP giống /chat
+        raise _chat_http_error(e)
+    if llm_service.answer_cache is not None:
+        headers["X-Semantic-Cache"] = "HIT" if cached else "MISS"
+    
+    # Chỉ ghi vào session khi stream kết thúc trọn vẹn
+    async def save_turn(answer: str):
+        await _save_turn(request.session_id, request.message, answer)
+    
+    # typed_events: mỗi frame có tên event; mặc định giữ format cũ (chỉ data)
+    def frame(data: Dict, event: str) -> str:
+        return format_event(data, event if request.typed_events else None)
     
     async def generate_stream() -> AsyncGenerator[str, None]:
-        try:
-            async for chunk in llm_service.stream_response(
-                query=request.message,
-                conversation_history=request.conversation_history,
-                use_rag=request.use_rag
-            ):
-                # Format as SSE
-                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-                
-        except Exception as e:
-            logger.error(f"Lỗi streaming: {str(e)}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        stats = {"timings": {} if cached is not None else retrieval_timings, "semantic_cache": cached is not None}
+        with start_trace("chat_stream", use_rag=request.use_rag, session=request.session_id is not None) as root_span:
+            root_span.set(semantic_cache=cached is not None)
+            if cached is not None:
+                stream = llm_service.stream_cached_answer(*cached, use_rag=request.use_rag)
+            else:
+                stream = llm_service.stream_response(
+                    query=request.message,
+                    conversation_history=history,
+                    use_rag=request.use_rag,
+                    on_complete=save_turn,
+                    stats=stats,
+                    retrieved=retrieved,
+                    started=started
+                )
+            # Gộp tokens thành frames theo thời gian / kích thước, None = tới hạn heartbeat.
+            # Client ngắt kết nối (kể cả lúc chưa có token nào) thì generate trên Ollama bị hủy ngay
+            frames = coalesce(
+                stream,
+                interval=settings.STREAM_COALESCE_MS / 1000,
+                max_chars=settings.STREAM_COALESCE_MAX_CHARS,
+                heartbeat=settings.STREAM_HEARTBEAT_SECONDS,
+                stop=_watch_disconnect(req) if settings.STREAM_DISCONNECT_POLL_SECONDS > 0 else None
+            )
+            try:
+                async for text in frames:
+                    # Format as SSE
+                    if text is None:
+                        yield HEARTBEAT_FRAME
+                    elif request.typed_events and isinstance(text, SourcesText):
+                        yield frame({"sources": text.sources}, "sources")
+                    elif isinstance(text, StreamError):
+                        # Lỗi giữa chừng (vd: Ollama timeout): event error thay cho done
+                        root_span.set(error=text.message)
+                        yield frame({"error": text.message}, "error")
+                        break
+                    else:
+                        yield frame({"chunk": text}, "delta")
+                else:
+                    if cached is not None:
+                        await save_turn(cached[0])
+                    
+                    # Event cuối: timings và số tokens để client hiển thị
+                    stats["timings"]["total"] = round((time.perf_counter() - started) * 1000, 2)
+                    yield frame({"done": stats}, "done")
+                    
+            except StreamAborted:
+                root_span.set(aborted=True)
+                logger.info("Client ngắt kết nối, đã hủy streaming")
+            except Exception as e:
+                logger.error(f"Lỗi streaming: {str(e)}")
+                yield frame({"error": str(e)}, "error")
+            finally:
+                await frames.aclose()
+                await stream.aclose()
     
     return StreamingResponse(
         generate_stream(),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
+        headers=headers
     )
 
 
-@app.post("/documents/upload", response_model=DocumentUploadResponse, tags=["Documents"])
+def _job_response(job: Dict) -> IngestionJobResponse:
+    """Chuyển job dict từ JobStore sang response model"""
+    messages = {
+        "queued": f"Đang chờ xử lý {job['filename']}",
+        "running": f"Đang xử lý {job['filename']}",
+        "completed": f"Đã xử lý thành công {job['chunks_created']} chunks từ {job['filename']}",
+        "failed": f"Xử lý {job['filename']} thất bại"
+    }
+    return IngestionJobResponse(
+        job_id=job["job_id"],
+        filename=job["filename"],
+        status=job["status"],
+        stages=job["stages"],
+        chunks_created=job["chunks_created"],
+        error=job["error"],
+        message=messages.get(job["status"], ""),
+        created_at=datetime.fromtimestamp(job["created_at"]),
+        updated_at=datetime.fromtimestamp(job["updated_at"])
+    )
+
+
+@app.post(
+    "/documents/upload",
+    response_model=IngestionJobResponse,
+    status_code=202,
+    tags=["Documents"],
+    dependencies=[Depends(wait_until_ready)]
+)
 async def upload_document(
     file: UploadFile = File(...),
     api_key: str = Depends(verify_api_key)
 ):
     """
-    Upload và xử lý tài liệu PDF y tế
+    Upload tài liệu PDF y tế - xử lý trong background
     
     Args:
         file: PDF file upload
         
     Returns:
-        DocumentUploadResponse với thông tin xử lý
+        IngestionJobResponse với job_id, theo dõi tiến độ qua /documents/jobs/{job_id}
         
     Headers:
         X-API-Key: API key for authentication (required if auth is enabled)
     """
+    # Kiểm tra file type
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(
+            status_code=400,
+            detail="Chỉ chấp nhận file PDF"
+        )
+    
     try:
-        # Kiểm tra file type
-        if not file.filename.endswith('.pdf'):
-            raise HTTPException(
-                status_code=400,
-                detail="Chỉ chấp nhận file PDF"
-            )
-        
-        logger.info(f"Đang xử lý file: {file.filename}")
+        logger.info(f"Nhận file: {file.filename}")
         
         # Đọc file content
         content = await file.read()
         
-        # Process PDF
-        chunks_created = await pdf_processor.process_pdf(
-            content=content,
-            filename=file.filename
-        )
-        
-        return DocumentUploadResponse(
-            filename=file.filename,
-            chunks_created=chunks_created,
-            status="success",
-            message=f"Đã xử lý thành công {chunks_created} chunks từ {file.filename}"
-        )
+        # Đưa vào hàng đợi xử lý
+        job = await job_queue.submit(content=content, filename=file.filename)
+        return _job_response(job)
         
+    except QueueFullError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
         logger.error(f"Lỗi khi upload document: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/documents/stats", response_model=EmbeddingStats, tags=["Documents"])
-async def get_document_stats():
+@app.get(
+    "/documents/jobs/{job_id}",
+    response_model=IngestionJobResponse,
+    tags=["Documents"],
+    dependencies=[Depends(wait_until_ready)]
+)
+async def get_ingestion_job(job_id: str, api_key: str = Depends(verify_api_key)):
+    """
+    Lấy trạng thái và tiến độ (extract, chunk, embed, store) của ingestion job
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy job: {job_id}")
+    return _job_response(job)
+
+
+@app.get(
+    "/documents/stats",
+    response_model=EmbeddingStats,
+    tags=["Documents"],
+    dependencies=[Depends(wait_until_ready)]
+)
+async def get_document_stats(api_key: str = Depends(verify_api_key)):
     """
     Lấy thống kê về tài liệu trong vector store
     """
@@ -305,18 +675,23 @@ async def get_document_stats():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/documents/reindex", tags=["Documents"])
-async def reindex_documents(api_key: str = Depends(verify_api_key)):
+@app.post("/documents/reindex", tags=["Documents"], dependencies=[Depends(wait_until_ready)])
+async def reindex_documents(full: bool = False, api_key: str = Depends(verify_api_key)):
     """
-    Reindex tất cả PDF files trong thư mục data
+    Reindex PDF files trong thư mục data
+    
+    Mặc định chỉ index file mới/đã thay đổi và xóa chunks của file đã bị xóa.
+    Dùng ?full=true để rebuild toàn bộ collection.
     
     Headers:
         X-API-Key: API key for authentication (required if auth is enabled)
     """
     try:
-        logger.info("Bắt đầu reindex documents...")
-        result = await pdf_processor.reindex_all_pdfs()
+        logger.info(f"Bắt đầu {'full' if full else 'incremental'} reindex documents...")
+        result = await pdf_processor.reindex_all_pdfs(full=full)
         return JSONResponse(content=result)
+    except ReindexInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Lỗi khi reindex: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
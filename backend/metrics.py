@@ -0,0 +1,293 @@
+"""
+Metrics Module - Counters / histograms trong process và render theo Prometheus text format
+
+Không phụ thuộc prometheus_client. Mỗi lần observe chỉ tốn một bisect + lock (~1µs),
+các giá trị đắt hơn (cache hit ratio, ...) được tính bằng callback lúc scrape /metrics.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import threading
+
+# Cận trên các bucket (giây) cho độ trễ các stage
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Cận trên các bucket cho batch size / queue depth
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# Tokens / giây khi generate
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+
+
+class Histogram:
+    """
+    Histogram đếm theo bucket cố định (giá trị <= cận trên), thread-safe
+    """
+    
+    def __init__(self, buckets: Sequence[float] = SIZE_BUCKETS):
+        """
+        Args:
+            buckets: Cận trên của các bucket, tăng dần
+        """
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        """Ghi nhận một giá trị"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+    
+    def counts(self) -> Tuple[List[int], int, float]:
+        """Số lần quan sát theo từng bucket (không cộng dồn), count và sum"""
+        with self._lock:
+            return list(self._counts), self.count, self.sum
+    
+    def snapshot(self) -> Dict:
+        """Số lần quan sát theo từng bucket, kèm count / sum / mean"""
+        counts, count, total = self.counts()
+        buckets = {f"le_{bound}": n for bound, n in zip(self.buckets, counts)}
+        buckets["inf"] = counts[-1]
+        return {
+            "buckets": buckets,
+            "count": count,
+            "sum": total,
+            "mean": round(total / count, 2) if count else 0.0
+        }
+
+
+class Counter:
+    """Counter tăng dần, thread-safe"""
+    
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricFamily:
+    """
+    Một metric Prometheus (có thể có labels) gồm nhiều series con
+    
+    Series được tạo lần đầu qua labels(...) rồi giữ lại - caller nên giữ reference
+    tới series trên hot path thay vì gọi labels() mỗi lần.
+    """
+    
+    metric_type = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Args:
+            name: Tên metric (snake_case, có đơn vị ở cuối)
+            documentation: Mô tả hiển thị trong # HELP
+            labelnames: Tên các labels
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+    
+    def _new_series(self):
+        raise NotImplementedError
+    
+    def labels(self, *values: str):
+        """Series ứng với giá trị các labels (tạo mới nếu chưa có)"""
+        key = tuple(str(value) for value in values)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+    
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class CounterFamily(MetricFamily):
+    """Counter có labels"""
+    
+    metric_type = "counter"
+    
+    def _new_series(self) -> Counter:
+        return Counter()
+    
+    def inc(self, amount: float = 1):
+        """Tăng counter không có labels"""
+        self.labels().inc(amount)
+    
+    def _samples(self) -> Iterable[str]:
+        for values, counter in list(self._series.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(counter.value)}"
+
+
+class HistogramFamily(MetricFamily):
+    """Histogram có labels, render theo dạng cumulative buckets của Prometheus"""
+    
+    metric_type = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+    
+    def _new_series(self) -> Histogram:
+        return Histogram(self.buckets)
+    
+    def observe(self, value: float):
+        """Ghi nhận giá trị cho histogram không có labels"""
+        self.labels().observe(value)
+    
+    def _samples(self) -> Iterable[str]:
+        for values, histogram in list(self._series.items()):
+            counts, count, total = histogram.counts()
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class CallbackFamily(MetricFamily):
+    """
+    Metric tính lúc scrape từ callback - không tốn gì trên hot path
+    
+    Callback trả về dict {tuple giá trị labels: value}.
+    """
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), metric_type: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.metric_type = metric_type
+        self._callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+    
+    def set_callback(self, callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        self._callback = callback
+    
+    def _samples(self) -> Iterable[str]:
+        if self._callback is None:
+            return
+        for values, value in self._callback().items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """Danh sách các metrics được render ở /metrics"""
+    
+    def __init__(self):
+        self._metrics: List[MetricFamily] = []
+    
+    def register(self, metric: MetricFamily) -> MetricFamily:
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """Toàn bộ metrics theo Prometheus text exposition format (version 0.0.4)"""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# RAG retrieval / prompt
+RAG_STAGE_SECONDS = REGISTRY.register(HistogramFamily(
+    "rag_stage_duration_seconds",
+    "Thời gian từng stage của RAG: embed, lexical, dense, fuse, rerank, retrieve (tổng), prompt_build",
+    ["stage"]
+))
+RERANK_RESULTS = REGISTRY.register(CounterFamily(
+    "rag_rerank_total", "Số lần rerank theo kết quả (applied / timeout / error / busy)", ["status"]
+))
+RERANK_IN_FLIGHT = REGISTRY.register(CallbackFamily(
+    "rag_rerank_in_flight", "Số lần predict cross-encoder đang chạy (kể cả các lần đã quá timeout)"
+))
+
+# LLM generation
+LLM_TTFT_SECONDS = REGISTRY.register(HistogramFamily(
+    "llm_time_to_first_token_seconds",
+    "Thời gian từ lúc nhận request streaming tới token đầu tiên (gồm retrieval và chờ slot)"
+))
+LLM_GENERATION_SECONDS = REGISTRY.register(HistogramFamily(
+    "llm_generation_duration_seconds", "Tổng thời gian một lần generate của Ollama", ["mode"]
+))
+LLM_TOKENS_PER_SECOND = REGISTRY.register(HistogramFamily(
+    "llm_tokens_per_second",
+    "Tốc độ sinh token (eval_count / eval_duration do Ollama báo)",
+    ["mode"],
+    buckets=THROUGHPUT_BUCKETS
+))
+LLM_ABORTED_GENERATIONS = REGISTRY.register(CounterFamily(
+    "llm_generations_aborted_total",
+    "Số lần stream bị hủy vì client ngắt kết nối, theo giai đoạn: retrieval / queued / prefill / generating",
+    ["stage"]
+))
+LLM_TOKENS_SAVED_UPPER_BOUND = REGISTRY.register(CounterFamily(
+    "llm_tokens_saved_upper_bound_total",
+    "Cận trên số tokens không phải sinh nhờ hủy stream (MAX_TOKENS trừ số tokens đã sinh)"
+))
+
+# Ingestion
+INGEST_STAGE_SECONDS = REGISTRY.register(HistogramFamily(
+    "ingest_stage_duration_seconds",
+    "Thời gian ingestion: extract (mỗi PDF), embed / store (mỗi batch), document (tổng mỗi PDF)",
+    ["stage"]
+))
+
+# Query embedding micro-batcher
+QUERY_BATCH_SIZE = REGISTRY.register(HistogramFamily(
+    "query_embedding_batch_size", "Số queries mỗi lần encode của micro-batcher", buckets=SIZE_BUCKETS
+))
+QUERY_QUEUE_DEPTH = REGISTRY.register(HistogramFamily(
+    "query_embedding_queue_depth", "Số queries đang chờ khi micro-batcher bắt đầu một batch", buckets=SIZE_BUCKETS
+))
+
+# Rate limiting
+RATE_LIMIT_REJECTIONS = REGISTRY.register(CounterFamily(
+    "rate_limit_rejections_total", "Số request bị từ chối bởi rate limiter", ["window"]
+))
+
+# Caches - tính từ stats() của từng cache lúc scrape
+CACHE_HITS = REGISTRY.register(CallbackFamily(
+    "cache_hits_total", "Số lần cache hit", ["cache"], metric_type="counter"
+))
+CACHE_MISSES = REGISTRY.register(CallbackFamily(
+    "cache_misses_total", "Số lần cache miss", ["cache"], metric_type="counter"
+))
+CACHE_HIT_RATIO = REGISTRY.register(CallbackFamily(
+    "cache_hit_ratio", "Tỉ lệ hit của cache từ lúc khởi động", ["cache"]
+))
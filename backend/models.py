@@ -2,7 +2,7 @@
 Data Models - Định nghĩa các Pydantic models cho API
 """
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -18,12 +18,22 @@ class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, description="Câu hỏi từ người dùng")
     conversation_history: Optional[List[ChatMessage]] = Field(
         default=[],
-        description="Lịch sử hội thoại (optional)"
+        description="Lịch sử hội thoại (optional, bị bỏ qua khi có session_id)"
+    )
+    session_id: Optional[str] = Field(
+        default=None,
+        max_length=64,
+        description="Session lưu lịch sử phía server (tạo bằng POST /sessions) - chỉ cần gửi câu hỏi mới"
     )
     use_rag: bool = Field(
         default=True,
         description="Có sử dụng RAG (Retrieval Augmented Generation) không"
     )
+    typed_events: bool = Field(
+        default=False,
+        description="Chỉ cho /chat/stream: gửi SSE có tên event (sources, delta, done, error), "
+                    "nguồn tham khảo là event riêng thay vì markdown trong câu trả lời"
+    )
 
 
 class ChatResponse(BaseModel):
@@ -33,9 +43,30 @@ class ChatResponse(BaseModel):
         default=[],
         description="Các nguồn tài liệu được tham khảo"
     )
+    prompt_tokens: Optional[Dict] = Field(
+        default=None,
+        description="Số token prompt theo phần: system, context, history, query, total, budget"
+    )
+    session_id: Optional[str] = Field(
+        default=None,
+        description="Session đã được ghi thêm lượt hỏi đáp này"
+    )
+    retrieval_timings: Optional[Dict] = Field(
+        default=None,
+        description="Thời gian (ms) từng stage: embed, lexical, dense, fuse, rerank, context, llm"
+    )
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
+class SessionResponse(BaseModel):
+    """Thông tin một chat session"""
+    session_id: str
+    messages: List[ChatMessage] = Field(
+        default=[],
+        description="Lịch sử hội thoại (cũ -> mới)"
+    )
+
+
 class DocumentUploadResponse(BaseModel):
     """Response khi upload tài liệu PDF"""
     filename: str
@@ -44,9 +75,29 @@ class DocumentUploadResponse(BaseModel):
     message: str
 
 
+class IngestionStageProgress(BaseModel):
+    """Tiến độ của một stage ingestion"""
+    status: str = Field(..., description="pending | running | done")
+    done: int = 0
+    total: Optional[int] = None
+
+
+class IngestionJobResponse(BaseModel):
+    """Trạng thái một ingestion job (upload PDF chạy nền)"""
+    job_id: str
+    filename: str
+    status: str = Field(..., description="queued | running | completed | failed")
+    stages: Dict[str, IngestionStageProgress]
+    chunks_created: int = 0
+    error: Optional[str] = None
+    message: str = ""
+    created_at: datetime
+    updated_at: datetime
+
+
 class HealthResponse(BaseModel):
     """Response cho health check endpoint"""
-    status: str
+    status: str = Field(description="healthy | degraded | warming (đang khởi tạo services)")
     ollama_connected: bool
     chroma_initialized: bool
     timestamp: datetime = Field(default_factory=datetime.now)
@@ -57,3 +108,36 @@ class EmbeddingStats(BaseModel):
     total_documents: int
     total_chunks: int
     collection_name: str
+    active_collection: Optional[str] = Field(
+        default=None,
+        description="Collection vật lý đang được alias trỏ tới"
+    )
+    embedding_model: Optional[str] = Field(
+        default=None,
+        description="Embedding model của collection active"
+    )
+    embedding_backend: Optional[str] = Field(
+        default=None,
+        description="Embedding backend của collection active (sentence_transformers | onnx | onnx-int8)"
+    )
+    embedding_cache: Optional[Dict] = Field(
+        default=None,
+        description="Thống kê hit/miss của query embedding cache"
+    )
+    retrieval_cache: Optional[Dict] = Field(
+        default=None,
+        description="Thống kê hit/miss của retrieval result cache"
+    )
+    lexical_index: Optional[Dict] = Field(
+        default=None,
+        description="Thống kê BM25 index dùng cho hybrid search"
+    )
+    reranker: Optional[Dict] = Field(
+        default=None,
+        description="Thống kê cross-encoder rerank (applied / timeout / error)"
+    )
+    query_batcher: Optional[Dict] = Field(
+        default=None,
+        description="Histogram batch size / queue depth của query embedding micro-batcher"
+    )
+    collection_version: int = 0
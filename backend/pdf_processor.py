@@ -1,27 +1,94 @@
 """
 PDF Processor Module - Xử lý và chunk tài liệu PDF y tế
 """
-from PyPDF2 import PdfReader
-from typing import List, Dict, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Callable, List, Dict, Iterator, Optional, Tuple, Union
+import asyncio
 import logging
+import multiprocessing
+import threading
 import io
 import os
 from pathlib import Path
 import re
 import hashlib
+import tempfile
+import time
 
 from config import settings
-from vector_store import VectorStore
+from embedding_backend import configured_backend_name
+from index_manifest import IndexManifest, hash_content
+from metrics import INGEST_STAGE_SECONDS
+from reindex_pipeline import ReindexPipeline
+
+if TYPE_CHECKING:
+    from vector_store import VectorStore
 
 logger = logging.getLogger(__name__)
 
+# Callback báo tiến độ: (stage, done, total) - stage thuộc extract/chunk/embed/store
+ProgressCallback = Callable[[str, int, Optional[int]], None]
+
+
+class ReindexInProgressError(Exception):
+    """Raised khi đang có một lần reindex khác chạy"""
+
+
+def _open_pdf(pdf_content: Union[bytes, str]):
+    """
+    Mở PDF bằng PyPDF2 - import khi dùng để không làm chậm lúc khởi động server
+    
+    Args:
+        pdf_content: Binary content hoặc đường dẫn file PDF
+    """
+    from PyPDF2 import PdfReader
+    if isinstance(pdf_content, str):
+        return PdfReader(pdf_content)
+    return PdfReader(io.BytesIO(pdf_content))
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """
+    Extract text của các trang [start, end) - chạy trong worker process
+    
+    Worker tự đọc file (không nhận bytes của cả PDF qua IPC).
+    
+    Returns:
+        Text của từng trang theo thứ tự
+    """
+    pdf_reader = _open_pdf(pdf_path)
+    return [pdf_reader.pages[page_num].extract_text() for page_num in range(start, end)]
+
+
+def _join_pages(page_texts: List[str]) -> str:
+    """Ghép text các trang, đánh dấu [Page N] và bỏ trang trống"""
+    text_parts = []
+    for page_num, text in enumerate(page_texts):
+        if text.strip():
+            text_parts.append(f"[Page {page_num + 1}]\n{text}")
+    return "\n\n".join(text_parts)
+
+
+def _extract_document(pdf_content: bytes) -> Tuple[str, int, float]:
+    """
+    Extract toàn bộ một PDF - chạy trong worker process khi reindex nhiều file
+    
+    Returns:
+        Tuple of (text, số trang, số giây extract)
+    """
+    start = time.perf_counter()
+    pdf_reader = _open_pdf(pdf_content)
+    page_texts = [page.extract_text() for page in pdf_reader.pages]
+    return _join_pages(page_texts), len(page_texts), time.perf_counter() - start
+
 
 class PDFProcessor:
     """
     Class xử lý PDF documents - đọc, chunk, và embed vào vector store
     """
     
-    def __init__(self, vector_store: VectorStore):
+    def __init__(self, vector_store: "VectorStore"):
         """
         Args:
             vector_store: Instance của VectorStore để lưu embeddings
@@ -29,28 +96,63 @@ class PDFProcessor:
         self.vector_store = vector_store
         self.chunk_size = 1000  # Số ký tự mỗi chunk
         self.chunk_overlap = 200  # Overlap giữa các chunks
+        
+        # Process pool cho extract song song, tạo khi cần
+        self._extract_pool: Optional[ProcessPoolExecutor] = None
+        self._extract_pool_lock = threading.Lock()
+        self._reindex_lock = threading.Lock()
+    
+    @property
+    def extract_workers(self) -> int:
+        """Số process extract PDF (PDF_EXTRACT_WORKERS=0 nghĩa là theo số CPU)"""
+        return settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
     
-    def extract_text_from_pdf(self, pdf_content: bytes) -> str:
+    def _get_extract_pool(self) -> ProcessPoolExecutor:
+        with self._extract_pool_lock:
+            if self._extract_pool is None:
+                # spawn thay vì fork - an toàn với các threads của torch/ChromaDB trong process chính
+                self._extract_pool = ProcessPoolExecutor(
+                    max_workers=self.extract_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._extract_pool
+    
+    def shutdown(self):
+        """Dừng process pool extract"""
+        with self._extract_pool_lock:
+            if self._extract_pool is not None:
+                self._extract_pool.shutdown(wait=False, cancel_futures=True)
+                self._extract_pool = None
+    
+    def extract_text_from_pdf(
+        self,
+        pdf_content: bytes,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> str:
         """
         Trích xuất text từ PDF file
         
         Args:
             pdf_content: Binary content của PDF file
+            progress_callback: Callback báo số trang đã extract
             
         Returns:
             Text đã extract
         """
         try:
-            pdf_file = io.BytesIO(pdf_content)
-            pdf_reader = PdfReader(pdf_file)
+            pdf_reader = _open_pdf(pdf_content)
+            total_pages = len(pdf_reader.pages)
             
-            text_parts = []
-            for page_num, page in enumerate(pdf_reader.pages):
-                text = page.extract_text()
-                if text.strip():
-                    text_parts.append(f"[Page {page_num + 1}]\n{text}")
+            if self.extract_workers > 1 and total_pages >= settings.PDF_PARALLEL_MIN_PAGES:
+                page_texts = self._extract_pages_parallel(pdf_content, total_pages, progress_callback)
+            else:
+                page_texts = []
+                for page_num, page in enumerate(pdf_reader.pages):
+                    page_texts.append(page.extract_text())
+                    if progress_callback:
+                        progress_callback("extract", page_num + 1, total_pages)
             
-            full_text = "\n\n".join(text_parts)
+            full_text = _join_pages(page_texts)
             logger.info(f"Extracted {len(full_text)} characters from PDF")
             
             return full_text
@@ -59,6 +161,82 @@ class PDFProcessor:
             logger.error(f"Lỗi khi extract text từ PDF: {str(e)}")
             raise
     
+    def _extract_pages_parallel(
+        self,
+        pdf_content: bytes,
+        total_pages: int,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> List[str]:
+        """
+        Extract text theo từng khoảng trang trên process pool
+        
+        Mỗi worker nhận một khoảng trang liên tục và tự mở PDF từ file tạm, nên
+        mỗi worker chỉ parse document một lần và không phải copy PDF qua IPC.
+        
+        Args:
+            pdf_content: Binary content của PDF file
+            total_pages: Tổng số trang
+            progress_callback: Callback báo số trang đã extract
+            
+        Returns:
+            Text của từng trang theo đúng thứ tự trang
+        """
+        # Mỗi worker một khoảng trang liên tục
+        range_size = max(1, -(-total_pages // self.extract_workers))
+        ranges = [
+            (start, min(start + range_size, total_pages))
+            for start in range(0, total_pages, range_size)
+        ]
+        
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(pdf_content)
+        try:
+            pool = self._get_extract_pool()
+            futures = {
+                pool.submit(_extract_page_range, tmp.name, start, end): start
+                for start, end in ranges
+            }
+            
+            results: Dict[int, List[str]] = {}
+            pages_done = 0
+            for future in as_completed(futures):
+                start = futures[future]
+                results[start] = future.result()
+                pages_done += len(results[start])
+                if progress_callback:
+                    progress_callback("extract", pages_done, total_pages)
+        finally:
+            os.unlink(tmp.name)
+        
+        logger.info(f"Extracted {total_pages} pages với {len(ranges)} processes")
+        return [text for start, _ in ranges for text in results[start]]
+    
+    def submit_extract(self, pdf_content: bytes) -> Future:
+        """
+        Extract cả file trên process pool (tuần tự ngay trong thread gọi nếu chỉ có 1 worker)
+        
+        Args:
+            pdf_content: Binary content của PDF file
+            
+        Returns:
+            Future của (text, số trang, số giây extract)
+        """
+        if self.extract_workers > 1:
+            try:
+                return self._get_extract_pool().submit(_extract_document, pdf_content)
+            except BrokenProcessPool:
+                # Một worker bị kill (vd: OOM) - tạo lại pool thay vì lỗi mãi
+                logger.warning("Extract process pool bị hỏng, khởi tạo lại")
+                self.shutdown()
+                return self._get_extract_pool().submit(_extract_document, pdf_content)
+        
+        future = Future()
+        try:
+            future.set_result(_extract_document(pdf_content))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
     def clean_text(self, text: str) -> str:
         """
         Làm sạch text - xóa ký tự đặc biệt, normalize whitespace
@@ -91,8 +269,21 @@ class PDFProcessor:
         Returns:
             List of (chunk_text, chunk_metadata)
         """
-        chunks = []
+        chunks = list(self.iter_chunks(text, metadata))
+        logger.info(f"Created {len(chunks)} chunks from document")
+        return chunks
+    
+    def iter_chunks(self, text: str, metadata: Dict) -> Iterator[Tuple[str, Dict]]:
+        """
+        Sinh lần lượt các chunks với overlap (không giữ toàn bộ list trong bộ nhớ)
         
+        Args:
+            text: Text cần chunk
+            metadata: Metadata cơ bản cho document
+            
+        Yields:
+            (chunk_text, chunk_metadata)
+        """
         # Clean text trước
         text = self.clean_text(text)
         
@@ -119,129 +310,263 @@ class PDFProcessor:
                     "start_char": start,
                     "end_char": end
                 }
-                chunks.append((chunk, chunk_metadata))
+                yield chunk, chunk_metadata
                 chunk_id += 1
             
             # Move start với overlap
             start = end - self.chunk_overlap
-        
-        logger.info(f"Created {len(chunks)} chunks from document")
-        return chunks
     
     async def process_pdf(self, content: bytes, filename: str) -> int:
         """
         Xử lý PDF file - extract, chunk, và embed vào vector store
         
+        Chạy trong thread riêng để không block event loop.
+        
         Args:
             content: Binary content của PDF
             filename: Tên file
             
+        Returns:
+            Số chunks đã tạo
+        """
+        return await asyncio.to_thread(self.process_pdf_sync, content, filename)
+    
+    def process_pdf_sync(
+        self,
+        content: bytes,
+        filename: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        content_hash: Optional[str] = None,
+        collection=None
+    ) -> int:
+        """
+        Xử lý PDF file (blocking) - extract, chunk, và embed vào vector store
+        
+        Chunks mới được upsert trước, sau đó mới xóa các chunks cũ thừa của
+        cùng document, nên không có lúc nào document bị thiếu trong index.
+        
+        Args:
+            content: Binary content của PDF
+            filename: Tên file
+            progress_callback: Callback báo tiến độ theo từng stage
+            content_hash: SHA-256 của content (tự tính nếu không có)
+            collection: Shadow collection đang rebuild (mặc định collection active)
+            
         Returns:
             Số chunks đã tạo
         """
         try:
             logger.info(f"Processing PDF: {filename}")
+            started = time.perf_counter()
             
             # Extract text
-            text = self.extract_text_from_pdf(content)
+            text = self.extract_text_from_pdf(content, progress_callback)
+            INGEST_STAGE_SECONDS.labels("extract").observe(time.perf_counter() - started)
             
             if not text.strip():
                 raise ValueError("Không extract được text từ PDF")
             
-            # Tạo metadata cho document
-            doc_id = hashlib.md5(filename.encode()).hexdigest()
-            base_metadata = {
-                "source": filename,
-                "document_id": doc_id,
-                "type": "medical_document"
-            }
-            
-            # Chunk text
-            chunks = self.chunk_text(text, base_metadata)
-            
-            # Chuẩn bị dữ liệu cho vector store
-            texts = [chunk[0] for chunk in chunks]
-            metadatas = [chunk[1] for chunk in chunks]
-            ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
+            doc_id = self.document_id(filename)
+            old_ids = set() if collection is not None else set(
+                self.vector_store.get_document_chunk_ids(doc_id)
+            )
             
-            # Thêm vào vector store
-            count = self.vector_store.add_documents(
-                texts=texts,
-                metadatas=metadatas,
-                ids=ids
+            # Chunk text và thêm vào vector store theo từng batch
+            chunks = self.iter_chunk_records(
+                text, filename, content_hash or hash_content(content), progress_callback
             )
+            count = self.vector_store.add_documents_stream(chunks, progress_callback, collection)
+            logger.info(f"Created {count} chunks from {filename}")
+            
+            if collection is None:
+                self.remove_stale_chunks(doc_id, count, old_ids)
             
+            INGEST_STAGE_SECONDS.labels("document").observe(time.perf_counter() - started)
             return count
             
         except Exception as e:
             logger.error(f"Lỗi khi process PDF {filename}: {str(e)}")
             raise
     
-    async def reindex_all_pdfs(self) -> Dict:
+    @staticmethod
+    def document_id(filename: str) -> str:
+        """ID ổn định của document theo tên file"""
+        return hashlib.md5(filename.encode()).hexdigest()
+    
+    def remove_stale_chunks(self, doc_id: str, count: int, old_ids: Optional[set] = None):
         """
-        Reindex tất cả PDF files trong thư mục data
+        Xóa chunks của phiên bản cũ không còn tồn tại (sau khi đã upsert chunks mới)
         
+        Args:
+            doc_id: ID của document
+            count: Số chunks của phiên bản mới (IDs {doc_id}_0 .. {doc_id}_{count - 1})
+            old_ids: IDs trước khi upsert (mặc định đọc lại từ collection)
+        """
+        if old_ids is None:
+            old_ids = set(self.vector_store.get_document_chunk_ids(doc_id))
+        stale_ids = old_ids - {f"{doc_id}_{i}" for i in range(count)}
+        if stale_ids:
+            self.vector_store.delete_documents(ids=list(stale_ids))
+            logger.info(f"Đã xóa {len(stale_ids)} chunks cũ của document {doc_id}")
+    
+    def iter_chunk_records(
+        self,
+        text: str,
+        filename: str,
+        content_hash: str,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Iterator[Tuple[str, Dict, str]]:
+        """Sinh (text, metadata, id) cho vector store, báo tiến độ stage chunk"""
+        doc_id = self.document_id(filename)
+        base_metadata = {
+            "source": filename,
+            "document_id": doc_id,
+            "content_hash": content_hash,
+            "type": "medical_document"
+        }
+        count = 0
+        for chunk, chunk_metadata in self.iter_chunks(text, base_metadata):
+            count += 1
+            if progress_callback:
+                progress_callback("chunk", count, None)
+            yield chunk, chunk_metadata, f"{doc_id}_{chunk_metadata['chunk_id']}"
+        
+        if progress_callback:
+            progress_callback("chunk", count, count)
+    
+    @property
+    def manifest_path(self) -> Path:
+        """Manifest nằm cạnh dữ liệu ChromaDB"""
+        return Path(settings.CHROMA_PERSIST_DIRECTORY) / f"{settings.CHROMA_COLLECTION_NAME}_manifest.json"
+    
+    async def reindex_all_pdfs(self, full: bool = False) -> Dict:
+        """
+        Reindex PDF files trong thư mục data
+        
+        Mặc định chạy incremental theo manifest content hash: chỉ embed file mới
+        hoặc đã thay đổi, xóa chunks của file đã bị xóa, giữ nguyên file không đổi.
+        Full rebuild ghi vào shadow collection rồi mới swap, nên chat vẫn đọc
+        collection cũ trong suốt quá trình rebuild.
+        
+        Args:
+            full: Index lại toàn bộ vào collection mới
+            
+        Returns:
+            Dictionary với kết quả
+        """
+        return await asyncio.to_thread(self.reindex_all_pdfs_sync, full)
+    
+    def reindex_all_pdfs_sync(self, full: bool = False) -> Dict:
+        """
+        Reindex PDF files trong thư mục data (blocking)
+        
+        Args:
+            full: Index lại toàn bộ vào collection mới
+            
         Returns:
             Dictionary với kết quả
+            
+        Raises:
+            ReindexInProgressError: Nếu đang có lần reindex khác chạy
         """
+        if not self._reindex_lock.acquire(blocking=False):
+            raise ReindexInProgressError("Đang có một lần reindex khác chạy")
         try:
+            return self._reindex(full)
+        finally:
+            self._reindex_lock.release()
+    
+    def _reindex(self, full: bool) -> Dict:
+        shadow = None
+        try:
+            start_time = time.perf_counter()
             data_path = Path(settings.PDF_DATA_PATH)
             
             if not data_path.exists():
                 os.makedirs(data_path, exist_ok=True)
-                return {
-                    "status": "success",
-                    "message": "Data folder created but empty",
-                    "files_processed": 0
-                }
             
             # Tìm tất cả PDF files
-            pdf_files = list(data_path.glob("*.pdf"))
+            pdf_files = sorted(data_path.glob("*.pdf"))
+            manifest = IndexManifest.load(self.manifest_path)
             
-            if not pdf_files:
-                return {
-                    "status": "success",
-                    "message": "No PDF files found",
-                    "files_processed": 0
-                }
+            # Đổi embedding model hoặc backend (kể cả bật / tắt quantize int8) thì
+            # vectors cũ không dùng chung được với vectors mới
+            backend = configured_backend_name()
+            indexed_model = self.vector_store.embedding_model_name
+            indexed_backend = self.vector_store.embedding_model.backend_name
+            if manifest.files and manifest.embedding_model != settings.EMBEDDING_MODEL:
+                indexed_model = manifest.embedding_model
+            if manifest.files and manifest.embedding_backend != backend:
+                indexed_backend = manifest.embedding_backend
+            if indexed_model != settings.EMBEDDING_MODEL or indexed_backend != backend:
+                logger.info(
+                    f"Embedding model / backend đổi ({indexed_model} / {indexed_backend} -> "
+                    f"{settings.EMBEDDING_MODEL} / {backend}), rebuild toàn bộ"
+                )
+                full = True
             
-            logger.info(f"Found {len(pdf_files)} PDF files to process")
+            if full:
+                # Build vào shadow collection, collection active vẫn phục vụ query
+                shadow = self.vector_store.create_shadow_collection()
+                manifest.reset(settings.EMBEDDING_MODEL, backend)
+            manifest.embedding_model = settings.EMBEDDING_MODEL
+            manifest.embedding_backend = backend
             
-            # Reset collection
-            self.vector_store.delete_collection()
+            logger.info(f"Found {len(pdf_files)} PDF files ({'full' if full else 'incremental'} reindex)")
             
-            # Process từng file
             total_chunks = 0
             processed_files = []
+            summary = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+            
+            # Xóa chunks của các file không còn trong thư mục data
+            current_names = {pdf_path.name for pdf_path in pdf_files}
+            for filename in [name for name in manifest.files if name not in current_names]:
+                entry = manifest.remove(filename)
+                self.vector_store.delete_documents(where={"document_id": entry["document_id"]})
+                summary["removed"] += 1
+                processed_files.append({"filename": filename, "status": "removed"})
+                logger.info(f"Đã xóa chunks của file không còn tồn tại: {filename}")
+            
+            # Extract / embed / ghi các file mới hoặc đã thay đổi qua pipeline
+            result = ReindexPipeline(self, manifest, shadow).run(pdf_files)
+            for file_result in result["files"]:
+                summary[file_result["status"]] += 1
+                total_chunks += file_result.get("chunks", 0)
+            processed_files.extend(result["files"])
             
-            for pdf_path in pdf_files:
-                try:
-                    with open(pdf_path, 'rb') as f:
-                        content = f.read()
-                    
-                    chunks = await self.process_pdf(content, pdf_path.name)
-                    total_chunks += chunks
-                    processed_files.append({
-                        "filename": pdf_path.name,
-                        "chunks": chunks
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"Lỗi khi process {pdf_path.name}: {str(e)}")
-                    processed_files.append({
-                        "filename": pdf_path.name,
-                        "error": str(e)
-                    })
+            if shadow is not None:
+                if summary["failed"]:
+                    # Không swap sang index thiếu file - giữ nguyên collection đang phục vụ
+                    self.vector_store.discard_shadow_collection(shadow)
+                    return {
+                        "status": "error",
+                        "mode": "full",
+                        "message": f"Rebuild thất bại ({summary['failed']} files lỗi), giữ nguyên collection hiện tại",
+                        "total_chunks": 0,
+                        "summary": summary,
+                        "files": processed_files,
+                        "pipeline": result["pipeline"],
+                        "seconds": round(time.perf_counter() - start_time, 2)
+                    }
+                self.vector_store.swap_collection(shadow)
+                shadow = None
+            manifest.save()
             
             return {
                 "status": "success",
+                "mode": "full" if full else "incremental",
                 "message": f"Processed {len(processed_files)} files",
                 "total_chunks": total_chunks,
-                "files": processed_files
+                "summary": summary,
+                "files": processed_files,
+                "pipeline": result["pipeline"],
+                "seconds": round(time.perf_counter() - start_time, 2)
             }
             
         except Exception as e:
             logger.error(f"Lỗi khi reindex: {str(e)}")
+            if shadow is not None:
+                self.vector_store.discard_shadow_collection(shadow)
             raise
     
     def extract_medical_entities(self, text: str) -> List[str]:
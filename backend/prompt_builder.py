@@ -0,0 +1,238 @@
+"""
+Prompt Builder Module - Đếm token và phân bổ token budget cho system prompt, context và lịch sử
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import threading
+
+from config import settings
+from models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# Token phụ của chat template cho mỗi message (role, ký tự phân cách)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Không thêm tài liệu bị cắt nếu chỉ còn ít hơn số token này
+MIN_TRUNCATED_DOC_TOKENS = 64
+
+
+class TokenCounter:
+    """
+    Đếm token bằng tiktoken, fallback ước lượng theo bytes nếu không load được encoding
+    
+    tiktoken tải file BPE khi dùng lần đầu - máy offline chưa có cache sẽ dùng
+    ước lượng ~4 bytes UTF-8 / token (tiếng Việt có dấu nên tính theo bytes thay vì ký tự).
+    """
+    
+    def __init__(self, encoding_name: str):
+        """
+        Args:
+            encoding_name: Tên tiktoken encoding (vd: cl100k_base)
+        """
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+    
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        logger.warning(
+                            f"Không load được tiktoken encoding {self.encoding_name}, "
+                            f"dùng ước lượng theo bytes: {str(e)}"
+                        )
+                    self._loaded = True
+        return self._encoding
+    
+    @property
+    def exact(self) -> bool:
+        """True nếu đang đếm bằng tiktoken"""
+        return self._get_encoding() is not None
+    
+    def count(self, text: str) -> int:
+        """Số token của text"""
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text.encode("utf-8")) / 4)
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cắt text còn tối đa max_tokens token"""
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return encoding.decode(tokens[:max_tokens])
+        
+        truncated = text.encode("utf-8")[:max_tokens * 4]
+        return truncated.decode("utf-8", errors="ignore")
+
+
+class PromptBudget:
+    """
+    Phân bổ token budget của context window
+    
+    num_ctx = output (MAX_TOKENS) + system prompt + câu hỏi + context tài liệu + lịch sử.
+    Context tài liệu được ưu tiên trước (tối đa PROMPT_CONTEXT_MAX_TOKENS), lịch sử
+    dùng phần còn lại (tối đa PROMPT_HISTORY_MAX_TOKENS) và bỏ các lượt cũ nhất trước.
+    
+    Layout stable_prefix: [system cố định] + [lịch sử] + [câu hỏi + context]. Lịch sử chỉ
+    bị cắt theo từng khối PROMPT_HISTORY_TRIM_BLOCK messages, nên phần đầu prompt giữ
+    nguyên qua nhiều lượt liên tiếp và Ollama dùng lại được KV cache của nó.
+    """
+    
+    def __init__(self, counter: TokenCounter, system_prompt: str):
+        """
+        Args:
+            counter: TokenCounter dùng để đếm token
+            system_prompt: System prompt gửi kèm mọi request
+        """
+        self.counter = counter
+        self.system_prompt = system_prompt
+        self.system_tokens = counter.count(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+    
+    @property
+    def prompt_budget(self) -> int:
+        """Số token tối đa cho toàn bộ prompt (đã trừ phần dành cho output)"""
+        return max(0, settings.CONTEXT_WINDOW_TOKENS - settings.MAX_TOKENS)
+    
+    def context_budget(self, prompt_without_context: str) -> int:
+        """
+        Số token còn lại cho tài liệu retrieve
+        
+        Args:
+            prompt_without_context: User message (khung prompt RAG + câu hỏi) chưa chèn tài liệu
+        """
+        available = (
+            self.prompt_budget
+            - self.system_tokens
+            - self.counter.count(prompt_without_context)
+            - MESSAGE_OVERHEAD_TOKENS
+        )
+        return max(0, min(settings.PROMPT_CONTEXT_MAX_TOKENS, available))
+    
+    def fit_documents(
+        self,
+        documents: List[str],
+        budget: int
+    ) -> Tuple[List[Optional[str]], int]:
+        """
+        Giữ các tài liệu theo thứ tự liên quan cho tới khi hết budget
+        
+        Tài liệu không vừa được cắt bớt nếu phần còn lại đủ lớn, ngược lại bị bỏ.
+        
+        Args:
+            documents: Các đoạn context đã format, xếp theo độ liên quan giảm dần
+            budget: Số token tối đa
+        
+        Returns:
+            Tuple of (documents theo đúng thứ tự - None nếu bị bỏ, số token đã dùng)
+        """
+        fitted: List[Optional[str]] = []
+        used = 0
+        for doc in documents:
+            tokens = self.counter.count(doc)
+            remaining = budget - used
+            if tokens <= remaining:
+                fitted.append(doc)
+                used += tokens
+            elif remaining >= MIN_TRUNCATED_DOC_TOKENS:
+                truncated = self.counter.truncate(doc, remaining)
+                fitted.append(truncated)
+                used += self.counter.count(truncated)
+            else:
+                fitted.append(None)
+        return fitted, used
+    
+    def fit_history(
+        self,
+        history: Optional[List[ChatMessage]],
+        user_tokens: int
+    ) -> Tuple[List[dict], int, int]:
+        """
+        Giữ các lượt hội thoại gần nhất vừa với budget còn lại
+        
+        Args:
+            history: Lịch sử hội thoại (cũ -> mới)
+            user_tokens: Token của user message hiện tại (câu hỏi + context)
+        
+        Returns:
+            Tuple of (messages giữ lại, số token đã dùng, số messages bị bỏ)
+        """
+        if not history:
+            return [], 0, 0
+        
+        budget = min(
+            settings.PROMPT_HISTORY_MAX_TOKENS,
+            self.prompt_budget - self.system_tokens - user_tokens
+        )
+        
+        # suffix[i] = số token của history[i:]
+        suffix = [0] * (len(history) + 1)
+        for i in range(len(history) - 1, -1, -1):
+            suffix[i] = suffix[i + 1] + self.counter.count(history[i].content) + MESSAGE_OVERHEAD_TOKENS
+        
+        # Bỏ các lượt cũ nhất: sliding cắt từng message, stable_prefix cắt theo khối
+        # để điểm bắt đầu lịch sử không dịch chuyển ở mỗi lượt
+        step = 1
+        if settings.PROMPT_LAYOUT == "stable_prefix":
+            step = max(1, settings.PROMPT_HISTORY_TRIM_BLOCK)
+        start = 0
+        while start < len(history) and suffix[start] > budget:
+            start += step
+        if start >= len(history):
+            # Khối cuối cùng vẫn quá budget - giữ được lượt nào hay lượt đó
+            start = next((i for i in range(len(history)) if suffix[i] <= budget), len(history))
+        
+        # Không mở đầu lịch sử bằng câu trả lời của assistant bị mất câu hỏi
+        while start < len(history) and history[start].role == "assistant":
+            start += 1
+        
+        kept = [{"role": msg.role, "content": msg.content} for msg in history[start:]]
+        return kept, suffix[start], start
+    
+    def build_messages(
+        self,
+        user_content: str,
+        history: Optional[List[ChatMessage]] = None,
+        context_tokens: int = 0
+    ) -> Tuple[List[dict], Dict]:
+        """
+        Build messages cho Ollama trong giới hạn budget
+        
+        Args:
+            user_content: User message hiện tại (câu hỏi, đã kèm context nếu dùng RAG)
+            history: Lịch sử hội thoại
+            context_tokens: Token của phần tài liệu nằm trong user_content
+        
+        Returns:
+            Tuple of (messages, token usage)
+        """
+        user_tokens = self.counter.count(user_content) + MESSAGE_OVERHEAD_TOKENS
+        history_messages, history_tokens, dropped = self.fit_history(history, user_tokens)
+        
+        messages = [{"role": "system", "content": self.system_prompt}]
+        messages.extend(history_messages)
+        messages.append({"role": "user", "content": user_content})
+        
+        usage = {
+            "system": self.system_tokens,
+            "context": context_tokens,
+            "history": history_tokens,
+            "query": user_tokens - context_tokens,
+            "total": self.system_tokens + history_tokens + user_tokens,
+            "budget": self.prompt_budget,
+            "history_messages_dropped": dropped,
+            "exact": self.counter.exact
+        }
+        return messages, usage
@@ -0,0 +1,388 @@
+"""
+Rate Limit Store Module - Nơi lưu counters của sliding window rate limiter
+
+- MemoryRateLimitStore: trong process (mặc định), sharded locks
+- SQLiteRateLimitStore: file SQLite dùng chung giữa các uvicorn workers trên cùng máy
+- RedisRateLimitStore: server Redis (hoặc tương thích giao thức Redis) dùng chung giữa nhiều máy
+
+Mỗi cửa sổ (phút / giờ) chỉ giữ số request của fixed window hiện tại và window liền trước.
+Số request trong cửa sổ trượt được ước lượng bằng previous * (phần window trước còn nằm
+trong cửa sổ) + current, nên mỗi request chỉ tốn O(1) ở mọi store.
+"""
+from typing import Dict, Sequence, Tuple
+import math
+import sqlite3
+import threading
+
+# (tên cửa sổ, độ dài giây, giới hạn)
+Window = Tuple[str, int, int]
+
+
+class RateLimitDecision:
+    """Kết quả kiểm tra rate limit của một request (theo cửa sổ còn ít quota nhất)"""
+    
+    __slots__ = ("allowed", "window", "limit", "remaining", "reset", "retry_after")
+    
+    def __init__(self, allowed: bool, window: str, limit: int, remaining: int, reset: int, retry_after: int = 0):
+        """
+        Args:
+            allowed: Request được phép hay không
+            window: Tên cửa sổ (minute / hour) quyết định kết quả
+            limit: Giới hạn của cửa sổ đó
+            remaining: Số request còn lại trong cửa sổ
+            reset: Unix timestamp kết thúc fixed window hiện tại
+            retry_after: Số giây nên chờ trước khi thử lại (khi bị từ chối)
+        """
+        self.allowed = allowed
+        self.window = window
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+    
+    def headers(self) -> Dict[str, str]:
+        """Các headers X-RateLimit-* (kèm Retry-After khi bị từ chối)"""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset)
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+def _retry_after(previous: int, current: int, elapsed: float, seconds: int, limit: int) -> int:
+    """Số giây tới khi ước lượng sliding window giảm đủ để nhận thêm một request"""
+    allowance = limit - 1 - current
+    if allowance >= 0 and previous > 0:
+        # Chờ phần window trước trôi ra khỏi cửa sổ trong window hiện tại
+        wait = seconds * (1 - allowance / previous) - elapsed
+    else:
+        # Window hiện tại đã đầy: chờ sang window sau, tới khi current cũ trôi ra đủ
+        wait = (seconds - elapsed) + seconds * max(0.0, 1 - (limit - 1) / max(current, 1))
+    return max(1, math.ceil(wait))
+
+
+def evaluate(windows: Sequence[Window], now: float, counts: Sequence[Tuple[int, int]]) -> RateLimitDecision:
+    """
+    Quyết định cho một request từ counters (chưa tính request này) của từng cửa sổ
+    
+    Args:
+        windows: Các cửa sổ (tên, giây, giới hạn)
+        now: Unix timestamp
+        counts: (previous, current) của từng cửa sổ, cùng thứ tự với windows
+    
+    Returns:
+        RateLimitDecision - cửa sổ đầu tiên bị vượt, hoặc cửa sổ còn ít quota nhất
+    """
+    tightest = None
+    for (name, seconds, limit), (previous, current) in zip(windows, counts):
+        index = int(now // seconds)
+        elapsed = now - index * seconds
+        estimate = previous * (1 - elapsed / seconds) + current
+        reset = (index + 1) * seconds
+        if estimate + 1 > limit:
+            return RateLimitDecision(
+                allowed=False,
+                window=name,
+                limit=limit,
+                remaining=0,
+                reset=reset,
+                retry_after=_retry_after(previous, current, elapsed, seconds, limit)
+            )
+        remaining = max(0, math.floor(limit - estimate - 1))
+        if tightest is None or remaining < tightest.remaining:
+            tightest = RateLimitDecision(True, name, limit, remaining, reset)
+    return tightest
+
+
+class RateLimitStore:
+    """
+    Interface chung: hit() đọc counters, quyết định và tăng counters (nếu được phép)
+    trong một thao tác nguyên tử đối với các request khác của cùng client
+    """
+    
+    backend_name = "base"
+    # hit() có chờ I/O (file lock, network) không - RateLimiter chạy store blocking trong thread riêng
+    blocking = True
+    
+    def hit(self, client_id: str, windows: Sequence[Window], now: float) -> RateLimitDecision:
+        """
+        Kiểm tra và ghi nhận một request (request bị từ chối không được tính)
+        
+        Args:
+            client_id: Unique identifier for client
+            windows: Các cửa sổ (tên, giây, giới hạn)
+            now: Unix timestamp
+        
+        Returns:
+            RateLimitDecision
+        """
+        raise NotImplementedError
+    
+    def stats(self) -> Dict:
+        return {"backend": self.backend_name}
+
+
+class _ClientState:
+    """Counters của một client: với mỗi cửa sổ giữ index fixed window, số request window trước / hiện tại"""
+    
+    __slots__ = ("index", "previous", "current", "last_seen")
+    
+    def __init__(self, windows: int):
+        self.index = [0] * windows
+        self.previous = [0] * windows
+        self.current = [0] * windows
+        self.last_seen = 0.0
+
+
+class _Shard:
+    __slots__ = ("lock", "clients", "next_eviction")
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients: Dict[str, _ClientState] = {}
+        self.next_eviction = 0.0
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    Counters trong process, clients chia vào các shards (mỗi shard một lock)
+    
+    Clients không có request nào trong 2 cửa sổ dài nhất bị xóa định kỳ (mỗi shard tự
+    dọn khi được truy cập sau evict_interval giây).
+    """
+    
+    backend_name = "memory"
+    blocking = False
+    
+    def __init__(self, shards: int = 64, evict_interval: float = 60.0, idle_ttl: float = 7200.0):
+        """
+        Args:
+            shards: Số shards (mỗi shard một lock)
+            evict_interval: Chu kỳ (giây) dọn clients không hoạt động trong mỗi shard
+            idle_ttl: Clients không hoạt động lâu hơn (giây) thì bị xóa
+        """
+        self.evict_interval = evict_interval
+        self.idle_ttl = idle_ttl
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self.evicted = 0
+    
+    def _evict(self, shard: _Shard, now: float):
+        cutoff = now - self.idle_ttl
+        idle = [client_id for client_id, state in shard.clients.items() if state.last_seen < cutoff]
+        for client_id in idle:
+            del shard.clients[client_id]
+        self.evicted += len(idle)
+        shard.next_eviction = now + self.evict_interval
+    
+    def hit(self, client_id: str, windows: Sequence[Window], now: float) -> RateLimitDecision:
+        shard = self._shards[hash(client_id) % len(self._shards)]
+        
+        with shard.lock:
+            if now >= shard.next_eviction:
+                self._evict(shard, now)
+            
+            state = shard.clients.get(client_id)
+            if state is None:
+                state = shard.clients[client_id] = _ClientState(len(windows))
+            
+            for i, (_, seconds, _) in enumerate(windows):
+                index = int(now // seconds)
+                if index != state.index[i]:
+                    # Sang fixed window mới: window hiện tại thành window trước (nếu liền kề)
+                    state.previous[i] = state.current[i] if index == state.index[i] + 1 else 0
+                    state.current[i] = 0
+                    state.index[i] = index
+            
+            state.last_seen = now
+            decision = evaluate(windows, now, list(zip(state.previous, state.current)))
+            if decision.allowed:
+                for i in range(len(windows)):
+                    state.current[i] += 1
+            return decision
+    
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend_name,
+            "clients": sum(len(shard.clients) for shard in self._shards),
+            "shards": len(self._shards),
+            "evicted": self.evicted
+        }
+
+
+class SQLiteRateLimitStore(RateLimitStore):
+    """
+    Counters trong file SQLite, dùng chung giữa các processes trên cùng máy (uvicorn --workers N)
+    
+    Mỗi request là một transaction BEGIN IMMEDIATE (SQLite giữ write lock trên file),
+    WAL + synchronous=OFF nên không fsync - counters mất khi máy tắt cũng không sao.
+    """
+    
+    backend_name = "sqlite"
+    
+    def __init__(self, path: str, evict_interval: float = 60.0, busy_timeout_ms: int = 1000):
+        """
+        Args:
+            path: File SQLite (dùng chung giữa các workers)
+            evict_interval: Chu kỳ (giây) xóa counters của các fixed windows đã qua
+            busy_timeout_ms: Thời gian chờ write lock của process khác
+        """
+        self.path = path
+        self.evict_interval = evict_interval
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._next_eviction = 0.0
+        # Tạo bảng ngay để lỗi cấu hình lộ ra lúc khởi động
+        self._connection()
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Một connection mỗi thread (autocommit, transaction tự quản lý)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS rate_limits (
+                    client_id TEXT NOT NULL,
+                    window_seconds INTEGER NOT NULL,
+                    window_index INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (client_id, window_seconds, window_index)
+                ) WITHOUT ROWID"""
+            )
+            self._local.conn = conn
+        return conn
+    
+    def _evict(self, conn: sqlite3.Connection, windows: Sequence[Window], now: float):
+        """Xóa counters cũ hơn window trước của mỗi cửa sổ"""
+        for _, seconds, _ in windows:
+            conn.execute(
+                "DELETE FROM rate_limits WHERE window_seconds = ? AND window_index < ?",
+                (seconds, int(now // seconds) - 1)
+            )
+        self._next_eviction = now + self.evict_interval
+    
+    def hit(self, client_id: str, windows: Sequence[Window], now: float) -> RateLimitDecision:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if now >= self._next_eviction:
+                self._evict(conn, windows, now)
+            
+            counts = []
+            for _, seconds, _ in windows:
+                index = int(now // seconds)
+                rows = dict(conn.execute(
+                    "SELECT window_index, count FROM rate_limits "
+                    "WHERE client_id = ? AND window_seconds = ? AND window_index IN (?, ?)",
+                    (client_id, seconds, index - 1, index)
+                ).fetchall())
+                counts.append((rows.get(index - 1, 0), rows.get(index, 0)))
+            
+            decision = evaluate(windows, now, counts)
+            if decision.allowed:
+                conn.executemany(
+                    "INSERT INTO rate_limits (client_id, window_seconds, window_index, count) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (client_id, window_seconds, window_index) DO UPDATE SET count = count + 1",
+                    [(client_id, seconds, int(now // seconds)) for _, seconds, _ in windows]
+                )
+            conn.execute("COMMIT")
+            return decision
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def stats(self) -> Dict:
+        row = self._connection().execute("SELECT COUNT(DISTINCT client_id) FROM rate_limits").fetchone()
+        return {"backend": self.backend_name, "path": self.path, "clients": row[0]}
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """
+    Counters trên Redis (hoặc server tương thích giao thức Redis), dùng chung giữa nhiều máy
+    
+    Mỗi request một round trip: INCR counter window hiện tại (optimistic) + GET window
+    trước trong một pipeline; nếu vượt limit thì DECR lại. Hai request đồng thời sát
+    limit có thể cùng bị từ chối nhưng không bao giờ cùng lọt qua quá giới hạn.
+    """
+    
+    backend_name = "redis"
+    
+    def __init__(self, url: str, prefix: str = "ratelimit", socket_timeout: float = 0.05, client=None):
+        """
+        Args:
+            url: Redis URL, vd redis://localhost:6379/0
+            prefix: Prefix của các keys
+            socket_timeout: Timeout (giây) mỗi lệnh - request không phải chờ Redis quá lâu
+            client: Redis client có sẵn (vd: fakeredis trong benchmark), None = kết nối theo url
+        """
+        self.url = url
+        self.prefix = prefix
+        if client is None:
+            import redis
+            
+            client = redis.Redis.from_url(url, socket_timeout=socket_timeout, socket_connect_timeout=socket_timeout)
+        self.client = client
+    
+    def _key(self, client_id: str, seconds: int, index: int) -> str:
+        return f"{self.prefix}:{client_id}:{seconds}:{index}"
+    
+    def hit(self, client_id: str, windows: Sequence[Window], now: float) -> RateLimitDecision:
+        current_keys = []
+        pipe = self.client.pipeline(transaction=False)
+        for _, seconds, _ in windows:
+            index = int(now // seconds)
+            current_keys.append(self._key(client_id, seconds, index))
+            pipe.incr(current_keys[-1])
+            # Counter còn được đọc như window trước trong fixed window kế tiếp
+            pipe.expire(current_keys[-1], 2 * seconds + 1)
+            pipe.get(self._key(client_id, seconds, index - 1))
+        replies = pipe.execute()
+        
+        # Counters chưa tính request này
+        counts = [
+            (int(replies[i + 2] or 0), int(replies[i]) - 1)
+            for i in range(0, len(replies), 3)
+        ]
+        decision = evaluate(windows, now, counts)
+        if not decision.allowed:
+            pipe = self.client.pipeline(transaction=False)
+            for key in current_keys:
+                pipe.decr(key)
+            pipe.execute()
+        return decision
+    
+    def stats(self) -> Dict:
+        return {"backend": self.backend_name, "url": self.url}
+
+
+def create_rate_limit_store(
+    backend: str,
+    shards: int = 64,
+    db_path: str = "./rate_limits.sqlite",
+    redis_url: str = "redis://localhost:6379/0",
+    idle_ttl: float = 7200.0
+) -> RateLimitStore:
+    """
+    Tạo rate limit store theo cấu hình
+    
+    Args:
+        backend: memory | sqlite | redis
+        shards: Số shards của store in-memory
+        db_path: File SQLite cho backend sqlite
+        redis_url: URL cho backend redis
+        idle_ttl: Thời gian (giây) giữ counters của client không hoạt động (store in-memory)
+    
+    Returns:
+        RateLimitStore
+    """
+    if backend == "memory":
+        return MemoryRateLimitStore(shards=shards, idle_ttl=idle_ttl)
+    if backend == "sqlite":
+        return SQLiteRateLimitStore(db_path)
+    if backend == "redis":
+        return RedisRateLimitStore(redis_url)
+    raise ValueError(f"RATE_LIMIT_BACKEND không hợp lệ: {backend}")
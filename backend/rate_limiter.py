@@ -1,110 +1,176 @@
 """
 Rate Limiting Module - Giới hạn số request
+
+Sliding window counter (phút + giờ), O(1) mỗi request. Counters nằm trong một
+RateLimitStore: in-memory (mặc định), SQLite (dùng chung giữa các uvicorn workers
+trên cùng máy) hoặc Redis (dùng chung giữa nhiều máy) - xem rate_limit_store.py.
 """
 from fastapi import HTTPException, Request, status
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, Tuple
+from typing import Dict, List, Optional
 import asyncio
+import logging
+import time
+
+from auth import api_key_registry
+from config import settings
+from metrics import RATE_LIMIT_REJECTIONS
+from rate_limit_store import (
+    MemoryRateLimitStore,
+    RateLimitDecision,
+    RateLimitStore,
+    Window,
+    create_rate_limit_store
+)
+
+logger = logging.getLogger(__name__)
 
 
 class RateLimiter:
-    """Simple in-memory rate limiter"""
+    """Sliding window rate limiter (phút + giờ) trên một RateLimitStore"""
     
-    def __init__(self, requests_per_minute: int = 60, requests_per_hour: int = 1000):
+    def __init__(
+        self,
+        requests_per_minute: int = 60,
+        requests_per_hour: int = 1000,
+        store: Optional[RateLimitStore] = None
+    ):
+        """
+        Args:
+            requests_per_minute: Giới hạn mỗi phút
+            requests_per_hour: Giới hạn mỗi giờ
+            store: Nơi lưu counters (mặc định in-memory, chỉ trong process này)
+        """
         self.requests_per_minute = requests_per_minute
         self.requests_per_hour = requests_per_hour
+        self.windows: List[Window] = [
+            ("minute", 60, requests_per_minute),
+            ("hour", 3600, requests_per_hour)
+        ]
+        self.store = store if store is not None else MemoryRateLimitStore()
+        self.store_errors = 0
         
-        # Store: {client_id: [(timestamp, count), ...]}
-        self.request_history: Dict[str, list] = defaultdict(list)
-        self.lock = asyncio.Lock()
+        # Series Prometheus cho số request bị từ chối theo từng cửa sổ
+        self._rejections = {name: RATE_LIMIT_REJECTIONS.labels(name) for name, _, _ in self.windows}
     
-    def _clean_old_requests(self, client_id: str, now: datetime):
-        """Remove requests older than 1 hour"""
-        cutoff = now - timedelta(hours=1)
-        self.request_history[client_id] = [
-            (ts, count) for ts, count in self.request_history[client_id]
-            if ts > cutoff
+    def windows_for(self, per_minute: Optional[int] = None, per_hour: Optional[int] = None) -> List[Window]:
+        """
+        Cửa sổ với giới hạn riêng (vd: theo tier của API key), None = giới hạn mặc định
+        
+        Args:
+            per_minute: Giới hạn mỗi phút
+            per_hour: Giới hạn mỗi giờ
+        
+        Returns:
+            List các cửa sổ (tên, giây, giới hạn)
+        """
+        if per_minute is None and per_hour is None:
+            return self.windows
+        return [
+            ("minute", 60, per_minute if per_minute is not None else self.requests_per_minute),
+            ("hour", 3600, per_hour if per_hour is not None else self.requests_per_hour)
         ]
     
-    def _count_requests(self, client_id: str, now: datetime) -> Tuple[int, int]:
-        """Count requests in last minute and hour"""
-        one_minute_ago = now - timedelta(minutes=1)
-        one_hour_ago = now - timedelta(hours=1)
+    def hit(
+        self,
+        client_id: str,
+        now: Optional[float] = None,
+        windows: Optional[List[Window]] = None
+    ) -> RateLimitDecision:
+        """
+        Kiểm tra và ghi nhận một request của client (request bị từ chối không được tính)
         
-        minute_count = sum(
-            count for ts, count in self.request_history[client_id]
-            if ts > one_minute_ago
-        )
-        hour_count = sum(
-            count for ts, count in self.request_history[client_id]
-            if ts > one_hour_ago
-        )
+        Store lỗi (vd: Redis không kết nối được) thì cho request đi qua thay vì chặn toàn bộ API.
+        
+        Args:
+            client_id: Unique identifier for client (IP, API key, etc.)
+            now: Unix timestamp (mặc định time.time())
+            windows: Cửa sổ riêng cho client này (mặc định self.windows)
         
-        return minute_count, hour_count
+        Returns:
+            RateLimitDecision
+        """
+        if now is None:
+            now = time.time()
+        if windows is None:
+            windows = self.windows
+        try:
+            decision = self.store.hit(client_id, windows, now)
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning(f"⚠️ Rate limit store ({self.store.backend_name}) lỗi, bỏ qua kiểm tra: {str(e)}")
+            name, seconds, limit = windows[0]
+            return RateLimitDecision(True, name, limit, limit, (int(now // seconds) + 1) * seconds)
+        
+        if not decision.allowed:
+            self._rejections[decision.window].inc()
+        return decision
     
-    async def check_rate_limit(self, client_id: str):
+    async def check_rate_limit(self, client_id: str, windows: Optional[List[Window]] = None) -> RateLimitDecision:
         """
         Check if client has exceeded rate limit
         
+        Store in-memory được gọi trực tiếp; SQLite / Redis chạy trong thread riêng để
+        chờ file lock hoặc network không chặn event loop.
+        
         Args:
             client_id: Unique identifier for client (IP, API key, etc.)
-            
+            windows: Cửa sổ riêng cho client này (mặc định self.windows)
+        
+        Returns:
+            RateLimitDecision của request được phép (dùng cho headers X-RateLimit-*)
+        
         Raises:
             HTTPException: If rate limit exceeded
         """
-        async with self.lock:
-            now = datetime.now()
-            
-            # Clean old requests
-            self._clean_old_requests(client_id, now)
-            
-            # Count current requests
-            minute_count, hour_count = self._count_requests(client_id, now)
-            
-            # Check limits
-            if minute_count >= self.requests_per_minute:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Rate limit exceeded: {self.requests_per_minute} requests per minute",
-                    headers={
-                        "Retry-After": "60",
-                        "X-RateLimit-Limit": str(self.requests_per_minute),
-                        "X-RateLimit-Remaining": "0",
-                        "X-RateLimit-Reset": str(int((now + timedelta(minutes=1)).timestamp()))
-                    }
-                )
-            
-            if hour_count >= self.requests_per_hour:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Rate limit exceeded: {self.requests_per_hour} requests per hour",
-                    headers={
-                        "Retry-After": "3600",
-                        "X-RateLimit-Limit": str(self.requests_per_hour),
-                        "X-RateLimit-Remaining": "0",
-                        "X-RateLimit-Reset": str(int((now + timedelta(hours=1)).timestamp()))
-                    }
-                )
-            
-            # Add current request
-            self.request_history[client_id].append((now, 1))
+        if self.store.blocking:
+            decision = await asyncio.to_thread(self.hit, client_id, None, windows)
+        else:
+            decision = self.hit(client_id, windows=windows)
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {decision.limit} requests per {decision.window}",
+                headers=decision.headers()
+            )
+        return decision
+    
+    def stats(self) -> Dict:
+        """Thống kê của store"""
+        return {**self.store.stats(), "store_errors": self.store_errors}
 
 
 # Global rate limiter instance
-rate_limiter = RateLimiter()
+rate_limiter = RateLimiter(
+    requests_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+    requests_per_hour=settings.RATE_LIMIT_PER_HOUR,
+    store=create_rate_limit_store(
+        settings.RATE_LIMIT_BACKEND,
+        shards=settings.RATE_LIMIT_SHARDS,
+        db_path=settings.RATE_LIMIT_DB_PATH,
+        redis_url=settings.RATE_LIMIT_REDIS_URL
+    )
+)
 
 
-async def check_rate_limit(request: Request):
+async def check_rate_limit(request: Request) -> RateLimitDecision:
     """
     Dependency for rate limiting
+    
+    API key hợp lệ được tính riêng theo key (giới hạn theo tier của key); request
+    không có key hoặc key không hợp lệ được tính theo IP, nên gửi key ngẫu nhiên
+    không né được giới hạn.
     """
-    # Sử dụng IP hoặc API key làm client identifier
-    client_id = request.client.host if request.client else "unknown"
+    # verify_api_key đã tra registry thì dùng lại kết quả
+    info = getattr(request.state, "api_key_info", None)
+    if info is None:
+        info = api_key_registry.lookup(request.headers.get("X-API-Key"))
     
-    # Nếu có API key, dùng API key làm identifier
-    api_key = request.headers.get("X-API-Key")
-    if api_key:
-        client_id = f"key_{api_key[:8]}"
+    if info is not None:
+        return await rate_limiter.check_rate_limit(
+            f"key_{info.key_id}",
+            rate_limiter.windows_for(info.per_minute, info.per_hour)
+        )
     
-    await rate_limiter.check_rate_limit(client_id)
+    # Sử dụng IP làm client identifier
+    client_id = request.client.host if request.client else "unknown"
+    return await rate_limiter.check_rate_limit(client_id)
@@ -0,0 +1,298 @@
+"""
+Reindex Pipeline - Reindex nhiều PDF theo các stage chạy chồng lên nhau
+
+    đọc + hash ──▶ extract (process pool) ──▶ chunk + embed (1 model) ──▶ ghi ChromaDB
+
+Các stage nối với nhau bằng bounded queues: extract file N+1 chạy song song với
+embed file N, và bộ nhớ chỉ giữ vài file / batch đang xử lý.
+"""
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+import logging
+import queue
+import threading
+import time
+
+from config import settings
+from index_manifest import IndexManifest, hash_content
+from metrics import INGEST_STAGE_SECONDS
+
+if TYPE_CHECKING:
+    from pdf_processor import PDFProcessor
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class _Stage:
+    """Thống kê một stage: số items đã xử lý và thời gian bận"""
+    
+    def __init__(self, unit: str):
+        self.unit = unit
+        self.items = 0
+        self.seconds = 0.0
+    
+    def add(self, items: int, seconds: float):
+        self.items += items
+        self.seconds += seconds
+    
+    def to_dict(self) -> Dict:
+        return {
+            "unit": self.unit,
+            "items": self.items,
+            "busy_seconds": round(self.seconds, 3),
+            "per_sec": round(self.items / self.seconds, 1) if self.seconds else None
+        }
+
+
+class _FileTask:
+    """Một file đang đi qua pipeline"""
+    
+    def __init__(self, path: Path, size: int, mtime: float, content_hash: str, entry: Optional[Dict]):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.content_hash = content_hash
+        self.entry = entry
+        self.future: Optional[Future] = None
+        self.chunks = 0
+
+
+class ReindexPipeline:
+    """
+    Reindex các PDF files qua pipeline nhiều stage với bounded queues
+    """
+    
+    def __init__(
+        self,
+        pdf_processor: "PDFProcessor",
+        manifest: IndexManifest,
+        collection=None
+    ):
+        """
+        Args:
+            pdf_processor: PDFProcessor dùng để extract, chunk và truy cập vector store
+            manifest: Manifest của lần index trước (được cập nhật khi từng file xong)
+            collection: Shadow collection khi full rebuild, None = collection active
+        """
+        self.pdf_processor = pdf_processor
+        self.vector_store = pdf_processor.vector_store
+        self.manifest = manifest
+        self.collection = collection
+        self.target, self.model = self.vector_store.resolve_write_target(collection)
+        
+        queue_size = settings.REINDEX_QUEUE_SIZE
+        # Đủ chỗ để mọi extract process đều có việc
+        self._extract_queue: queue.Queue = queue.Queue(
+            maxsize=max(queue_size, pdf_processor.extract_workers)
+        )
+        self._write_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        
+        self.files: List[Dict] = []
+        self.stages = {
+            "read": _Stage("files"),
+            "extract": _Stage("pages"),
+            "embed": _Stage("chunks"),
+            "store": _Stage("chunks")
+        }
+    
+    def run(self, pdf_files: List[Path]) -> Dict:
+        """
+        Chạy pipeline cho danh sách files
+        
+        Args:
+            pdf_files: Các PDF files trong thư mục data
+        
+        Returns:
+            Dictionary với kết quả từng file và thống kê từng stage
+        """
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._guard, args=(self._read_stage, pdf_files), name="reindex-read"),
+            threading.Thread(target=self._guard, args=(self._embed_stage,), name="reindex-embed")
+        ]
+        for thread in threads:
+            thread.start()
+        
+        try:
+            self._store_stage()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._abort.set()
+            for thread in threads:
+                thread.join()
+        
+        if self._error is not None:
+            raise self._error
+        
+        if self.collection is None and any(f["status"] != "unchanged" for f in self.files):
+            self.vector_store.bump_collection_version()
+        
+        wall = time.perf_counter() - start
+        sequential = sum(stage.seconds for stage in self.stages.values())
+        return {
+            "files": self.files,
+            "pipeline": {
+                "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+                "extract_workers": self.pdf_processor.extract_workers,
+                "wall_seconds": round(wall, 3),
+                "sequential_seconds": round(sequential, 3),
+                "speedup": round(sequential / wall, 2) if wall else None
+            }
+        }
+    
+    def _guard(self, stage, *args):
+        try:
+            stage(*args)
+        except BaseException as e:
+            self._fail(e)
+    
+    def _fail(self, error: BaseException):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._abort.set()
+    
+    def _put(self, q: queue.Queue, item):
+        """Put có backpressure, dừng lại nếu pipeline bị hủy"""
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def _get(self, q: queue.Queue):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._abort.is_set():
+                    return _DONE
+    
+    def _record(self, status: str, task: _FileTask, **extra):
+        with self._lock:
+            if status != "failed":
+                self.manifest.record(
+                    task.path.name, task.content_hash,
+                    self.pdf_processor.document_id(task.path.name),
+                    task.chunks if status != "unchanged" else task.entry["chunks"],
+                    task.size, task.mtime
+                )
+                # Full rebuild chỉ ghi manifest sau khi swap collection
+                if status != "unchanged" and self.collection is None:
+                    self.manifest.save()
+            self.files.append({"filename": task.path.name, "status": status, **extra})
+    
+    def _read_stage(self, pdf_files: List[Path]):
+        """Đọc file, bỏ qua file không đổi, gửi file thay đổi sang process pool để extract"""
+        try:
+            for pdf_path in pdf_files:
+                if self._abort.is_set():
+                    return
+                
+                try:
+                    stat = pdf_path.stat()
+                    entry = self.manifest.files.get(pdf_path.name)
+                    if self.manifest.is_unchanged(pdf_path.name, stat.st_size, stat.st_mtime):
+                        with self._lock:
+                            self.files.append({"filename": pdf_path.name, "status": "unchanged"})
+                        continue
+                    
+                    started = time.perf_counter()
+                    content = pdf_path.read_bytes()
+                    task = _FileTask(pdf_path, stat.st_size, stat.st_mtime, hash_content(content), entry)
+                    self.stages["read"].add(1, time.perf_counter() - started)
+                except OSError as e:
+                    logger.error(f"Lỗi khi đọc {pdf_path.name}: {str(e)}")
+                    with self._lock:
+                        self.files.append({"filename": pdf_path.name, "status": "failed", "error": str(e)})
+                    continue
+                
+                if entry and entry["content_hash"] == task.content_hash:
+                    # Chỉ đổi mtime, nội dung giữ nguyên
+                    self._record("unchanged", task)
+                    continue
+                
+                task.future = self.pdf_processor.submit_extract(content)
+                self._put(self._extract_queue, task)
+        finally:
+            self._put(self._extract_queue, _DONE)
+    
+    def _embed_stage(self):
+        """Chunk và embed theo batch INGEST_BATCH_SIZE (gộp chunks của nhiều files)"""
+        buffer = []
+        finished: List[_FileTask] = []
+        
+        def flush():
+            embeddings = None
+            if buffer:
+                started = time.perf_counter()
+                embeddings = self.vector_store.embed_batch([chunk[0] for chunk in buffer], self.model)
+                elapsed = time.perf_counter() - started
+                self.stages["embed"].add(len(buffer), elapsed)
+                INGEST_STAGE_SECONDS.labels("embed").observe(elapsed)
+            self._put(self._write_queue, (list(buffer), embeddings, list(finished)))
+            buffer.clear()
+            finished.clear()
+        
+        try:
+            while True:
+                task = self._get(self._extract_queue)
+                if task is _DONE:
+                    if buffer or finished:
+                        flush()
+                    return
+                
+                try:
+                    text, pages, seconds = task.future.result()
+                    self.stages["extract"].add(pages, seconds)
+                    INGEST_STAGE_SECONDS.labels("extract").observe(seconds)
+                    if not text.strip():
+                        raise ValueError("Không extract được text từ PDF")
+                except Exception as e:
+                    logger.error(f"Lỗi khi process {task.path.name}: {str(e)}")
+                    self._record("failed", task, error=str(e))
+                    continue
+                
+                for record in self.pdf_processor.iter_chunk_records(text, task.path.name, task.content_hash):
+                    buffer.append(record)
+                    task.chunks += 1
+                    if len(buffer) >= settings.INGEST_BATCH_SIZE:
+                        flush()
+                
+                # File chỉ hoàn tất khi batch chứa chunk cuối của nó đã được ghi
+                finished.append(task)
+        finally:
+            self._put(self._write_queue, _DONE)
+    
+    def _store_stage(self):
+        """Ghi từng batch vào ChromaDB, hoàn tất các files có chunk cuối nằm trong batch"""
+        while True:
+            item = self._get(self._write_queue)
+            if item is _DONE:
+                return
+            
+            batch, embeddings, finished = item
+            if batch:
+                started = time.perf_counter()
+                self.vector_store.upsert_batch(self.target, batch, embeddings)
+                elapsed = time.perf_counter() - started
+                self.stages["store"].add(len(batch), elapsed)
+                INGEST_STAGE_SECONDS.labels("store").observe(elapsed)
+                logger.info(f"Đã embed và lưu {self.stages['store'].items} chunks...")
+            
+            for task in finished:
+                if self.collection is None:
+                    self.pdf_processor.remove_stale_chunks(
+                        self.pdf_processor.document_id(task.path.name), task.chunks
+                    )
+                status = "updated" if task.entry else "added"
+                self._record(status, task, chunks=task.chunks)
+                logger.info(f"Created {task.chunks} chunks from {task.path.name}")
@@ -0,0 +1,110 @@
+"""
+Reranker Module - Chấm lại điểm các chunks ứng viên bằng cross-encoder
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """
+    Cross-encoder rerank (CPU) với latency budget
+    
+    Toàn bộ (query, chunk) được chấm trong một lần forward trên pool max_concurrent
+    worker threads; quá timeout thì caller giữ thứ tự dense / hybrid ban đầu.
+    
+    Predict đã bắt đầu không dừng được: lần rerank quá timeout vẫn chiếm worker
+    tới khi xong. Khi cả max_concurrent workers đang bận, request mới bỏ qua rerank
+    ngay (status busy) thay vì xếp hàng sau nó rồi cũng timeout.
+    """
+    
+    def __init__(self, model_name: str, max_length: int = 256, timeout_ms: float = 300, max_concurrent: int = 1):
+        """
+        Args:
+            model_name: Tên cross-encoder model (sentence-transformers)
+            max_length: Số token tối đa của một cặp (query, chunk)
+            timeout_ms: Latency budget cho một lần rerank (0 = không giới hạn)
+            max_concurrent: Số lần predict chạy cùng lúc (số worker threads)
+        """
+        from sentence_transformers import CrossEncoder
+        
+        logger.info(f"Đang load rerank model: {model_name}")
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.model_name = model_name
+        self.timeout_ms = timeout_ms
+        self.max_concurrent = max(1, max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="rerank")
+        
+        self._lock = threading.Lock()
+        # Số predict đã submit chưa chạy xong (kể cả các lần caller đã bỏ vì timeout)
+        self.in_flight = 0
+        self.counts = {"applied": 0, "timeout": 0, "error": 0, "busy": 0}
+    
+    def _predict(self, query: str, documents: List[str]) -> np.ndarray:
+        pairs = [(query, doc) for doc in documents]
+        return np.asarray(
+            self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+            dtype=np.float32
+        )
+    
+    def _count(self, status: str):
+        with self._lock:
+            self.counts[status] += 1
+    
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+    
+    def rerank(self, query: str, documents: List[str]) -> Tuple[Optional[List[int]], str]:
+        """
+        Sắp xếp lại documents theo điểm cross-encoder
+        
+        Args:
+            query: Câu query
+            documents: Nội dung các chunks ứng viên
+        
+        Returns:
+            Tuple of (thứ tự mới - indices vào documents, None nếu fallback;
+            trạng thái applied | timeout | error | busy)
+        """
+        with self._lock:
+            if self.in_flight >= self.max_concurrent:
+                self.counts["busy"] += 1
+                return None, "busy"
+            self.in_flight += 1
+        
+        future = self._executor.submit(self._predict, query, documents)
+        future.add_done_callback(self._release)
+        try:
+            scores = future.result(timeout=self.timeout_ms / 1000 if self.timeout_ms else None)
+        except FutureTimeoutError:
+            # Predict vẫn chạy nốt (và giữ in_flight) - kết quả bị bỏ
+            self._count("timeout")
+            logger.warning(f"Rerank quá {self.timeout_ms}ms, giữ thứ tự retrieval ban đầu")
+            return None, "timeout"
+        except Exception as e:
+            self._count("error")
+            logger.error(f"Lỗi khi rerank: {str(e)}")
+            return None, "error"
+        
+        self._count("applied")
+        return np.argsort(-scores, kind="stable").tolist(), "applied"
+    
+    def stats(self) -> Dict:
+        """Thống kê số lần rerank theo trạng thái"""
+        return {
+            "model": self.model_name,
+            "timeout_ms": self.timeout_ms,
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            **self.counts
+        }
+    
+    def shutdown(self):
+        """Dừng worker thread"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
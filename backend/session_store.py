@@ -0,0 +1,306 @@
+"""
+Session Store - Lưu lịch sử hội thoại phía server theo session_id
+
+Client chỉ gửi session_id + câu hỏi mới thay vì gửi lại toàn bộ lịch sử mỗi lượt.
+Lịch sử nằm trong một LRU giới hạn theo bytes (chỉ trong một process), hoặc trong
+SQLite để giữ sessions qua restart và dùng chung giữa các uvicorn workers.
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from cache import LRUCache
+from models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# Ước lượng overhead bộ nhớ của một ChatMessage ngoài nội dung
+MESSAGE_OVERHEAD_BYTES = 200
+
+# Khoảng thời gian tối thiểu (giây) giữa các lần dọn sessions hết hạn trong SQLite
+PRUNE_INTERVAL_SECONDS = 60
+
+
+class SessionNotFoundError(Exception):
+    """Raised khi session không tồn tại hoặc đã hết hạn"""
+
+
+def _message_size(message: ChatMessage) -> int:
+    return len(message.content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+def _session_size(session: Tuple[Tuple[ChatMessage, ...], int]) -> int:
+    return sum(_message_size(message) for message in session[0]) + MESSAGE_OVERHEAD_BYTES
+
+
+class SessionStore:
+    """
+    Lịch sử hội thoại theo session_id
+    
+    Không có db_path: mỗi session trong bộ nhớ là (messages, next_seq), tổng các
+    sessions bị giới hạn theo bytes - vượt thì evict session ít dùng nhất.
+    Có db_path: SQLite là nguồn dữ liệu duy nhất (không cache trong process) nên mọi
+    worker thấy cùng lịch sử; seq của message mới được cấp trong transaction ghi.
+    
+    Mỗi session bị giới hạn theo số messages và bytes - vượt thì bỏ các lượt cũ nhất
+    theo khối trim_block messages.
+    """
+    
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float = 0,
+        max_messages: int = 50,
+        max_session_bytes: int = 256 * 1024,
+        db_path: str = "",
+        trim_block: int = 1
+    ):
+        """
+        Args:
+            max_bytes: Tổng dung lượng tối đa của các sessions trong bộ nhớ
+            ttl_seconds: Session hết hạn sau khoảng thời gian không chat (0 = không hết hạn)
+            max_messages: Số messages tối đa giữ lại cho mỗi session
+            max_session_bytes: Dung lượng tối đa của một session
+            db_path: File SQLite để giữ sessions qua restart (trống = chỉ trong bộ nhớ)
+            trim_block: Số messages bị bỏ mỗi lần vượt giới hạn - đặt bằng khối cắt lịch sử
+                của prompt (stable_prefix) để đầu lịch sử không dịch chuyển ở mỗi lượt
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.max_session_bytes = max_session_bytes
+        # Khối không quá nửa max_messages, để sau khi cắt vẫn còn lịch sử
+        self.trim_block = max(1, min(trim_block, max_messages // 2))
+        self._memory = LRUCache(
+            max_bytes=max_bytes,
+            ttl_seconds=ttl_seconds,
+            sizeof=_session_size
+        )
+        # Append đồng thời trên cùng session trong bộ nhớ không được ghi đè nhau
+        # (với SQLite: BEGIN IMMEDIATE, đúng cả giữa các process)
+        self._lock = threading.Lock()
+        
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._last_prune = 0.0
+        if db_path:
+            self._open_db(db_path)
+    
+    @property
+    def blocking(self) -> bool:
+        """Có đọc / ghi SQLite không - khi đó caller async nên gọi trong thread riêng"""
+        return self._db is not None
+    
+    def _open_db(self, path: str):
+        """Mở SQLite, xóa các sessions đã hết hạn"""
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS chat_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS chat_session_messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                )"""
+            )
+            self._db.commit()
+            self._prune_db()
+            logger.info(f"Chat sessions lưu trên đĩa: {path}")
+        except sqlite3.Error as e:
+            logger.error(f"Không mở được session store trên đĩa: {str(e)}")
+            self._db = None
+    
+    def _prune_db(self):
+        if self._db is None or not self.ttl_seconds:
+            return
+        self._last_prune = time.monotonic()
+        expired_before = time.time() - self.ttl_seconds
+        with self._db_lock:
+            self._db.execute(
+                """DELETE FROM chat_session_messages WHERE session_id IN (
+                    SELECT session_id FROM chat_sessions WHERE updated_at < ?
+                )""",
+                (expired_before,)
+            )
+            self._db.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (expired_before,))
+            self._db.commit()
+    
+    def _load(self, session_id: str) -> Optional[Tuple[Tuple[ChatMessage, ...], int]]:
+        """Đọc session từ SQLite nếu có, ngược lại từ bộ nhớ"""
+        if self._db is None:
+            return self._memory.get(session_id)
+        
+        with self._db_lock:
+            if not self._db_exists(session_id):
+                return None
+            rows = self._db.execute(
+                """SELECT seq, role, content, created_at FROM chat_session_messages
+                WHERE session_id = ? ORDER BY seq""",
+                (session_id,)
+            ).fetchall()
+        
+        # Dữ liệu do server tự ghi - không cần validate lại
+        messages = tuple(
+            ChatMessage.model_construct(
+                role=role, content=content, timestamp=datetime.fromtimestamp(created_at)
+            )
+            for _, role, content, created_at in rows
+        )
+        next_seq = rows[-1][0] + 1 if rows else 0
+        return messages, next_seq
+    
+    def _db_exists(self, session_id: str) -> bool:
+        """Session có trong SQLite và chưa hết hạn (gọi khi đang giữ _db_lock)"""
+        row = self._db.execute(
+            "SELECT updated_at FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None and not (self.ttl_seconds and row[0] < time.time() - self.ttl_seconds)
+    
+    def _trim_start(self, history: Tuple[ChatMessage, ...]) -> int:
+        """Số messages cũ nhất cần bỏ để session nằm trong giới hạn"""
+        size = sum(_message_size(message) for message in history)
+        start = max(0, len(history) - self.max_messages)
+        size -= sum(_message_size(message) for message in history[:start])
+        while start < len(history) - 1 and size > self.max_session_bytes:
+            size -= _message_size(history[start])
+            start += 1
+        # Làm tròn lên theo khối (vẫn giữ ít nhất message cuối)
+        return min(-(-start // self.trim_block) * self.trim_block, len(history) - 1) if start else 0
+    
+    def create(self) -> str:
+        """
+        Tạo session mới
+        
+        Returns:
+            session_id
+        """
+        session_id = uuid.uuid4().hex
+        if self._db is None:
+            self._memory.set(session_id, ((), 0))
+            return session_id
+        
+        if time.monotonic() - self._last_prune > PRUNE_INTERVAL_SECONDS:
+            self._prune_db()
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO chat_sessions VALUES (?, ?, ?)", (session_id, now, now)
+            )
+            self._db.commit()
+        return session_id
+    
+    def get_history(self, session_id: str) -> List[ChatMessage]:
+        """
+        Lấy lịch sử hội thoại của session (cũ -> mới)
+        
+        Raises:
+            SessionNotFoundError: Session không tồn tại hoặc đã hết hạn
+        """
+        session = self._load(session_id)
+        if session is None:
+            raise SessionNotFoundError(f"Session {session_id} không tồn tại hoặc đã hết hạn")
+        return list(session[0])
+    
+    def append(self, session_id: str, *messages: ChatMessage):
+        """
+        Thêm các messages vào cuối session, bỏ các lượt cũ nhất nếu vượt giới hạn
+        
+        Raises:
+            SessionNotFoundError: Session không tồn tại hoặc đã hết hạn
+        """
+        if self._db is not None:
+            self._append_db(session_id, messages)
+            return
+        
+        with self._lock:
+            session = self._load(session_id)
+            if session is None:
+                raise SessionNotFoundError(f"Session {session_id} không tồn tại hoặc đã hết hạn")
+            
+            history, next_seq = session
+            history = history + messages
+            history = history[self._trim_start(history):]
+            self._memory.set(session_id, (history, next_seq + len(messages)))
+    
+    def _append_db(self, session_id: str, messages: Tuple[ChatMessage, ...]):
+        """
+        Append trong một transaction ghi (BEGIN IMMEDIATE): seq được cấp từ MAX(seq)
+        trong SQLite nên append đồng thời từ các workers khác nhau không ghi đè nhau
+        """
+        now = time.time()
+        with self._db_lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                if not self._db_exists(session_id):
+                    raise SessionNotFoundError(f"Session {session_id} không tồn tại hoặc đã hết hạn")
+                next_seq = self._db.execute(
+                    "SELECT COALESCE(MAX(seq), -1) + 1 FROM chat_session_messages WHERE session_id = ?",
+                    (session_id,)
+                ).fetchone()[0]
+                self._db.executemany(
+                    "INSERT INTO chat_session_messages VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            session_id, next_seq + i, message.role, message.content,
+                            message.timestamp.timestamp() if message.timestamp else now
+                        )
+                        for i, message in enumerate(messages)
+                    ]
+                )
+                
+                rows = self._db.execute(
+                    """SELECT seq, role, content FROM chat_session_messages
+                    WHERE session_id = ? ORDER BY seq""",
+                    (session_id,)
+                ).fetchall()
+                start = self._trim_start(tuple(
+                    ChatMessage.model_construct(role=role, content=content) for _, role, content in rows
+                ))
+                if start:
+                    self._db.execute(
+                        "DELETE FROM chat_session_messages WHERE session_id = ? AND seq < ?",
+                        (session_id, rows[start][0])
+                    )
+                self._db.execute(
+                    "UPDATE chat_sessions SET updated_at = ? WHERE session_id = ?", (now, session_id)
+                )
+                self._db.commit()
+            except SessionNotFoundError:
+                self._db.rollback()
+                raise
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.warning(f"Không ghi được session xuống đĩa: {str(e)}")
+    
+    def delete(self, session_id: str) -> bool:
+        """Xóa session, trả về False nếu không tồn tại"""
+        if self._db is None:
+            existed = self._load(session_id) is not None
+            self._memory.delete(session_id)
+            return existed
+        
+        with self._db_lock:
+            existed = self._db_exists(session_id)
+            self._db.execute("DELETE FROM chat_session_messages WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+        return existed
+    
+    def stats(self) -> Dict:
+        """Thống kê sessions trong bộ nhớ"""
+        return {
+            **self._memory.stats(),
+            "disk_enabled": self._db is not None
+        }
@@ -0,0 +1,219 @@
+"""
+SSE Module - Định dạng và gộp (coalesce) các frames Server-Sent Events cho /chat/stream
+
+Ollama trả về từng token (50-100 tokens/s mỗi stream); gửi mỗi token một frame
+nghĩa là rất nhiều lần encode JSON + write nhỏ. coalesce() gộp các tokens thành
+một frame theo thời gian (STREAM_COALESCE_MS) hoặc theo kích thước, và báo khi
+cần gửi heartbeat để proxy / trình duyệt không đóng kết nối lúc chờ retrieval
+hoặc chờ slot Ollama.
+"""
+from typing import AsyncGenerator, AsyncIterable, Awaitable, List, Optional, Union
+import asyncio
+import json
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson là optional, fallback về json chuẩn
+    orjson = None
+
+
+# Comment SSE - client bỏ qua, chỉ để giữ kết nối
+HEARTBEAT_FRAME = ": ping\n\n"
+
+
+class StreamAborted(Exception):
+    """Stream bị dừng giữa chừng vì điều kiện stop (vd: client ngắt kết nối)"""
+
+
+class SourcesText(str):
+    """
+    Markdown nguồn tham khảo ở đầu stream, kèm danh sách nguồn gốc
+    
+    Client cũ nhận như text bình thường; khi dùng typed events, /chat/stream gửi
+    .sources thành event `sources` riêng thay vì chèn markdown vào câu trả lời.
+    """
+    
+    sources: List[str]
+    
+    def __new__(cls, text: str, sources: List[str]):
+        obj = super().__new__(cls, text)
+        obj.sources = sources
+        return obj
+
+
+class StreamError(str):
+    """
+    Lỗi giữa chừng stream (vd: Ollama quá thời gian generate)
+    
+    Nội dung text giữ dạng thông báo lỗi cũ cho code đọc generator trực tiếp;
+    /chat/stream gửi .message thành event `error` và không gửi `done`.
+    """
+    
+    message: str
+    
+    def __new__(cls, message: str):
+        obj = super().__new__(cls, f"\n\n❌ Lỗi: {message}")
+        obj.message = message
+        return obj
+
+
+# Chunks luôn được gửi thành frame riêng, không gộp với text
+_STANDALONE = (SourcesText, StreamError)
+
+
+def dumps(data) -> str:
+    """JSON encode cho frame (orjson nếu có cài)"""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def format_event(data, event: Optional[str] = None) -> str:
+    """
+    Một frame SSE
+    
+    Args:
+        data: Payload (được JSON encode)
+        event: Tên event (None = frame chỉ có data như format cũ)
+    
+    Returns:
+        Frame dạng 'event: delta\\ndata: {...}\\n\\n'
+    """
+    if event is None:
+        return f"data: {dumps(data)}\n\n"
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+async def coalesce(
+    chunks: AsyncIterable[str],
+    interval: float = 0.03,
+    max_chars: int = 512,
+    heartbeat: float = 15.0,
+    stop: Optional[Awaitable[bool]] = None
+) -> AsyncGenerator[Optional[Union[str, SourcesText, StreamError]], None]:
+    """
+    Gộp chunks text thành frames theo thời gian hoặc kích thước
+    
+    Chunks được một task riêng đọc vào buffer (chỉ append, không tốn gì thêm mỗi
+    token). Chunk đầu tiên sau khi im lặng được gửi ngay (không làm chậm
+    time-to-first-token); sau mỗi frame, các chunks tiếp theo được gom trong
+    interval hoặc tới khi đủ max_chars. SourcesText và StreamError luôn được gửi riêng.
+    
+    Args:
+        chunks: Async iterator các chunks text (vd: LLMService.stream_response)
+        interval: Thời gian gom tối đa (giây), 0 = mỗi chunk một frame
+        max_chars: Gửi ngay khi đã gom đủ số ký tự này
+        heartbeat: Yield None sau mỗi khoảng (giây) không có dữ liệu (0 = tắt)
+        stop: Awaitable trả về True khi cần dừng (vd: client ngắt kết nối) - task đọc
+            bị hủy ngay lúc đó, kể cả khi không ai đang đọc generator này
+    
+    Yields:
+        Text đã gộp, SourcesText, StreamError, hoặc None khi cần gửi heartbeat
+    
+    Raises:
+        StreamAborted: Nếu stop trả về True trước khi chunks kết thúc
+    """
+    loop = asyncio.get_running_loop()
+    buffer: List[str] = []
+    state = {"size": 0, "threshold": 1, "finished": False, "error": None, "waiter": None, "cancelled": False}
+    
+    def wake(*_):
+        waiter = state["waiter"]
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+    
+    async def pump():
+        try:
+            async for chunk in chunks:
+                buffer.append(chunk)
+                state["size"] += len(chunk)
+                if state["size"] >= state["threshold"] or isinstance(chunk, _STANDALONE):
+                    wake()
+        except Exception as e:
+            state["error"] = e
+        finally:
+            state["finished"] = True
+            wake()
+    
+    async def wait(threshold: int, timeout: Optional[float]):
+        # Chờ tới khi buffer đủ threshold ký tự, nguồn kết thúc, hoặc hết timeout
+        if state["finished"] or state["size"] >= threshold:
+            return
+        state["threshold"] = threshold
+        state["waiter"] = loop.create_future()
+        timer = loop.call_later(timeout, wake) if timeout is not None else None
+        try:
+            await state["waiter"]
+        finally:
+            state["waiter"] = None
+            if timer is not None:
+                timer.cancel()
+    
+    task = asyncio.ensure_future(pump())
+    watcher = asyncio.ensure_future(stop) if stop is not None else None
+    
+    def aborted() -> bool:
+        return (
+            watcher is not None and watcher.done() and not watcher.cancelled()
+            and watcher.exception() is None and bool(watcher.result())
+        )
+    
+    def cancel_task():
+        # Chỉ cancel một lần: cancel lần hai sẽ cắt ngang phần dọn dẹp của generator nguồn
+        if not task.done() and not state["cancelled"]:
+            state["cancelled"] = True
+            task.cancel()
+    
+    def abort(_):
+        # Chạy trong event loop: hủy task đọc (đóng luôn generator nguồn) rồi đánh thức consumer
+        if aborted():
+            cancel_task()
+            wake()
+    
+    if watcher is not None:
+        watcher.add_done_callback(abort)
+    try:
+        while True:
+            # Im lặng: chờ chunk đầu tiên (gửi ngay) hoặc tới hạn heartbeat
+            await wait(1, heartbeat if heartbeat > 0 else None)
+            if aborted():
+                raise StreamAborted()
+            if not buffer:
+                if state["finished"]:
+                    break
+                yield None
+                continue
+            
+            # Có dữ liệu: gom thêm trong interval (hoặc tới khi đủ max_chars)
+            while buffer:
+                pending, buffer[:] = list(buffer), []
+                state["size"] = 0
+                text: List[str] = []
+                for chunk in pending:
+                    if isinstance(chunk, _STANDALONE):
+                        if text:
+                            yield "".join(text)
+                            text = []
+                        yield chunk
+                    else:
+                        text.append(chunk)
+                if text:
+                    yield "".join(text)
+                if interval > 0:
+                    await wait(max_chars, interval)
+                if aborted():
+                    raise StreamAborted()
+        
+        if state["error"] is not None:
+            raise state["error"]
+    finally:
+        if watcher is not None and not watcher.done():
+            watcher.cancel()
+        # Consumer dừng giữa chừng: hủy task đọc (dừng luôn generator nguồn)
+        if not task.done():
+            cancel_task()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
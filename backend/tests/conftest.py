@@ -0,0 +1,8 @@
+"""
+Cấu hình chung cho pytest - chạy từ thư mục backend: python -m pytest -q
+"""
+import os
+import sys
+
+# Các module của backend nằm phẳng trong backend/, không phải package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,128 @@
+"""
+Tests cho auth - ApiKeyRegistry (tra cứu, hot reload, file lỗi) và endpoints allowlist
+"""
+import json
+import os
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import auth
+from auth import ApiKeyInfo, ApiKeyRegistry, hash_api_key
+from config import settings
+
+KEYS_FILE = {
+    "tiers": {"partner": {"per_minute": 300, "per_hour": 10000}},
+    "keys": [
+        {"name": "partner-a", "key_sha256": hash_api_key("partner-key"), "tier": "partner", "endpoints": ["/chat"]},
+        {"name": "admin", "key": "admin-key"},
+        {"name": "revoked", "key": "revoked-key", "disabled": True},
+    ],
+}
+
+
+def _write(path, data):
+    path.write_text(data if isinstance(data, str) else json.dumps(data), encoding="utf-8")
+    # mtime của các lần ghi liên tiếp có thể trùng nhau trên một số filesystem
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def keys_path(tmp_path):
+    path = tmp_path / "api_keys.json"
+    _write(path, KEYS_FILE)
+    return path
+
+
+class TestApiKeyRegistry:
+    def test_lookup(self, keys_path):
+        registry = ApiKeyRegistry(["static-key"], path=str(keys_path), reload_interval=0)
+        
+        partner = registry.lookup("partner-key")
+        assert partner.name == "partner-a"
+        assert (partner.tier, partner.per_minute, partner.per_hour) == ("partner", 300, 10000)
+        assert registry.lookup("admin-key").endpoints is None
+        assert registry.lookup("static-key") is not None
+        assert registry.lookup("revoked-key") is None
+        assert registry.lookup("wrong-key") is None
+        assert registry.lookup(None) is None
+        assert len(registry) == 3
+    
+    def test_reload_on_change(self, keys_path):
+        registry = ApiKeyRegistry(path=str(keys_path), reload_interval=0)
+        assert not registry.reload()
+        
+        _write(keys_path, {"keys": [{"name": "new", "key": "new-key"}]})
+        assert registry.reload()
+        assert registry.lookup("new-key").name == "new"
+        assert registry.lookup("admin-key") is None
+    
+    def test_hot_reload_on_lookup(self, keys_path):
+        registry = ApiKeyRegistry(path=str(keys_path), reload_interval=60)
+        _write(keys_path, {"keys": [{"name": "new", "key": "new-key"}]})
+        # Lần lookup đầu tiên luôn kiểm tra file, các lần sau theo reload_interval
+        assert registry.lookup("new-key") is not None
+        
+        _write(keys_path, {"keys": [{"name": "newer", "key": "newer-key"}]})
+        assert registry.lookup("newer-key") is None
+    
+    @pytest.mark.parametrize("data", [
+        "{not json",
+        {"keys": [{"name": "no-key"}]},
+        {"keys": [{"key": "k", "tier": "missing-tier"}]},
+    ])
+    def test_invalid_file_keeps_current_keys(self, keys_path, data):
+        registry = ApiKeyRegistry(path=str(keys_path), reload_interval=0)
+        _write(keys_path, data)
+        
+        assert not registry.reload()
+        assert registry.lookup("admin-key") is not None
+    
+    def test_missing_file(self, tmp_path):
+        registry = ApiKeyRegistry(["static-key"], path=str(tmp_path / "missing.json"))
+        assert registry.lookup("static-key") is not None
+
+
+class TestEndpointAllowlist:
+    @pytest.mark.parametrize("path, allowed", [
+        ("/chat", True),
+        ("/chat/stream", True),
+        ("/chatbot", False),
+        ("/documents/stats", False),
+    ])
+    def test_prefix_match(self, path, allowed):
+        info = ApiKeyInfo(hash_api_key("k"), endpoints=["/chat/"])
+        assert info.allows(path) is allowed
+    
+    def test_no_endpoints_allows_all(self):
+        assert ApiKeyInfo(hash_api_key("k")).allows("/documents/reindex")
+        assert ApiKeyInfo(hash_api_key("k"), endpoints=["/"]).allows("/documents/reindex")
+    
+    @pytest.fixture
+    def client(self, keys_path, monkeypatch):
+        monkeypatch.setattr(settings, "ENABLE_API_KEY_AUTH", True)
+        monkeypatch.setattr(auth, "api_key_registry", ApiKeyRegistry(path=str(keys_path), reload_interval=0))
+        
+        app = FastAPI()
+        
+        @app.get("/chat")
+        async def chat(api_key: str = Depends(auth.optional_verify_api_key)):
+            return {"api_key": api_key}
+        
+        @app.get("/documents/stats")
+        async def stats(api_key: str = Depends(auth.verify_api_key)):
+            return {}
+        
+        return TestClient(app)
+    
+    def test_required_key(self, client):
+        assert client.get("/documents/stats").status_code == 401
+        assert client.get("/documents/stats", headers={"X-API-Key": "wrong"}).status_code == 401
+        assert client.get("/documents/stats", headers={"X-API-Key": "admin-key"}).status_code == 200
+        assert client.get("/documents/stats", headers={"X-API-Key": "partner-key"}).status_code == 403
+    
+    def test_optional_key(self, client):
+        assert client.get("/chat").json() == {"api_key": None}
+        assert client.get("/chat", headers={"X-API-Key": "partner-key"}).status_code == 200
@@ -0,0 +1,105 @@
+"""
+Tests cho cache - SemanticAnswerCache (ngưỡng similarity, context key, TTL, LRU) và LRUCache
+"""
+import time
+
+import numpy as np
+import pytest
+
+from cache import LRUCache, SemanticAnswerCache
+
+
+def _vector(angle_degrees: float) -> np.ndarray:
+    """Vector đơn vị trong mặt phẳng - cosine giữa hai vector = cos(chênh lệch góc)"""
+    angle = np.radians(angle_degrees)
+    return np.array([np.cos(angle), np.sin(angle), 0.0], dtype=np.float32)
+
+
+class TestSemanticAnswerCache:
+    def test_hit_above_threshold(self):
+        cache = SemanticAnswerCache(threshold=0.95, max_entries=10)
+        cache.set(_vector(0), "ctx", "answer", ["a.pdf"])
+        
+        # cos(10°) ~ 0.985 >= 0.95
+        assert cache.get(_vector(10), "ctx") == ("answer", ["a.pdf"])
+        assert cache.hits == 1
+    
+    def test_miss_below_threshold(self):
+        cache = SemanticAnswerCache(threshold=0.95, max_entries=10)
+        cache.set(_vector(0), "ctx", "answer", [])
+        
+        # cos(25°) ~ 0.906 < 0.95
+        assert cache.get(_vector(25), "ctx") is None
+        assert cache.misses == 1
+    
+    def test_threshold_is_inclusive(self):
+        cache = SemanticAnswerCache(threshold=1.0, max_entries=10)
+        cache.set([3.0, 4.0, 0.0], "ctx", "answer", [])
+        # Không phụ thuộc độ dài vector (đã normalize)
+        assert cache.get([6.0, 8.0, 0.0], "ctx") == ("answer", [])
+    
+    def test_context_key_must_match(self):
+        cache = SemanticAnswerCache(threshold=0.9, max_entries=10)
+        cache.set(_vector(0), "chunks-a", "answer", [])
+        assert cache.get(_vector(0), "chunks-b") is None
+    
+    def test_returns_best_match(self):
+        cache = SemanticAnswerCache(threshold=0.8, max_entries=10)
+        cache.set(_vector(0), "ctx", "zero", [])
+        cache.set(_vector(40), "ctx", "forty", [])
+        assert cache.get(_vector(35), "ctx")[0] == "forty"
+    
+    def test_similar_question_replaces_entry(self):
+        cache = SemanticAnswerCache(threshold=0.95, max_entries=10)
+        cache.set(_vector(0), "ctx", "old", [])
+        cache.set(_vector(5), "ctx", "new", [])
+        assert cache.stats()["entries"] == 1
+        assert cache.get(_vector(0), "ctx")[0] == "new"
+    
+    def test_lru_eviction(self):
+        cache = SemanticAnswerCache(threshold=0.99, max_entries=2)
+        cache.set(_vector(0), "ctx", "a", [])
+        cache.set(_vector(60), "ctx", "b", [])
+        cache.get(_vector(0), "ctx")
+        cache.set(_vector(120), "ctx", "c", [])
+        
+        assert cache.evictions == 1
+        assert cache.get(_vector(60), "ctx") is None
+        assert cache.get(_vector(0), "ctx")[0] == "a"
+    
+    def test_ttl(self):
+        cache = SemanticAnswerCache(threshold=0.9, max_entries=10, ttl_seconds=0.01)
+        cache.set(_vector(0), "ctx", "answer", [])
+        time.sleep(0.02)
+        assert cache.get(_vector(0), "ctx") is None
+        assert cache.stats()["entries"] == 0
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = LRUCache(max_bytes=20, sizeof=lambda value: 10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.evictions == 1
+    
+    def test_ttl(self):
+        cache = LRUCache(max_bytes=1024, ttl_seconds=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+    
+    @pytest.mark.parametrize("hits, misses, ratio", [(0, 0, 0.0), (1, 1, 0.5)])
+    def test_hit_ratio(self, hits, misses, ratio):
+        cache = LRUCache(max_bytes=1024)
+        cache.set("a", 1)
+        for _ in range(hits):
+            cache.get("a")
+        for _ in range(misses):
+            cache.get("missing")
+        assert cache.stats()["hit_ratio"] == ratio
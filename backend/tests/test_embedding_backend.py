@@ -0,0 +1,94 @@
+"""
+Tests cho embedding_backend - interface và equivalence fp32 / int8
+
+Cùng ngưỡng với benchmarks/bench_embedding_backends.py --check. Các test cần model
+ONNX được skip nếu chưa cài onnxruntime hoặc không tải được model (offline, chưa export).
+"""
+import numpy as np
+import pytest
+
+from config import settings
+from embedding_backend import (
+    EmbeddingBackend,
+    OnnxEmbeddingBackend,
+    SentenceTransformerBackend,
+    configured_backend_name,
+    cosine_drift,
+)
+
+MAX_DRIFT = 1e-4
+MAX_DRIFT_INT8 = 0.02
+
+TEXTS = [
+    "Sốt xuất huyết Dengue là bệnh truyền nhiễm cấp tính do virus Dengue gây ra.",
+    "Triệu chứng thường gặp gồm sốt cao đột ngột, đau đầu, đau hốc mắt và đau cơ.",
+    "Không tự ý dùng aspirin hoặc ibuprofen khi nghi ngờ sốt xuất huyết.",
+    "Paracetamol liều 10-15mg/kg mỗi 6 giờ, tối đa 4g mỗi ngày ở người lớn.",
+    "triệu chứng sốt xuất huyết",
+    "liều paracetamol cho trẻ em",
+]
+
+
+def _load(factory):
+    try:
+        return factory()
+    except Exception as e:
+        pytest.skip(f"Không load được backend: {e}")
+
+
+@pytest.fixture(scope="module")
+def torch_backend():
+    pytest.importorskip("sentence_transformers")
+    return _load(lambda: SentenceTransformerBackend(settings.EMBEDDING_MODEL))
+
+
+@pytest.fixture(scope="module")
+def onnx_backend():
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    return _load(lambda: OnnxEmbeddingBackend(settings.EMBEDDING_MODEL, model_dir=settings.EMBEDDING_ONNX_DIR))
+
+
+@pytest.fixture(scope="module")
+def onnx_int8_backend(tmp_path_factory):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    return _load(lambda: OnnxEmbeddingBackend(
+        settings.EMBEDDING_MODEL,
+        model_dir=settings.EMBEDDING_ONNX_DIR,
+        quantize=True,
+        cache_dir=str(tmp_path_factory.mktemp("onnx"))
+    ))
+
+
+def test_encode_is_abstract():
+    with pytest.raises(TypeError):
+        EmbeddingBackend("model")
+
+
+@pytest.mark.parametrize("backend, quantize, expected", [
+    ("sentence_transformers", True, "sentence_transformers"),
+    ("onnx", False, "onnx"),
+    ("onnx", True, "onnx-int8"),
+])
+def test_configured_backend_name(monkeypatch, backend, quantize, expected):
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", backend)
+    monkeypatch.setattr(settings, "EMBEDDING_ONNX_QUANTIZE", quantize)
+    assert configured_backend_name() == expected
+
+
+def test_cosine_drift_rejects_shape_mismatch():
+    with pytest.raises(ValueError):
+        cosine_drift(np.ones((2, 3)), np.ones((3, 3)))
+
+
+def test_onnx_fp32_matches_pytorch(torch_backend, onnx_backend):
+    drift = cosine_drift(torch_backend.encode(TEXTS), onnx_backend.encode(TEXTS))
+    assert drift["max_drift"] <= MAX_DRIFT
+
+
+def test_onnx_int8_drift_within_threshold(onnx_backend, onnx_int8_backend):
+    # fp32 ONNX là reference (trùng PyTorch theo test trên), không cần cài torch
+    assert onnx_int8_backend.backend_name == "onnx-int8"
+    drift = cosine_drift(onnx_backend.encode(TEXTS), onnx_int8_backend.encode(TEXTS))
+    assert drift["max_drift"] <= MAX_DRIFT_INT8
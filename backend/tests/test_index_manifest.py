@@ -0,0 +1,64 @@
+"""
+Tests cho index_manifest - phát hiện file thay đổi, lưu / đọc lại manifest
+"""
+import json
+
+from index_manifest import IndexManifest, hash_content
+
+
+def _manifest(tmp_path):
+    manifest = IndexManifest(tmp_path / "manifest.json", "model-a", embedding_backend="onnx")
+    manifest.record("a.pdf", hash_content(b"pdf a"), "doc-a", chunks=3, size=5, mtime=100.0)
+    return manifest
+
+
+def test_hash_content():
+    assert hash_content(b"pdf") == hash_content(b"pdf")
+    assert hash_content(b"pdf") != hash_content(b"pdf ")
+    assert len(hash_content(b"")) == 64
+
+
+def test_is_unchanged_by_size_and_mtime(tmp_path):
+    manifest = _manifest(tmp_path)
+    assert manifest.is_unchanged("a.pdf", 5, 100.0)
+    assert not manifest.is_unchanged("a.pdf", 6, 100.0)
+    assert not manifest.is_unchanged("a.pdf", 5, 101.0)
+    assert not manifest.is_unchanged("b.pdf", 5, 100.0)
+
+
+def test_save_and_load(tmp_path):
+    _manifest(tmp_path).save()
+    
+    loaded = IndexManifest.load(tmp_path / "manifest.json")
+    assert loaded.embedding_model == "model-a"
+    assert loaded.embedding_backend == "onnx"
+    assert loaded.is_unchanged("a.pdf", 5, 100.0)
+    assert loaded.files["a.pdf"]["document_id"] == "doc-a"
+    assert not (tmp_path / "manifest.tmp").exists()
+
+
+def test_load_missing_or_corrupt(tmp_path):
+    path = tmp_path / "manifest.json"
+    assert IndexManifest.load(path).files == {}
+    
+    path.write_text("{broken", encoding="utf-8")
+    manifest = IndexManifest.load(path)
+    assert manifest.files == {}
+    assert manifest.embedding_model == ""
+
+
+def test_legacy_manifest_defaults_to_sentence_transformers(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps({"embedding_model": "model-a", "files": {}}), encoding="utf-8")
+    assert IndexManifest.load(path).embedding_backend == "sentence_transformers"
+
+
+def test_remove_and_reset(tmp_path):
+    manifest = _manifest(tmp_path)
+    assert manifest.remove("a.pdf")["document_id"] == "doc-a"
+    assert manifest.remove("a.pdf") is None
+    
+    manifest = _manifest(tmp_path)
+    manifest.reset("model-b", "onnx-int8")
+    assert manifest.files == {}
+    assert (manifest.embedding_model, manifest.embedding_backend) == ("model-b", "onnx-int8")
@@ -0,0 +1,115 @@
+"""
+Tests cho lexical_index - tokenizer tiếng Việt, BM25 search và Reciprocal Rank Fusion
+"""
+import pytest
+
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    "c1": "Paracetamol liều 500mg mỗi 6 giờ, tối đa 4g mỗi ngày ở người lớn.",
+    "c2": "Sốt xuất huyết Dengue: không dùng aspirin hoặc ibuprofen.",
+    "c3": "Hen phế quản (J45.9) điều trị bằng thuốc giãn phế quản dạng hít.",
+    "c4": "Tăng huyết áp khi huyết áp tâm thu từ 140 mmHg trở lên.",
+    "c5": "Bệnh nhân sốt cao cần theo dõi tiểu cầu và hematocrit.",
+    "c6": "Đái tháo đường típ 2 kiểm soát bằng metformin và chế độ ăn.",
+    "c7": "Viêm phổi cộng đồng ở trẻ em dùng amoxicillin đường uống.",
+    "c8": "Rửa tay thường xuyên giúp phòng bệnh tay chân miệng.",
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    lexical_index = LexicalIndex(tmp_path / "medical_bm25")
+    lexical_index.add(list(DOCS), list(DOCS.values()))
+    return lexical_index
+
+
+class TestTokenize:
+    def test_lowercase_and_stopwords(self):
+        assert tokenize("Sốt xuất huyết và đau đầu") == ["sốt", "xuất", "huyết", "đau", "đầu"]
+    
+    def test_keeps_icd_codes_and_doses(self):
+        tokens = tokenize("Mã J45.9, liều 500mg hoặc 0,5ml")
+        assert "j45.9" in tokens
+        assert "500mg" in tokens
+        assert "0,5ml" in tokens
+    
+    def test_normalizes_tone_placement_and_unicode(self):
+        # Dấu thanh kiểu mới (hoà) và chuỗi NFD cho cùng token với kiểu cũ
+        assert tokenize("hoà") == tokenize("hòa")
+        assert tokenize("thuý") == tokenize("thúy")
+        assert tokenize("hòa") == ["hòa"]
+    
+    def test_keeps_qu_syllables(self):
+        # "quý" không phải tổ hợp u + ý cần chuẩn hóa
+        assert tokenize("quý") == ["quý"]
+    
+    def test_empty(self):
+        assert tokenize("") == []
+        assert tokenize("và của là") == []
+
+
+class TestLexicalIndexSearch:
+    def test_exact_keyword_ranks_first(self, index):
+        results = index.search("liều paracetamol", top_k=3)
+        assert results[0][0] == "c1"
+        assert all(score > 0 for _, score in results)
+    
+    def test_icd_code(self, index):
+        assert index.search("J45.9", top_k=3)[0][0] == "c3"
+    
+    def test_scores_descending_and_top_k(self, index):
+        results = index.search("sốt huyết áp", top_k=2)
+        assert len(results) <= 2
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True)
+    
+    def test_no_match(self, index):
+        assert index.search("xyzabc", top_k=5) == []
+        assert index.search("và của", top_k=5) == []
+        assert index.search("paracetamol", top_k=0) == []
+    
+    def test_remove_and_upsert(self, index):
+        index.remove(["c1"])
+        assert all(doc_id != "c1" for doc_id, _ in index.search("paracetamol", top_k=5))
+        
+        index.add(["c2"], ["Paracetamol hạ sốt an toàn."])
+        assert index.search("paracetamol", top_k=5)[0][0] == "c2"
+        assert index.search("aspirin", top_k=5) == []
+        assert len(index) == len(DOCS) - 1
+    
+    def test_reload_from_log_and_snapshot(self, index, tmp_path):
+        index.remove(["c4"])
+        reopened = LexicalIndex(tmp_path / "medical_bm25")
+        reopened.load()
+        assert reopened.search("paracetamol", top_k=1)[0][0] == "c1"
+        assert reopened.search("140 mmHg", top_k=5) == []
+        
+        index.snapshot()
+        reopened = LexicalIndex(tmp_path / "medical_bm25")
+        reopened.load()
+        assert len(reopened) == len(DOCS) - 1
+        assert reopened.search("metformin", top_k=1)[0][0] == "c6"
+    
+    def test_sees_writes_of_other_instances(self, index, tmp_path):
+        # Hai instance trên cùng file giống hai uvicorn workers
+        other = LexicalIndex(tmp_path / "medical_bm25")
+        other.load()
+        other.add(["c9"], ["Vắc xin sởi quai bị rubella tiêm lúc 12 tháng."])
+        assert index.search("rubella", top_k=1)[0][0] == "c9"
+
+
+class TestReciprocalRankFusion:
+    def test_documents_in_both_rankings_win(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], k=60)
+        assert [doc_id for doc_id, _ in fused][:2] == ["a", "c"]
+        assert {doc_id for doc_id, _ in fused} == {"a", "b", "c", "d"}
+    
+    def test_scores(self):
+        fused = dict(reciprocal_rank_fusion([["a", "b"], ["b"]], k=1))
+        assert fused["a"] == pytest.approx(1 / 2)
+        assert fused["b"] == pytest.approx(1 / 3 + 1 / 2)
+    
+    def test_empty(self):
+        assert reciprocal_rank_fusion([]) == []
+        assert reciprocal_rank_fusion([[], []]) == []
@@ -0,0 +1,88 @@
+"""
+Tests cho rate_limit_store - sliding window giống nhau ở mọi store (memory, sqlite, redis)
+"""
+import pytest
+
+from rate_limit_store import (
+    MemoryRateLimitStore,
+    RedisRateLimitStore,
+    SQLiteRateLimitStore,
+    evaluate,
+)
+
+MINUTE = [("minute", 60, 10)]
+# Đầu một fixed window của cả phút lẫn giờ
+T0 = 3600.0 * 100
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryRateLimitStore(shards=4)
+    if request.param == "sqlite":
+        return SQLiteRateLimitStore(str(tmp_path / "rate_limits.sqlite"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisRateLimitStore("redis://fake", client=fakeredis.FakeRedis())
+
+
+def _hits(store, client_id, count, now, windows=MINUTE):
+    return [store.hit(client_id, windows, now) for _ in range(count)]
+
+
+def test_allows_up_to_limit(store):
+    decisions = _hits(store, "client", 10, T0)
+    assert all(d.allowed for d in decisions)
+    assert [d.remaining for d in decisions] == list(range(9, -1, -1))
+    
+    denied = store.hit("client", MINUTE, T0 + 1)
+    assert not denied.allowed
+    assert denied.window == "minute"
+    assert denied.retry_after >= 1
+    assert denied.headers()["Retry-After"] == str(denied.retry_after)
+
+
+def test_previous_window_slides_out(store):
+    _hits(store, "client", 10, T0)
+    
+    # Đầu window kế tiếp: window trước vẫn tính đủ
+    assert not store.hit("client", MINUTE, T0 + 60).allowed
+    # Giữa window: window trước còn tính một nửa (5), được thêm 5 request
+    decisions = _hits(store, "client", 6, T0 + 90)
+    assert [d.allowed for d in decisions] == [True] * 5 + [False]
+    # Hai windows sau: không còn gì của window cũ
+    assert all(d.allowed for d in _hits(store, "client", 10, T0 + 180))
+
+
+def test_denied_requests_are_not_counted(store):
+    _hits(store, "client", 15, T0)
+    # Nếu 5 request bị từ chối được tính, window trước sẽ là 15 và vẫn chặn ở giữa window sau
+    assert store.hit("client", MINUTE, T0 + 90).allowed
+
+
+def test_clients_are_isolated(store):
+    _hits(store, "a", 10, T0)
+    assert not store.hit("a", MINUTE, T0).allowed
+    assert store.hit("b", MINUTE, T0).allowed
+
+
+def test_tightest_window_decides(store):
+    windows = [("minute", 60, 10), ("hour", 3600, 15)]
+    _hits(store, "client", 10, T0, windows)
+    # Cửa sổ phút đã trống, cửa sổ giờ còn 15 - 10 - 1 sau request này
+    decision = store.hit("client", windows, T0 + 120)
+    assert decision.allowed
+    assert decision.window == "hour"
+    assert decision.remaining == 4
+    
+    assert all(d.allowed for d in _hits(store, "client", 4, T0 + 240, windows))
+    denied = store.hit("client", windows, T0 + 360)
+    assert not denied.allowed
+    assert denied.window == "hour"
+
+
+def test_evaluate_retry_after_lets_next_request_through():
+    # 10 request ở window trước, 0 ở window hiện tại, elapsed = 0
+    decision = evaluate(MINUTE, T0, [(10, 0)])
+    assert not decision.allowed
+    assert evaluate(MINUTE, T0 + decision.retry_after, [(10, 0)]).allowed
+    assert not evaluate(MINUTE, T0 + decision.retry_after - 1, [(10, 0)]).allowed
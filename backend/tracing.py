@@ -0,0 +1,250 @@
+"""
+Tracing Module - Spans theo từng request, ghi ra file JSONL để debug các request chậm
+
+Span hiện tại được truyền qua contextvars nên đi theo cả asyncio.to_thread
+(main.chat -> retrieve_context -> similarity_search -> ollama.chat). Khi tracing
+tắt hoặc không có trace đang chạy, span() trả về span rỗng và gần như không tốn gì.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """Một đoạn công việc trong trace (thời gian tính theo ms từ lúc bắt đầu trace)"""
+    
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attributes")
+    
+    def __init__(self, trace: Optional["Trace"], name: str, parent_id: Optional[str] = None, **attributes):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16] if trace is not None else ""
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes: Dict = attributes
+    
+    def set(self, **attributes):
+        """Gắn thêm attributes (vd: số documents, eval_count)"""
+        self.attributes.update(attributes)
+    
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return round((end - self.start) * 1000, 2)
+    
+    def to_dict(self, origin: float) -> Dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan(Span):
+    """Span trả về khi không trace - set() bỏ qua"""
+    
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan(None, "noop")
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Tập các spans của một request"""
+    
+    def __init__(self, name: str, **attributes):
+        """
+        Args:
+            name: Tên root span (vd: chat, chat_stream)
+            attributes: Attributes của root span
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.root = Span(self, name, **attributes)
+        # list.append thread-safe nên spans từ các threads (to_thread) ghi thẳng vào đây
+        self.spans: List[Span] = [self.root]
+    
+    def to_dict(self) -> Dict:
+        origin = self.root.start
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "timestamp": self.started_at,
+            "duration_ms": self.root.duration_ms,
+            "spans": [span.to_dict(origin) for span in list(self.spans)]
+        }
+
+
+class JsonlTraceExporter:
+    """Ghi mỗi trace thành một dòng JSON (append), thread-safe"""
+    
+    def __init__(self, path: str, min_duration_ms: float = 0):
+        """
+        Args:
+            path: File JSONL
+            min_duration_ms: Chỉ ghi traces chậm hơn ngưỡng này (0 = ghi tất cả)
+        """
+        self.path = path
+        self.min_duration_ms = min_duration_ms
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    def export(self, trace: Trace):
+        if trace.root.duration_ms < self.min_duration_ms:
+            return
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+        try:
+            with self._lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Không ghi được trace {trace.trace_id}: {str(e)}")
+
+
+_exporter: Optional[JsonlTraceExporter] = None
+
+
+def get_exporter() -> Optional[JsonlTraceExporter]:
+    """Exporter theo cấu hình (None khi ENABLE_TRACING tắt)"""
+    global _exporter
+    if not settings.ENABLE_TRACING:
+        return None
+    if _exporter is None or _exporter.path != settings.TRACE_EXPORT_PATH:
+        _exporter = JsonlTraceExporter(settings.TRACE_EXPORT_PATH, settings.TRACE_MIN_DURATION_MS)
+    return _exporter
+
+
+def _reset(token):
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Async generator bị đóng từ context khác (vd: client ngắt kết nối)
+        pass
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Span]:
+    """
+    Bắt đầu trace cho một request, export khi kết thúc
+    
+    Args:
+        name: Tên root span
+        attributes: Attributes của root span
+    
+    Yields:
+        Root span (span rỗng khi tracing tắt)
+    """
+    exporter = get_exporter()
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+    
+    trace = Trace(name, **attributes)
+    token = _current_span.set(trace.root)
+    try:
+        yield trace.root
+    except BaseException as e:
+        trace.root.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        trace.root.end = time.perf_counter()
+        _reset(token)
+        exporter.export(trace)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Span con của span hiện tại (không làm gì nếu không có trace đang chạy)
+    
+    Args:
+        name: Tên span
+        attributes: Attributes ban đầu
+    
+    Yields:
+        Span mới (hoặc span rỗng)
+    """
+    parent = _current_span.get()
+    if parent is None or parent.trace is None:
+        yield NOOP_SPAN
+        return
+    
+    child = Span(parent.trace, name, parent.span_id, **attributes)
+    parent.trace.spans.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _reset(token)
+
+
+def record_span(name: str, started: float, **attributes):
+    """
+    Ghi một span con đã kết thúc (bắt đầu từ started, kết thúc lúc gọi) - dùng cho các stage đã tự đo thời gian
+    
+    Args:
+        name: Tên span
+        started: time.perf_counter() lúc bắt đầu
+        attributes: Attributes của span
+    """
+    parent = _current_span.get()
+    if parent is None or parent.trace is None:
+        return
+    child = Span(parent.trace, name, parent.span_id, **attributes)
+    child.start = started
+    child.end = time.perf_counter()
+    parent.trace.spans.append(child)
+
+
+def traced(name: str) -> Callable:
+    """Decorator chạy cả hàm (sync) trong một span"""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(timings: Dict) -> str:
+    """
+    Header Server-Timing từ dict {stage: ms} (các giá trị không phải số được đưa vào desc)
+    
+    Args:
+        timings: Thời gian (ms) từng stage
+    
+    Returns:
+        Giá trị header, vd: 'embed;dur=3.1, dense;dur=1.8, rerank;desc="timeout"'
+    """
+    parts = []
+    for name, value in timings.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            parts.append(f"{name};dur={value}")
+        elif value is not None:
+            parts.append(f'{name};desc="{str(value).replace(chr(34), "")}"')
+    return ", ".join(parts)
@@ -3,10 +3,24 @@ Vector Store Module - Quản lý ChromaDB và embeddings
 """
 import chromadb
 from chromadb.config import Settings as ChromaSettings
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple
+from itertools import islice
+from pathlib import Path
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
+import numpy as np
 from config import settings
+from cache import LRUCache, QueryEmbeddingCache
+from embedding_backend import EmbeddingBackend, configured_backend_name, load_embedding_backend
+from embedding_batcher import EmbeddingBatcher
+from metrics import INGEST_STAGE_SECONDS, RAG_STAGE_SECONDS, RERANK_RESULTS
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from reranker import Reranker
+from tracing import record_span, traced
 
 logger = logging.getLogger(__name__)
 
@@ -19,9 +33,56 @@ class VectorStore:
     def __init__(self):
         """Khởi tạo ChromaDB client và embedding model"""
         try:
-            # Khởi tạo embedding model
-            logger.info(f"Đang load embedding model: {settings.EMBEDDING_MODEL}")
-            self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+            # Cache embedding cho query (optional)
+            self.embedding_cache: Optional[QueryEmbeddingCache] = None
+            if settings.ENABLE_EMBEDDING_CACHE:
+                self.embedding_cache = QueryEmbeddingCache(
+                    model_name=settings.EMBEDDING_MODEL,
+                    max_bytes=settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+                    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+                    disk_path=settings.EMBEDDING_CACHE_DISK_PATH
+                )
+            
+            # Gộp query embeddings của các request đồng thời (optional)
+            self.query_batcher: Optional[EmbeddingBatcher] = None
+            if settings.ENABLE_QUERY_BATCHING:
+                self.query_batcher = EmbeddingBatcher(
+                    self.embed_batch,
+                    max_batch_size=settings.QUERY_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.QUERY_BATCH_MAX_WAIT_MS
+                )
+            
+            # Cache kết quả query ChromaDB, invalidate theo collection_version
+            # (đồng bộ giữa các workers qua file version, xem _sync_collection_version)
+            self.collection_version = 0
+            self._version_stat = self._read_version_stat()
+            self.retrieval_cache: Optional[LRUCache] = None
+            if settings.ENABLE_RETRIEVAL_CACHE:
+                self.retrieval_cache = LRUCache(
+                    max_bytes=settings.RETRIEVAL_CACHE_MAX_MB * 1024 * 1024,
+                    ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+                    sizeof=self._sizeof_results
+                )
+            
+            # Shadow collection đang được build (blue/green rebuild)
+            self._swap_lock = threading.Lock()
+            self.shadow_collection = None
+            self._shadow_model: Optional[EmbeddingBackend] = None
+            self._shadow_model_name: Optional[str] = None
+            
+            # Cross-encoder rerank (optional)
+            self.reranker: Optional[Reranker] = None
+            if settings.ENABLE_RERANK:
+                self.reranker = Reranker(
+                    settings.RERANK_MODEL,
+                    max_length=settings.RERANK_MAX_LENGTH,
+                    timeout_ms=settings.RERANK_TIMEOUT_MS,
+                    max_concurrent=settings.RERANK_MAX_CONCURRENT
+                )
+            
+            # BM25 index đi kèm collection active / shadow (hybrid search)
+            self.lexical_index: Optional[LexicalIndex] = None
+            self.shadow_lexical_index: Optional[LexicalIndex] = None
             
             # Khởi tạo ChromaDB client với persistent storage
             logger.info(f"Đang kết nối ChromaDB: {settings.CHROMA_PERSIST_DIRECTORY}")
@@ -33,18 +94,453 @@ class VectorStore:
                 )
             )
             
-            # Lấy hoặc tạo collection
+            # Lấy hoặc tạo collection đang active (theo alias)
+            self._alias_mtime = self._alias_stat()
+            active_name = self._read_alias() or settings.CHROMA_COLLECTION_NAME
+            # Metadata chỉ được ghi khi tạo mới, collection đã có giữ nguyên model / backend cũ
             self.collection = self.client.get_or_create_collection(
-                name=settings.CHROMA_COLLECTION_NAME,
-                metadata={"hnsw:space": "cosine"}  # Sử dụng cosine similarity
+                name=active_name,
+                metadata=self._collection_metadata(settings.EMBEDDING_MODEL, configured_backend_name())
             )
+            self._gc_collections()
             
-            logger.info(f"✅ ChromaDB initialized - Collection: {settings.CHROMA_COLLECTION_NAME}")
+            # Query phải dùng đúng model + backend đã tạo vectors của collection active,
+            # model / backend mới trong settings chỉ được dùng sau khi rebuild xong
+            indexed_model = (self.collection.metadata or {}).get("embedding_model")
+            indexed_backend = self._indexed_backend(self.collection.metadata)
+            if indexed_model and indexed_model != settings.EMBEDDING_MODEL:
+                logger.warning(
+                    f"⚠️ Collection được index bằng {indexed_model}, khác EMBEDDING_MODEL="
+                    f"{settings.EMBEDDING_MODEL} - cần full reindex để chuyển model"
+                )
+            if indexed_backend != configured_backend_name():
+                logger.warning(
+                    f"⚠️ Collection được index bằng backend {indexed_backend}, khác cấu hình hiện tại "
+                    f"({configured_backend_name()}) - cần full reindex để chuyển backend"
+                )
+            self.load_embedding_model(indexed_model or settings.EMBEDDING_MODEL, indexed_backend)
+            
+            if settings.ENABLE_HYBRID_SEARCH:
+                self.lexical_index = self._open_lexical_index(self.collection)
+            self._activate(self.collection, self.embedding_model, self.embedding_model_name, self.lexical_index)
+            
+            logger.info(f"✅ ChromaDB initialized - Collection: {settings.CHROMA_COLLECTION_NAME} ({active_name})")
             
         except Exception as e:
             logger.error(f"❌ Lỗi khởi tạo VectorStore: {str(e)}")
             raise
     
+    def load_embedding_model(self, model_name: str, backend: Optional[str] = None):
+        """
+        Load embedding model và invalidate query embedding cache nếu model / backend thay đổi
+        
+        Args:
+            model_name: Tên sentence-transformers model
+            backend: sentence_transformers | onnx | onnx-int8 (mặc định theo cấu hình)
+        """
+        backend = backend or configured_backend_name()
+        logger.info(f"Đang load embedding model: {model_name} ({backend})")
+        self.embedding_model = load_embedding_backend(model_name, backend)
+        self.embedding_model_name = model_name
+        
+        if self.embedding_cache is not None:
+            self.embedding_cache.reset_model(self.embedding_model.cache_key)
+    
+    @property
+    def alias_path(self) -> Path:
+        """File alias trỏ tới collection vật lý đang active"""
+        return Path(settings.CHROMA_PERSIST_DIRECTORY) / f"{settings.CHROMA_COLLECTION_NAME}_alias.json"
+    
+    def _alias_stat(self) -> Optional[int]:
+        """mtime (ns) của file alias, None nếu chưa có"""
+        try:
+            return self.alias_path.stat().st_mtime_ns
+        except OSError:
+            return None
+    
+    def _read_alias(self) -> Optional[str]:
+        try:
+            return json.loads(self.alias_path.read_text(encoding="utf-8"))["active"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Alias {self.alias_path} không đọc được: {str(e)}")
+            return None
+    
+    def _write_alias(self, name: str):
+        """Ghi alias (atomic - ghi file tạm rồi rename)"""
+        self.alias_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.alias_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"active": name}), encoding="utf-8")
+        os.replace(tmp_path, self.alias_path)
+        self._alias_mtime = self._alias_stat()
+    
+    def _activate(self, collection, model: EmbeddingBackend, model_name: str, lexical_index: Optional[LexicalIndex]):
+        """
+        Đặt collection active cùng embedding model và BM25 index của nó
+        
+        Query đọc bộ ba này qua self._active (gán một lần), nên không bao giờ thấy
+        collection mới đi với model cũ hoặc ngược lại trong lúc swap.
+        """
+        if self.embedding_cache is not None and model is not self.embedding_model:
+            self.embedding_cache.reset_model(model.cache_key)
+        self.collection = collection
+        self.embedding_model = model
+        self.embedding_model_name = model_name
+        self.lexical_index = lexical_index
+        self._active = (collection, model, lexical_index)
+    
+    def sync_alias(self, force: bool = False) -> bool:
+        """
+        Chuyển sang collection mà alias đang trỏ tới nếu worker khác đã swap
+        
+        Mỗi uvicorn worker có VectorStore riêng; worker chạy reindex đổi alias rồi xóa
+        collection cũ, các worker khác phát hiện qua mtime của file alias (hoặc khi
+        query lỗi, với force=True) và mở collection mới cùng model đã index nó.
+        
+        Args:
+            force: Đọc lại alias kể cả khi mtime không đổi
+        
+        Returns:
+            True nếu đã chuyển collection
+        """
+        mtime = self._alias_stat()
+        if mtime == self._alias_mtime and not force:
+            return False
+        
+        with self._swap_lock:
+            self._alias_mtime = mtime
+            name = self._read_alias() or settings.CHROMA_COLLECTION_NAME
+            old = self.collection
+            if name == old.name:
+                return False
+            collection = self.client.get_collection(name)
+            model_name = (collection.metadata or {}).get("embedding_model") or self.embedding_model_name
+            backend = self._indexed_backend(collection.metadata)
+            model = self.embedding_model
+            if model_name != self.embedding_model_name or backend != model.backend_name:
+                logger.info(f"Đang load embedding model: {model_name} ({backend})")
+                model = load_embedding_backend(model_name, backend)
+            lexical_index = self._open_lexical_index(collection) if settings.ENABLE_HYBRID_SEARCH else None
+            self._activate(collection, model, model_name, lexical_index)
+            # Worker swap đã ghi file version, chỉ cần xóa cache của worker này
+            self.bump_collection_version(shared=False)
+        
+        logger.info(f"🔀 Alias đã đổi bởi worker khác, chuyển collection active: {old.name} -> {name}")
+        return True
+    
+    @staticmethod
+    def _collection_metadata(embedding_model: Optional[str] = None, embedding_backend: Optional[str] = None) -> Dict:
+        metadata = {"hnsw:space": "cosine"}  # Sử dụng cosine similarity
+        if embedding_model:
+            metadata["embedding_model"] = embedding_model
+        if embedding_backend:
+            metadata["embedding_backend"] = embedding_backend
+        return metadata
+    
+    @staticmethod
+    def _indexed_backend(metadata: Optional[Dict]) -> str:
+        """
+        Backend đã tạo vectors của collection (theo metadata)
+        
+        Collection có embedding_model mà thiếu embedding_backend được tạo trước khi ghi
+        backend vào metadata, lúc đó chỉ có sentence_transformers.
+        """
+        metadata = metadata or {}
+        if metadata.get("embedding_backend"):
+            return metadata["embedding_backend"]
+        return "sentence_transformers" if metadata.get("embedding_model") else configured_backend_name()
+    
+    @staticmethod
+    def _collection_generation(name: str) -> Optional[int]:
+        """
+        Thứ tự tạo của collection: 0 cho collection gốc, timestamp với các bản __v<ns>,
+        None nếu không phải collection của app
+        """
+        if name == settings.CHROMA_COLLECTION_NAME:
+            return 0
+        prefix = f"{settings.CHROMA_COLLECTION_NAME}__v"
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            return int(name[len(prefix):])
+        return None
+    
+    def _gc_collections(self):
+        """
+        Xóa các collection cũ hơn collection mà alias đang trỏ tới
+        
+        Alias được đọc lại từ file (worker khác có thể vừa swap). Collection mới hơn
+        được giữ nguyên: đó có thể là shadow mà worker khác đang build; shadow bị bỏ
+        dở sẽ được dọn sau lần swap thành công tiếp theo.
+        """
+        active = self._read_alias() or settings.CHROMA_COLLECTION_NAME
+        active_generation = self._collection_generation(active)
+        if active_generation is None:
+            return
+        
+        def is_stale(name: str) -> bool:
+            generation = self._collection_generation(name)
+            return generation is not None and generation < active_generation
+        
+        for collection in self.client.list_collections():
+            name = collection if isinstance(collection, str) else collection.name
+            if is_stale(name):
+                try:
+                    self.client.delete_collection(name)
+                    logger.info(f"🗑️ Đã dọn collection cũ: {name}")
+                except Exception as e:
+                    logger.warning(f"Không xóa được collection {name}: {str(e)}")
+        
+        # BM25 index của các collection đã bị xóa
+        for path in Path(settings.CHROMA_PERSIST_DIRECTORY).glob(f"{settings.CHROMA_COLLECTION_NAME}*_bm25.*"):
+            if is_stale(path.name.split("_bm25.")[0]):
+                path.unlink(missing_ok=True)
+    
+    @staticmethod
+    def _new_lexical_index(collection_name: str) -> LexicalIndex:
+        return LexicalIndex(
+            Path(settings.CHROMA_PERSIST_DIRECTORY) / f"{collection_name}_bm25",
+            k1=settings.BM25_K1,
+            b=settings.BM25_B,
+            max_df_ratio=settings.BM25_MAX_DF_RATIO,
+            max_term_postings=settings.BM25_MAX_TERM_POSTINGS,
+            log_max_docs=settings.BM25_LOG_MAX_CHUNKS
+        )
+    
+    def _open_lexical_index(self, collection) -> LexicalIndex:
+        """
+        Load BM25 index của collection, build lại từ ChromaDB trong background nếu
+        chưa có (bản cũ chưa có BM25) hoặc lệch số chunks với collection
+        """
+        index = self._new_lexical_index(collection.name)
+        loaded = index.load()
+        count = collection.count()
+        if len(index) == count and (loaded or count == 0):
+            logger.info(f"BM25 index: {count} chunks")
+            return index
+        
+        # Hybrid search chỉ dùng dense cho tới khi build xong
+        index.ready = False
+        threading.Thread(
+            target=self._rebuild_lexical_index,
+            args=(index, collection),
+            name="bm25-rebuild",
+            daemon=True
+        ).start()
+        return index
+    
+    @staticmethod
+    def _rebuild_lexical_index(index: LexicalIndex, collection, page_size: int = 5000):
+        """Build BM25 index từ toàn bộ chunks trong ChromaDB"""
+        try:
+            logger.info(f"Đang build BM25 index từ collection {collection.name}...")
+            start = time.perf_counter()
+            index.clear()
+            offset = 0
+            while True:
+                page = collection.get(include=["documents"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                index.add(page["ids"], page["documents"], persist=False)
+                offset += len(page["ids"])
+            index.snapshot()
+            index.ready = True
+            logger.info(f"✅ Đã build BM25 index: {offset} chunks ({time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi build BM25 index: {str(e)}")
+    
+    def _lexical_index_for(self, target) -> Optional[LexicalIndex]:
+        """BM25 index đi kèm collection (active hoặc shadow)"""
+        if target is self.collection:
+            return self.lexical_index
+        if target is self.shadow_collection:
+            return self.shadow_lexical_index
+        return None
+    
+    def create_shadow_collection(self):
+        """
+        Tạo shadow collection để rebuild toàn bộ mà không ảnh hưởng collection đang phục vụ
+        
+        Shadow được embed bằng EMBEDDING_MODEL + backend hiện tại trong settings; các lần
+        query vẫn đọc collection cũ cho tới khi gọi swap_collection.
+        
+        Returns:
+            ChromaDB collection mới (rỗng)
+        """
+        name = f"{settings.CHROMA_COLLECTION_NAME}__v{time.time_ns()}"
+        self.shadow_collection = self.client.create_collection(
+            name=name,
+            metadata=self._collection_metadata(settings.EMBEDDING_MODEL, configured_backend_name())
+        )
+        
+        if (
+            settings.EMBEDDING_MODEL == self.embedding_model_name
+            and configured_backend_name() == self.embedding_model.backend_name
+        ):
+            self._shadow_model = self.embedding_model
+        else:
+            logger.info(
+                f"Đang load embedding model cho rebuild: {settings.EMBEDDING_MODEL} ({configured_backend_name()})"
+            )
+            self._shadow_model = load_embedding_backend(settings.EMBEDDING_MODEL)
+        self._shadow_model_name = settings.EMBEDDING_MODEL
+        
+        if settings.ENABLE_HYBRID_SEARCH:
+            self.shadow_lexical_index = self._new_lexical_index(name)
+            self.shadow_lexical_index.destroy()
+        
+        logger.info(f"Tạo shadow collection: {name}")
+        return self.shadow_collection
+    
+    def swap_collection(self, shadow):
+        """
+        Chuyển alias sang shadow collection đã build xong và xóa collection cũ
+        
+        Args:
+            shadow: Collection trả về từ create_shadow_collection
+        """
+        if shadow is not self.shadow_collection:
+            raise ValueError(f"{shadow.name} không phải shadow collection hiện tại")
+        
+        # Snapshot BM25 trước khi đổi alias để worker khác mở được ngay
+        if self.shadow_lexical_index is not None:
+            self.shadow_lexical_index.snapshot()
+        
+        with self._swap_lock:
+            old = self.collection
+            old_lexical = self.lexical_index
+            self._write_alias(shadow.name)
+            self._activate(shadow, self._shadow_model, self._shadow_model_name, self.shadow_lexical_index)
+            self.shadow_lexical_index = None
+            self.shadow_collection = None
+            self._shadow_model = None
+            self._shadow_model_name = None
+            self.bump_collection_version()
+        
+        logger.info(f"🔀 Đã chuyển collection active: {old.name} -> {shadow.name}")
+        if old_lexical is not None:
+            old_lexical.destroy()
+        self._gc_collections()
+    
+    def discard_shadow_collection(self, shadow):
+        """Hủy shadow collection khi rebuild thất bại - collection active giữ nguyên"""
+        try:
+            self.client.delete_collection(shadow.name)
+        except Exception as e:
+            logger.warning(f"Không xóa được shadow collection {shadow.name}: {str(e)}")
+        if shadow is self.shadow_collection:
+            self.shadow_collection = None
+            self._shadow_model = None
+            self._shadow_model_name = None
+            if self.shadow_lexical_index is not None:
+                self.shadow_lexical_index.destroy()
+                self.shadow_lexical_index = None
+    
+    @property
+    def version_path(self) -> Path:
+        """File đánh dấu collection đã thay đổi, dùng chung cho mọi uvicorn worker"""
+        return Path(settings.CHROMA_PERSIST_DIRECTORY) / f"{settings.CHROMA_COLLECTION_NAME}_version"
+    
+    def _read_version_stat(self) -> Optional[Tuple[int, int]]:
+        """(inode, mtime ns) của file version, None nếu chưa có"""
+        try:
+            stat = self.version_path.stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+    
+    def bump_collection_version(self, shared: bool = True):
+        """
+        Đánh dấu collection đã thay đổi - các kết quả retrieval cũ không còn dùng được
+        
+        Args:
+            shared: Ghi lại file version để các worker khác cũng xóa retrieval cache
+        """
+        if shared:
+            try:
+                self.version_path.parent.mkdir(parents=True, exist_ok=True)
+                # Ghi file tạm rồi rename: inode mới nên stat luôn khác, kể cả khi mtime thô
+                tmp_path = self.version_path.with_suffix(".tmp")
+                tmp_path.write_text(str(time.time_ns()), encoding="utf-8")
+                os.replace(tmp_path, self.version_path)
+                self._version_stat = self._read_version_stat()
+            except OSError as e:
+                logger.warning(f"Không ghi được {self.version_path}: {str(e)}")
+        self.collection_version += 1
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
+    
+    def _sync_collection_version(self):
+        """
+        Xóa retrieval cache nếu worker khác đã thay đổi collection (upload / xóa / reindex)
+        
+        Mỗi lần lookup chỉ tốn một lần stat file version.
+        """
+        stat = self._read_version_stat()
+        if stat != self._version_stat:
+            self._version_stat = stat
+            self.bump_collection_version(shared=False)
+    
+    @staticmethod
+    def _sizeof_results(results: Tuple[List[str], List[Dict], List[float], List[str]]) -> int:
+        """Ước lượng bộ nhớ của một kết quả query"""
+        documents, metadatas, distances, ids = results
+        return (
+            sum(len(doc) * 2 for doc in documents)
+            + 256 * len(metadatas)
+            + 24 * len(distances)
+            + 64 * len(ids)
+        )
+    
+    def _retrieval_cache_key(
+        self,
+        collection,
+        query_embedding: List[float],
+        top_k: int,
+        filter_metadata: Optional[Dict]
+    ) -> Tuple:
+        embedding_hash = hashlib.sha1(
+            np.asarray(query_embedding, dtype=np.float32).tobytes()
+        ).hexdigest()
+        filter_key = json.dumps(filter_metadata, sort_keys=True) if filter_metadata else ""
+        return (embedding_hash, top_k, filter_key, collection.name, self.collection_version)
+    
+    def _query_collection(
+        self,
+        collection,
+        query_embedding: List[float],
+        top_k: int,
+        filter_metadata: Optional[Dict]
+    ) -> Tuple[List[str], List[Dict], List[float], List[str]]:
+        """
+        Query ChromaDB, dùng retrieval cache nếu collection chưa thay đổi
+        
+        Returns:
+            Tuple of (documents, metadatas, distances, ids) chưa lọc threshold
+        """
+        cache_key = None
+        if self.retrieval_cache is not None:
+            self._sync_collection_version()
+            cache_key = self._retrieval_cache_key(collection, query_embedding, top_k, filter_metadata)
+            cached = self.retrieval_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=top_k,
+            where=filter_metadata
+        )
+        
+        documents = results['documents'][0] if results['documents'] else []
+        metadatas = results['metadatas'][0] if results['metadatas'] else []
+        distances = results['distances'][0] if results['distances'] else []
+        ids = results['ids'][0] if results['ids'] else []
+        
+        if cache_key is not None:
+            self.retrieval_cache.set(cache_key, (documents, metadatas, distances, ids))
+        
+        return documents, metadatas, distances, ids
+    
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
         """
         Tạo embeddings cho list of texts
@@ -56,16 +552,57 @@ class VectorStore:
             List of embeddings (vectors)
         """
         try:
-            embeddings = self.embedding_model.encode(
-                texts,
-                convert_to_numpy=True,
-                show_progress_bar=False
-            )
-            return embeddings.tolist()
+            return self.embedding_model.encode(texts, batch_size=settings.EMBEDDING_BATCH_SIZE).tolist()
         except Exception as e:
             logger.error(f"Lỗi khi tạo embeddings: {str(e)}")
             raise
     
+    def embed_batch(
+        self,
+        texts: List[str],
+        model: Optional[EmbeddingBackend] = None
+    ) -> np.ndarray:
+        """
+        Tạo embeddings cho một batch texts, giữ nguyên dạng numpy
+        
+        Args:
+            texts: Danh sách các đoạn text cần embed
+            model: Model dùng để embed (mặc định model của collection active)
+            
+        Returns:
+            Ma trận embeddings float32 (len(texts) x dim)
+        """
+        return (model or self.embedding_model).encode(texts, batch_size=settings.EMBEDDING_BATCH_SIZE)
+    
+    def embed_query(self, query: str, model: Optional[EmbeddingBackend] = None) -> List[float]:
+        """
+        Tạo embedding cho câu query, dùng cache nếu có
+        
+        Args:
+            query: Câu query
+            model: Model của collection sẽ query (mặc định model active)
+            
+        Returns:
+            Embedding vector
+        """
+        if model is not None and model is not self.embedding_model:
+            # Model của collection vừa bị swap: cache và batcher đã thuộc model mới
+            return self.embed_batch([query], model)[0].tolist()
+        
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(query)
+            if cached is not None:
+                return cached.tolist()
+        
+        if self.query_batcher is not None:
+            embedding = self.query_batcher.embed(query)
+        else:
+            embedding = self.embed_batch([query])[0]
+        
+        if self.embedding_cache is not None:
+            self.embedding_cache.set(query, embedding)
+        return embedding.tolist()
+    
     def add_documents(
         self,
         texts: List[str],
@@ -92,81 +629,355 @@ class VectorStore:
                 import uuid
                 ids = [str(uuid.uuid4()) for _ in range(len(texts))]
             
-            # Tạo embeddings
-            logger.info(f"Đang tạo embeddings cho {len(texts)} chunks...")
-            embeddings = self.embed_texts(texts)
+            return self.add_documents_stream(zip(texts, metadatas, ids))
             
-            # Thêm vào ChromaDB
-            self.collection.add(
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
+        except Exception as e:
+            logger.error(f"Lỗi khi thêm documents: {str(e)}")
+            raise
+    
+    def add_documents_stream(
+        self,
+        chunks: Iterable[Tuple[str, Dict, str]],
+        progress_callback: Optional[Callable[[str, int, Optional[int]], None]] = None,
+        collection=None
+    ) -> int:
+        """
+        Thêm documents theo từng batch - embed và ghi ChromaDB mỗi INGEST_BATCH_SIZE chunks
+        
+        Bộ nhớ chỉ giữ embeddings của một batch, embeddings được truyền thẳng
+        dạng numpy array vào ChromaDB (không convert sang Python list).
+        
+        Args:
+            chunks: Iterable of (text, metadata, id)
+            progress_callback: Callback (stage, done, total) cho stages embed/store
+            collection: Ghi vào shadow collection thay vì collection active
+            
+        Returns:
+            Số lượng documents đã thêm
+        """
+        try:
+            total = 0
+            target, model = self.resolve_write_target(collection)
+            start = time.perf_counter()
+            
+            for batch in self._batched(chunks, settings.INGEST_BATCH_SIZE):
+                # Tạo embeddings cho batch
+                started = time.perf_counter()
+                embeddings = self.embed_batch([chunk[0] for chunk in batch], model)
+                INGEST_STAGE_SECONDS.labels("embed").observe(time.perf_counter() - started)
+                if progress_callback:
+                    progress_callback("embed", total + len(batch), None)
+                
+                started = time.perf_counter()
+                self.upsert_batch(target, batch, embeddings)
+                INGEST_STAGE_SECONDS.labels("store").observe(time.perf_counter() - started)
+                total += len(batch)
+                if progress_callback:
+                    progress_callback("store", total, None)
+                logger.info(f"Đã embed và lưu {total} chunks...")
             
-            logger.info(f"✅ Đã thêm {len(texts)} documents vào vector store")
-            return len(texts)
+            if progress_callback:
+                progress_callback("embed", total, total)
+                progress_callback("store", total, total)
+            
+            if total:
+                # Shadow chưa được đọc nên không cần invalidate retrieval cache
+                if collection is None:
+                    self.bump_collection_version()
+                elapsed = time.perf_counter() - start
+                logger.info(
+                    f"✅ Đã thêm {total} documents vào vector store "
+                    f"({total / elapsed:.1f} chunks/s)"
+                )
+            return total
             
         except Exception as e:
             logger.error(f"Lỗi khi thêm documents: {str(e)}")
             raise
     
+    def resolve_write_target(
+        self,
+        collection=None
+    ) -> Tuple[object, Optional[EmbeddingBackend]]:
+        """
+        Chọn collection để ghi và model để embed
+        
+        Args:
+            collection: Shadow collection đang rebuild, None = collection active
+            
+        Returns:
+            Tuple of (collection, model) - collection active đi cùng model đã index nó
+        """
+        if collection is None:
+            self.sync_alias()
+            active, model, _ = self._active
+            return active, model
+        if collection is not self.shadow_collection:
+            raise ValueError(f"{collection.name} không phải shadow collection hiện tại")
+        return collection, self._shadow_model
+    
+    def upsert_batch(self, target, batch: List[Tuple[str, Dict, str]], embeddings: np.ndarray):
+        """
+        Ghi một batch (text, metadata, id) đã embed vào collection và BM25 index đi kèm
+        
+        Upsert để chạy lại cùng IDs không bị lỗi trùng.
+        """
+        texts = [chunk[0] for chunk in batch]
+        ids = [chunk[2] for chunk in batch]
+        target.upsert(
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=[chunk[1] for chunk in batch],
+            ids=ids
+        )
+        
+        lexical_index = self._lexical_index_for(target)
+        if lexical_index is not None:
+            lexical_index.add(ids, texts)
+    
+    @staticmethod
+    def _batched(items: Iterable, size: int) -> Iterator[list]:
+        """Chia iterable thành các batch có tối đa size phần tử"""
+        iterator = iter(items)
+        while True:
+            batch = list(islice(iterator, size))
+            if not batch:
+                return
+            yield batch
+    
+    @traced("similarity_search")
     def similarity_search(
         self,
         query: str,
         top_k: int = None,
-        filter_metadata: Optional[Dict] = None
-    ) -> Tuple[List[str], List[Dict], List[float]]:
+        filter_metadata: Optional[Dict] = None,
+        include_ids: bool = False,
+        timings: Optional[Dict] = None
+    ) -> Tuple:
         """
-        Tìm kiếm semantic similarity
+        Tìm kiếm semantic similarity, kết hợp BM25 nếu bật hybrid search
+        
+        Nếu bật rerank: lấy RERANK_CANDIDATES ứng viên rồi giữ top_k theo điểm cross-encoder.
         
         Args:
             query: Câu query cần tìm
             top_k: Số lượng kết quả trả về
             filter_metadata: Filter theo metadata
+            include_ids: Trả thêm IDs của các chunks
+            timings: Dict nhận thời gian (ms) từng stage: embed, lexical, dense, fuse, rerank
             
         Returns:
-            Tuple of (documents, metadatas, distances)
+            Tuple of (documents, metadatas, similarities), thêm ids nếu include_ids
         """
+        if timings is None:
+            timings = {}
+        search_started = time.perf_counter()
+        
         try:
             if top_k is None:
                 top_k = settings.TOP_K_RESULTS
             
-            # Tạo embedding cho query
-            query_embedding = self.embed_texts([query])[0]
+            # Over-fetch ứng viên cho cross-encoder
+            reranker = self.reranker
+            candidate_k = max(top_k, settings.RERANK_CANDIDATES) if reranker else top_k
             
-            # Query ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                where=filter_metadata
-            )
-            
-            # Parse results
-            documents = results['documents'][0] if results['documents'] else []
-            metadatas = results['metadatas'][0] if results['metadatas'] else []
-            distances = results['distances'][0] if results['distances'] else []
+            # Worker khác đã swap collection thì chuyển theo trước khi query
+            self.sync_alias()
+            active = self._active
+            try:
+                filtered_results = self._search_candidates(active, query, candidate_k, filter_metadata, timings)
+            except Exception:
+                # Collection vừa bị swap và xóa trong lúc query (bởi worker này hoặc
+                # worker khác) - đọc lại alias rồi thử lại trên collection mới
+                if not self.sync_alias(force=True) and self._active is active:
+                    raise
+                filtered_results = self._search_candidates(
+                    self._active, query, candidate_k, filter_metadata, timings
+                )
             
-            # Filter theo similarity threshold
-            filtered_results = []
-            for doc, meta, dist in zip(documents, metadatas, distances):
-                # ChromaDB trả về distance (càng nhỏ càng giống)
-                # Convert sang similarity score (1 - distance)
-                similarity = 1 - dist
-                if similarity >= settings.SIMILARITY_THRESHOLD:
-                    filtered_results.append((doc, meta, similarity))
+            if reranker and len(filtered_results) > 1:
+                started = time.perf_counter()
+                order, status = reranker.rerank(query, [result[0] for result in filtered_results])
+                if order is not None:
+                    filtered_results = [filtered_results[i] for i in order]
+                self._record_stage(timings, "rerank", started)
+                timings["rerank_status"] = status
+                RERANK_RESULTS.labels(status).inc()
+            filtered_results = filtered_results[:top_k]
+            RAG_STAGE_SECONDS.labels("retrieve").observe(time.perf_counter() - search_started)
             
             if filtered_results:
-                docs, metas, sims = zip(*filtered_results)
+                docs, metas, sims, doc_ids = (list(col) for col in zip(*filtered_results))
                 logger.info(f"Tìm thấy {len(docs)} relevant documents")
-                return list(docs), list(metas), list(sims)
             else:
                 logger.info("Không tìm thấy documents phù hợp")
-                return [], [], []
+                docs, metas, sims, doc_ids = [], [], [], []
+            
+            return (docs, metas, sims, doc_ids) if include_ids else (docs, metas, sims)
                 
         except Exception as e:
             logger.error(f"Lỗi khi search: {str(e)}")
-            return [], [], []
+            return ([], [], [], []) if include_ids else ([], [], [])
+    
+    def _search_candidates(
+        self,
+        active: Tuple,
+        query: str,
+        candidate_k: int,
+        filter_metadata: Optional[Dict],
+        timings: Dict
+    ) -> List[Tuple[str, Dict, float, str]]:
+        """
+        Embed query, tìm dense (+ BM25) trên một snapshot collection active
+        
+        Args:
+            active: (collection, embedding model, BM25 index) lấy từ self._active
+            query: Câu query
+            candidate_k: Số ứng viên trả về
+            filter_metadata: Filter theo metadata
+            timings: Dict nhận thời gian (ms) từng stage
+        
+        Returns:
+            List of (document, metadata, similarity, id) đã lọc threshold
+        """
+        collection, model, lexical_index = active
+        
+        # Tạo embedding cho query
+        started = time.perf_counter()
+        query_embedding = self.embed_query(query, model)
+        self._record_stage(timings, "embed", started)
+        
+        # BM25 chỉ dùng khi index đã build xong
+        lexical = None
+        fetch_k = candidate_k
+        if lexical_index is not None and lexical_index.ready:
+            started = time.perf_counter()
+            fetch_k = max(candidate_k, settings.HYBRID_CANDIDATES)
+            lexical = lexical_index.search(query, fetch_k)
+            self._record_stage(timings, "lexical", started)
+        
+        # Query ChromaDB (hoặc lấy từ retrieval cache)
+        started = time.perf_counter()
+        documents, metadatas, distances, ids = self._query_collection(
+            collection,
+            query_embedding,
+            fetch_k,
+            filter_metadata
+        )
+        self._record_stage(timings, "dense", started)
+        
+        if lexical:
+            started = time.perf_counter()
+            filtered_results = self._fuse_results(
+                collection,
+                query_embedding,
+                list(zip(documents, metadatas, distances, ids)),
+                lexical,
+                candidate_k,
+                filter_metadata
+            )
+            self._record_stage(timings, "fuse", started)
+            return filtered_results
+        
+        # Filter theo similarity threshold
+        filtered_results = []
+        for doc, meta, dist, doc_id in zip(documents[:candidate_k], metadatas, distances, ids):
+            # ChromaDB trả về distance (càng nhỏ càng giống)
+            # Convert sang similarity score (1 - distance)
+            similarity = 1 - dist
+            if similarity >= settings.SIMILARITY_THRESHOLD:
+                filtered_results.append((doc, meta, similarity, doc_id))
+        return filtered_results
+    
+    @staticmethod
+    def _record_stage(timings: Dict, stage: str, started: float):
+        """Ghi thời gian một stage retrieval vào timings (ms) và histogram /metrics"""
+        elapsed = time.perf_counter() - started
+        timings[stage] = round(elapsed * 1000, 2)
+        RAG_STAGE_SECONDS.labels(stage).observe(elapsed)
+        record_span(stage, started)
+    
+    def _fuse_results(
+        self,
+        collection,
+        query_embedding: List[float],
+        dense: List[Tuple[str, Dict, float, str]],
+        lexical: List[Tuple[str, float]],
+        top_k: int,
+        filter_metadata: Optional[Dict]
+    ) -> List[Tuple[str, Dict, float, str]]:
+        """
+        Gộp kết quả dense và BM25 bằng Reciprocal Rank Fusion
+        
+        Chunk được giữ nếu đạt SIMILARITY_THRESHOLD, hoặc nằm trong top_k của BM25
+        (khớp chính xác từ khóa mà embedding bỏ sót) và đạt HYBRID_LEXICAL_MIN_SIMILARITY -
+        câu hỏi lạc đề chỉ trùng một từ với tài liệu không được chèn context. Chunks chỉ có trong BM25 được
+        đọc từ ChromaDB, similarity tính từ embedding đã lưu. Kết quả được lưu vào
+        retrieval cache để query lặp lại không phải đọc lại các chunks này.
+        
+        Args:
+            collection: Collection đã query dense
+            query_embedding: Embedding của query
+            dense: Kết quả dense (document, metadata, distance, id) chưa lọc threshold
+            lexical: Kết quả BM25 (id, score)
+            top_k: Số kết quả trả về
+            filter_metadata: Filter theo metadata (áp dụng cho chunks từ BM25)
+            
+        Returns:
+            List of (document, metadata, similarity, id) theo thứ tự RRF
+        """
+        lexical_ids = [doc_id for doc_id, _ in lexical]
+        
+        cache_key = None
+        if self.retrieval_cache is not None:
+            self._sync_collection_version()
+            # Kết quả BM25 phụ thuộc cả text query và trạng thái index, nên đưa vào key
+            lexical_hash = hashlib.sha1("\0".join(lexical_ids).encode("utf-8")).hexdigest()
+            cache_key = ("fused", lexical_hash) + self._retrieval_cache_key(
+                collection, query_embedding, top_k, filter_metadata
+            )
+            cached = self.retrieval_cache.get(cache_key)
+            if cached is not None:
+                return list(zip(*cached))
+        
+        records = {doc_id: (doc, meta, 1 - dist) for doc, meta, dist, doc_id in dense}
+        missing = [doc_id for doc_id in lexical_ids if doc_id not in records]
+        if missing:
+            fetched = collection.get(
+                ids=missing,
+                where=filter_metadata,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_vector /= np.linalg.norm(query_vector) or 1.0
+            for doc_id, doc, meta, embedding in zip(
+                fetched["ids"], fetched["documents"], fetched["metadatas"], fetched["embeddings"]
+            ):
+                embedding = np.asarray(embedding, dtype=np.float32)
+                similarity = float(embedding @ query_vector / (np.linalg.norm(embedding) or 1.0))
+                records[doc_id] = (doc, meta, similarity)
+        
+        lexical_top = set(lexical_ids[:top_k])
+        results = []
+        for doc_id, _ in reciprocal_rank_fusion([[d[3] for d in dense], lexical_ids], settings.HYBRID_RRF_K):
+            record = records.get(doc_id)
+            # Chunk không còn trong collection (đã xóa) hoặc bị filter loại
+            if record is None:
+                continue
+            doc, meta, similarity = record
+            if similarity >= settings.SIMILARITY_THRESHOLD or (
+                doc_id in lexical_top and similarity >= settings.HYBRID_LEXICAL_MIN_SIMILARITY
+            ):
+                results.append((doc, meta, similarity, doc_id))
+                if len(results) == top_k:
+                    break
+        
+        if cache_key is not None:
+            self.retrieval_cache.set(
+                cache_key,
+                tuple(list(col) for col in zip(*results)) if results else ([], [], [], [])
+            )
+        return results
     
     def get_stats(self) -> Dict:
         """
@@ -181,7 +992,16 @@ class VectorStore:
             return {
                 "total_documents": count,
                 "total_chunks": count,  # Mỗi document là 1 chunk
-                "collection_name": settings.CHROMA_COLLECTION_NAME
+                "collection_name": settings.CHROMA_COLLECTION_NAME,
+                "active_collection": self.collection.name,
+                "embedding_model": self.embedding_model_name,
+                "embedding_backend": self.embedding_model.backend_name,
+                "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+                "retrieval_cache": self.retrieval_cache.stats() if self.retrieval_cache else None,
+                "lexical_index": self.lexical_index.stats() if self.lexical_index else None,
+                "reranker": self.reranker.stats() if self.reranker else None,
+                "query_batcher": self.query_batcher.stats() if self.query_batcher else None,
+                "collection_version": self.collection_version
             }
         except Exception as e:
             logger.error(f"Lỗi khi lấy stats: {str(e)}")
@@ -191,17 +1011,62 @@ class VectorStore:
                 "collection_name": settings.CHROMA_COLLECTION_NAME
             }
     
+    def get_document_chunk_ids(self, document_id: str) -> List[str]:
+        """
+        Lấy IDs của tất cả chunks thuộc một document
+        
+        Args:
+            document_id: document_id trong metadata
+            
+        Returns:
+            List of chunk IDs
+        """
+        results = self.collection.get(where={"document_id": document_id}, include=[])
+        return results["ids"]
+    
+    def delete_documents(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None
+    ):
+        """
+        Xóa chunks theo IDs hoặc metadata filter
+        
+        Args:
+            ids: IDs cần xóa
+            where: Metadata filter (vd: {"document_id": "..."})
+        """
+        try:
+            if not ids and not where:
+                return
+            if where and self.lexical_index is not None:
+                ids = self.collection.get(ids=ids, where=where, include=[])["ids"]
+                if not ids:
+                    return
+            self.collection.delete(ids=ids, where=where)
+            if self.lexical_index is not None:
+                self.lexical_index.remove(ids)
+            self.bump_collection_version()
+        except Exception as e:
+            logger.error(f"Lỗi khi xóa documents: {str(e)}")
+            raise
+    
     def delete_collection(self):
-        """Xóa collection (dùng cho reset/reindex)"""
+        """Xóa toàn bộ dữ liệu của collection active (reindex dùng shadow collection thay vì hàm này)"""
         try:
-            self.client.delete_collection(settings.CHROMA_COLLECTION_NAME)
-            logger.info(f"Đã xóa collection: {settings.CHROMA_COLLECTION_NAME}")
+            name = self.collection.name
+            self.client.delete_collection(name)
+            logger.info(f"Đã xóa collection: {name}")
             
             # Tạo lại collection
-            self.collection = self.client.get_or_create_collection(
-                name=settings.CHROMA_COLLECTION_NAME,
-                metadata={"hnsw:space": "cosine"}
+            collection = self.client.get_or_create_collection(
+                name=name,
+                metadata=self._collection_metadata(self.embedding_model_name, self.embedding_model.backend_name)
             )
+            self._activate(collection, self.embedding_model, self.embedding_model_name, self.lexical_index)
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
+            self.bump_collection_version()
         except Exception as e:
             logger.error(f"Lỗi khi xóa collection: {str(e)}")
             raise
@@ -7,15 +7,17 @@ import ChatMessage from './components/ChatMessage';
 import ChatInput from './components/ChatInput';
 import TypingIndicator from './components/TypingIndicator';
 import UploadModal from './components/UploadModal';
-import { streamMessage } from './services/api';
+import { createSession, deleteSession, streamMessage } from './services/api';
 import { MessageSquare } from 'lucide-react';
 
 function App() {
   const [messages, setMessages] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [streamingMessage, setStreamingMessage] = useState('');
+  const [streamingSources, setStreamingSources] = useState([]);
   const [isStreaming, setIsStreaming] = useState(false);
   const [showUploadModal, setShowUploadModal] = useState(false);
+  const [sessionId, setSessionId] = useState(() => localStorage.getItem('chatSessionId'));
   const messagesEndRef = useRef(null);
 
   // Auto scroll to bottom
@@ -46,6 +48,15 @@ function App() {
     }
   }, [messages]);
 
+  // Lịch sử hội thoại lưu trên backend theo session
+  const ensureSession = async (forceNew = false) => {
+    if (sessionId && !forceNew) return sessionId;
+    const session = await createSession();
+    localStorage.setItem('chatSessionId', session.session_id);
+    setSessionId(session.session_id);
+    return session.session_id;
+  };
+
   const handleSendMessage = async (messageText) => {
     // Add user message
     const userMessage = {
@@ -57,26 +68,42 @@ function App() {
     setMessages((prev) => [...prev, userMessage]);
     setIsLoading(true);
     setStreamingMessage('');
+    setStreamingSources([]);
     setIsStreaming(true);
 
     try {
       let fullResponse = '';
+      let stats = null;
+      let sources = [];
+      const onChunk = (chunk) => {
+        fullResponse += chunk;
+        setStreamingMessage(fullResponse);
+      };
+      const onDone = (doneStats) => {
+        stats = doneStats;
+      };
+      const onSources = (streamSources) => {
+        sources = streamSources;
+        setStreamingSources(streamSources);
+      };
 
-      await streamMessage(
-        messageText,
-        messages,
-        true,
-        (chunk) => {
-          fullResponse += chunk;
-          setStreamingMessage(fullResponse);
-        }
-      );
+      let currentSession = await ensureSession();
+      try {
+        await streamMessage(messageText, [], true, onChunk, currentSession, onDone, onSources);
+      } catch (error) {
+        if (error.status !== 404) throw error;
+        // Session đã hết hạn trên backend - bắt đầu session mới
+        currentSession = await ensureSession(true);
+        await streamMessage(messageText, [], true, onChunk, currentSession, onDone, onSources);
+      }
 
       // Add assistant message
       const assistantMessage = {
         role: 'assistant',
         content: fullResponse,
         timestamp: new Date().toISOString(),
+        stats,
+        sources,
       };
 
       setMessages((prev) => [...prev, assistantMessage]);
@@ -104,6 +131,11 @@ function App() {
       setMessages([]);
       setStreamingMessage('');
       localStorage.removeItem('chatMessages');
+      if (sessionId) {
+        deleteSession(sessionId).catch((e) => console.error('Error deleting session:', e));
+        localStorage.removeItem('chatSessionId');
+        setSessionId(null);
+      }
     }
   };
 
@@ -158,6 +190,8 @@ function App() {
                 key={index}
                 message={message.content}
                 isUser={message.role === 'user'}
+                stats={message.stats}
+                sources={message.sources}
               />
             ))}
 
@@ -167,6 +201,7 @@ function App() {
                 message={streamingMessage}
                 isUser={false}
                 isStreaming={true}
+                sources={streamingSources}
               />
             )}
 
@@ -6,7 +6,23 @@ import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 import { User, Bot } from 'lucide-react';
 
-const ChatMessage = ({ message, isUser, isStreaming = false }) => {
+/**
+ * Dòng thời gian xử lý từ event cuối của stream (ms)
+ */
+const formatStats = (stats) => {
+  const { timings = {}, completion_tokens: completionTokens } = stats;
+  const parts = [];
+  if (stats.semantic_cache) parts.push('cache');
+  if (timings.ttft !== undefined) parts.push(`token đầu ${Math.round(timings.ttft)}ms`);
+  if (timings.embed !== undefined) parts.push(`embed ${Math.round(timings.embed)}ms`);
+  if (timings.dense !== undefined) parts.push(`search ${Math.round(timings.dense)}ms`);
+  if (timings.llm !== undefined) parts.push(`LLM ${Math.round(timings.llm)}ms`);
+  if (timings.total !== undefined) parts.push(`tổng ${Math.round(timings.total)}ms`);
+  if (completionTokens) parts.push(`${completionTokens} tokens`);
+  return parts.join(' · ');
+};
+
+const ChatMessage = ({ message, isUser, isStreaming = false, stats = null, sources = [] }) => {
   return (
     <div className={`flex gap-3 ${isUser ? 'justify-end' : 'justify-start'} mb-4`}>
       {!isUser && (
@@ -26,12 +42,25 @@ const ChatMessage = ({ message, isUser, isStreaming = false }) => {
           <p className="whitespace-pre-wrap">{message}</p>
         ) : (
           <div className="markdown-content">
+            {sources && sources.length > 0 && (
+              <div className="mb-2 pb-2 border-b border-gray-100 text-sm">
+                <p className="font-semibold">📚 Nguồn tham khảo:</p>
+                <ul className="list-disc pl-5">
+                  {sources.map((source) => (
+                    <li key={source}>{source}</li>
+                  ))}
+                </ul>
+              </div>
+            )}
             <ReactMarkdown remarkPlugins={[remarkGfm]}>
               {message}
             </ReactMarkdown>
             {isStreaming && (
               <span className="inline-block w-2 h-4 ml-1 bg-primary-600 animate-pulse" />
             )}
+            {stats && (
+              <p className="mt-2 text-xs text-gray-400">{formatStats(stats)}</p>
+            )}
           </div>
         )}
       </div>
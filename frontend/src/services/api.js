@@ -5,10 +5,15 @@ import axios from 'axios';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+// Key gửi kèm mọi request khi backend bật ENABLE_API_KEY_AUTH (/documents/* luôn cần key)
+const API_KEY = import.meta.env.VITE_API_KEY;
+const authHeaders = API_KEY ? { 'X-API-Key': API_KEY } : {};
+
 const api = axios.create({
   baseURL: API_BASE_URL,
   headers: {
     'Content-Type': 'application/json',
+    ...authHeaders,
   },
 });
 
@@ -21,60 +26,103 @@ export const healthCheck = async () => {
 };
 
 /**
- * Gửi tin nhắn chat (non-streaming)
+ * Tạo chat session - backend lưu lịch sử hội thoại theo session_id
  */
-export const sendMessage = async (message, conversationHistory = [], useRag = true) => {
-  const response = await api.post('/chat', {
-    message,
-    conversation_history: conversationHistory,
-    use_rag: useRag,
-  });
+export const createSession = async () => {
+  const response = await api.post('/sessions');
   return response.data;
 };
 
+/**
+ * Xóa chat session
+ */
+export const deleteSession = async (sessionId) => {
+  const response = await api.delete(`/sessions/${sessionId}`);
+  return response.data;
+};
+
+/**
+ * Body của chat request - có session thì chỉ gửi câu hỏi mới
+ */
+const chatBody = (message, conversationHistory, useRag, sessionId) => (
+  sessionId
+    ? { message, session_id: sessionId, use_rag: useRag }
+    : { message, conversation_history: conversationHistory, use_rag: useRag }
+);
+
+/**
+ * Gửi tin nhắn chat (non-streaming)
+ */
+export const sendMessage = async (message, conversationHistory = [], useRag = true, sessionId = null) => {
+  const response = await api.post('/chat', chatBody(message, conversationHistory, useRag, sessionId));
+  // timings cùng dạng với event `done` của stream (retrieval, llm, total - ms)
+  return { ...response.data, timings: parseServerTiming(response.headers['server-timing']) };
+};
+
 /**
  * Gửi tin nhắn với streaming response
+ *
+ * onDone nhận event cuối của stream: { timings, prompt_tokens, completion_tokens, semantic_cache }
+ * onSources nhận danh sách nguồn tham khảo (event `sources`, gửi trước câu trả lời)
  */
-export const streamMessage = async (message, conversationHistory = [], useRag = true, onChunk) => {
+export const streamMessage = async (
+  message,
+  conversationHistory = [],
+  useRag = true,
+  onChunk,
+  sessionId = null,
+  onDone = null,
+  onSources = null,
+) => {
   try {
     const response = await fetch(`${API_BASE_URL}/chat/stream`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        ...authHeaders,
       },
-      body: JSON.stringify({
-        message,
-        conversation_history: conversationHistory,
-        use_rag: useRag,
-      }),
+      body: JSON.stringify({ ...chatBody(message, conversationHistory, useRag, sessionId), typed_events: true }),
     });
 
     if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
+      const error = new Error(`HTTP error! status: ${response.status}`);
+      error.status = response.status;
+      throw error;
     }
 
     const reader = response.body.getReader();
     const decoder = new TextDecoder();
+    let buffer = '';
 
     while (true) {
       const { done, value } = await reader.read();
       
       if (done) break;
 
-      const chunk = decoder.decode(value);
-      const lines = chunk.split('\n');
+      // Frame có thể bị cắt giữa hai lần read - giữ lại dòng chưa trọn
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
 
       for (const line of lines) {
+        // Bỏ qua dòng "event: ..." và heartbeat ": ping" - payload nằm trong data
         if (line.startsWith('data: ')) {
+          let data;
           try {
-            const data = JSON.parse(line.slice(6));
-            if (data.chunk) {
-              onChunk(data.chunk);
-            } else if (data.error) {
-              throw new Error(data.error);
-            }
+            data = JSON.parse(line.slice(6));
           } catch (e) {
             console.error('Error parsing SSE data:', e);
+            continue;
+          }
+          if (data.chunk) {
+            onChunk(data.chunk);
+          } else if (data.sources) {
+            if (onSources) onSources(data.sources);
+          } else if (data.done) {
+            if (onDone) onDone(data.done);
+          } else if (data.error) {
+            // Event error (vd: Ollama quá thời gian) - stream kết thúc, không có done
+            throw new Error(data.error);
           }
         }
       }
@@ -85,6 +133,19 @@ export const streamMessage = async (message, conversationHistory = [], useRag =
   }
 };
 
+/**
+ * Đọc header Server-Timing của response /chat thành { stage: ms }
+ */
+export const parseServerTiming = (header) => {
+  const timings = {};
+  (header || '').split(',').forEach((entry) => {
+    const [name, ...params] = entry.trim().split(';');
+    const dur = params.find((param) => param.trim().startsWith('dur='));
+    if (name && dur) timings[name] = parseFloat(dur.trim().slice(4));
+  });
+  return timings;
+};
+
 /**
  * Upload PDF document
  */
@@ -104,9 +165,38 @@ export const uploadDocument = async (file, onProgress) => {
     },
   });
 
+  // Backend xử lý PDF trong background - chờ job hoàn thành
+  return waitForIngestionJob(response.data.job_id);
+};
+
+/**
+ * Lấy trạng thái ingestion job
+ */
+export const getIngestionJob = async (jobId) => {
+  const response = await api.get(`/documents/jobs/${jobId}`);
   return response.data;
 };
 
+/**
+ * Poll ingestion job cho tới khi completed/failed
+ */
+export const waitForIngestionJob = async (jobId, intervalMs = 1000) => {
+  while (true) {
+    const job = await getIngestionJob(jobId);
+
+    if (job.status === 'completed') {
+      return job;
+    }
+    if (job.status === 'failed') {
+      const error = new Error(job.error || job.message);
+      error.response = { data: { detail: job.error || job.message } };
+      throw error;
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};
+
 /**
  * Lấy thống kê documents
  */